@@ -1,65 +1,3335 @@
 import os
+import sys
 from dotenv import load_dotenv
-from typing import Dict, Any, List, Optional, Union
-from datetime import datetime, timedelta, date
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Union
+from datetime import datetime, timedelta, date, timezone
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp.types import ToolAnnotations
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import GetOrdersRequest, MarketOrderRequest, LimitOrderRequest, GetAssetsRequest, CreateWatchlistRequest, UpdateWatchlistRequest, GetCalendarRequest, GetCorporateAnnouncementsRequest, ClosePositionRequest, GetOptionContractsRequest, OptionLegRequest, StopOrderRequest, StopLimitOrderRequest, TrailingStopOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce, QueryOrderStatus, AssetStatus, CorporateActionType, CorporateActionDateType, OrderType, PositionIntent, ContractType, OrderClass
+from alpaca.trading.enums import AssetClass, OrderStatus, PositionSide, TradeEvent, OrderSide, TimeInForce, QueryOrderStatus, AssetStatus, CorporateActionType, CorporateActionDateType, OrderType, PositionIntent, ContractType, OrderClass
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.historical.option import OptionHistoricalDataClient
 from alpaca.data.requests import Sort, StockBarsRequest, StockLatestQuoteRequest, StockTradesRequest, StockLatestTradeRequest, StockLatestBarRequest, OptionLatestQuoteRequest, OptionSnapshotRequest
 from alpaca.data.timeframe import TimeFrame
 from alpaca.data.live.stock import StockDataStream
-from alpaca.trading.models import Order
+from alpaca.trading.models import Order, Clock, Calendar
+from alpaca.trading.stream import TradingStream
 from alpaca.data.enums import DataFeed, OptionsFeed
+from alpaca.data.models import Trade, Quote, Bar, OptionsSnapshot
+from alpaca.trading.models import Position
+from alpaca.common.rest import RESTClient
 from alpaca.common.enums import SupportedCurrencies
-import uvicorn
-from fastapi import FastAPI
 
+import io
+import re
+import csv
 import time
+import json
+import pickle
+import argparse
+import signal
+import socket
+import secrets
+import subprocess
+import base64
+import bisect
+import random
+import asyncio
+import threading
+import contextvars
+import contextlib
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+from functools import partial
+from enum import Enum
+from uuid import UUID, uuid4
+from zoneinfo import ZoneInfo
+from pydantic import BaseModel
+from urllib.parse import quote
+import numpy as np
+import httpx
+import logging
 from alpaca.common.exceptions import APIError
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+try:
+    import fcntl
+except ImportError:  # Windows, where the workers share no files
+    fcntl = None
+
+# Diagnostics go to the log (stderr), never stdout, which carries the stdio transport
+logger = logging.getLogger("alpaca_mcp_server")
+
+# Name of the tool currently being served, used to pick per-tool settings
+current_tool: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_tool", default=None)
+# Alias of the account the current tool call acts for, used to pick its clients
+DEFAULT_ACCOUNT = "default"
+current_account: contextvars.ContextVar[str] = contextvars.ContextVar("current_account", default=DEFAULT_ACCOUNT)
+
+class AlpacaMCP(FastMCP):
+    """
+    FastMCP server that records the name of the tool being called so the
+    upstream execution layer can apply per-tool settings.
+
+    Every call is counted and timed, with the time spent waiting on Alpaca
+    recorded apart from the time spent in this server.
+
+    Tools named get_* are annotated as read-only unless they declare their
+    own annotations. Concurrent calls of a read-only tool with the same
+    arguments are single-flighted: the first runs, and the others wait for
+    and share its result.
+
+    When ALPACA_ACCOUNTS names further accounts, every tool also takes an
+    account argument, which is removed before the tool runs and selects the
+    clients its Alpaca calls use.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_only_tools: set = set()
+        self._in_flight: Dict[tuple, asyncio.Task] = {}
+
+    def tool(self, name: Optional[str] = None, annotations: Optional[ToolAnnotations] = None, **kwargs):
+        def register(fn):
+            tool_name = name or fn.__name__
+            tool_annotations = annotations
+            if tool_annotations is None and tool_name.startswith("get_"):
+                tool_annotations = ToolAnnotations(readOnlyHint=True)
+            if tool_annotations is not None and tool_annotations.readOnlyHint:
+                self.read_only_tools.add(tool_name)
+            registered = super(AlpacaMCP, self).tool(name, annotations=tool_annotations, **kwargs)(fn)
+            if len(ACCOUNT_CREDENTIALS) > 1:
+                self._tool_manager.get_tool(tool_name).parameters["properties"]["account"] = {
+                    "title": "Account",
+                    "description": "Alias of the Alpaca account to act for",
+                    "enum": list(ACCOUNT_CREDENTIALS),
+                    "default": DEFAULT_ACCOUNT,
+                    "type": "string",
+                }
+            return registered
+        return register
+
+    async def _run_tool(self, name: str, arguments: Dict[str, Any]):
+        # Splits the call's duration into time waiting on Alpaca and time spent here
+        clock = UpstreamClock()
+        token = upstream_clock.set(clock)
+        started = time.perf_counter()
+        try:
+            return await super().call_tool(name, arguments)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe("tool_upstream_seconds", clock.seconds, {"tool": name})
+            metrics.observe("tool_processing_seconds", max(elapsed - clock.seconds, 0.0), {"tool": name})
+            upstream_clock.reset(token)
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]):
+        account = arguments.get("account") or DEFAULT_ACCOUNT
+        arguments = {key: value for key, value in arguments.items() if key != "account"}
+        token = current_tool.set(name)
+        account_token = current_account.set(account)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            if account not in ACCOUNT_CREDENTIALS:
+                raise ToolError(f"Unknown account: {account}")
+            span_attributes = {"mcp.tool.name": name, "alpaca.account": account}
+            with tracer.span(f"tools/call {name}", span_attributes, kind=Span.SERVER, root=True) as span, \
+                    profiler.profile(name):
+                if name not in self.read_only_tools:
+                    result = await self._run_tool(name, arguments)
+                else:
+                    key = (name, account, json.dumps(arguments, sort_keys=True, default=str))
+                    task = self._in_flight.get(key)
+                    if task is None:
+                        task = asyncio.get_running_loop().create_task(self._run_tool(name, arguments))
+                        self._in_flight[key] = task
+                        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+                        metrics.inc("tool_singleflight_calls_total", {"tool": name})
+                    else:
+                        metrics.inc("tool_singleflight_hits_total", {"tool": name})
+                        if span is not None:
+                            span.set("mcp.tool.shared_result", True)
+                    # Shielded so one caller going away does not cancel the call for the others
+                    result = await asyncio.shield(task)
+                status = "error" if is_error_result(result) else "ok"
+                if span is not None and status == "error":
+                    span.error = "tool returned an error"
+            return result
+        finally:
+            metrics.inc("tool_calls_total", {"tool": name, "status": status})
+            metrics.observe("tool_duration_seconds", time.perf_counter() - started, {"tool": name})
+            current_account.reset(account_token)
+            current_tool.reset(token)
+
+def is_error_result(result) -> bool:
+    """Whether a tool result is one of the "Error ..." messages tools return instead of raising."""
+    content = result[0] if isinstance(result, tuple) else result
+    return bool(content) and getattr(content[0], "text", "").startswith("Error")
 
 # Initialize FastMCP server
-mcp = FastMCP("alpaca-trading")
+mcp = AlpacaMCP("alpaca-trading")
+
+# Initialize Alpaca clients using environment variables
+# Import our .env file within the same directory
+load_dotenv()
+
+def env_url(name: str) -> Optional[str]:
+    """Reads an endpoint override, treating an empty value or the .env.example placeholder None as unset."""
+    value = (os.getenv(name) or "").strip()
+    return None if value in ("", "None") else value
+
+API_KEY = os.getenv("ALPACA_API_KEY")
+API_SECRET = os.getenv("ALPACA_SECRET_KEY")
+PAPER = os.getenv("PAPER", "True")
+# Endpoint overrides, e.g. to point the server at a local mock of the API
+TRADE_API_URL = env_url("TRADE_API_URL")
+TRDE_API_WSS = env_url("TRDE_API_WSS") or env_url("TRADE_API_WSS")
+DATA_API_URL = env_url("DATA_API_URL")
+STREAM_DATA_WSS = env_url("STREAM_DATA_WSS")
+
+PORT = os.getenv("PORT")
+# MCP transport: stdio, sse, streamable-http or both (SSE and streamable HTTP).
+# Defaults to sse when PORT is set and stdio otherwise; --transport overrides it.
+TRANSPORT = os.getenv("TRANSPORT", "")
+# Stateless streamable HTTP endpoint that serves only the read-only tools
+READ_ONLY_HTTP_PATH = "/mcp/read-only"
+
+# Default output format for tool responses: text, json, csv or table
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "text").lower()
+
+# Upstream execution settings
+UPSTREAM_WORKERS_TRADING = int(os.getenv("UPSTREAM_WORKERS_TRADING", "8"))
+UPSTREAM_WORKERS_STOCK_DATA = int(os.getenv("UPSTREAM_WORKERS_STOCK_DATA", "8"))
+UPSTREAM_WORKERS_OPTION_DATA = int(os.getenv("UPSTREAM_WORKERS_OPTION_DATA", "8"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "30"))
+# Per-tool overrides, e.g. "get_stock_trades=120,get_option_contracts=60"
+TOOL_TIMEOUTS = {
+    name.strip(): float(seconds)
+    for name, seconds in (
+        item.split("=", 1) for item in os.getenv("TOOL_TIMEOUTS", "").split(",") if "=" in item
+    )
+}
+
+# Rate limit of each account across all its REST clients, in requests per minute. Up to
+# UPSTREAM_RATE_BURST requests may go out at once; the last
+# UPSTREAM_RATE_RESERVE tokens are kept for order entry and cancels.
+UPSTREAM_RATE_LIMIT = float(os.getenv("UPSTREAM_RATE_LIMIT", "200"))
+UPSTREAM_RATE_BURST = int(os.getenv("UPSTREAM_RATE_BURST", "20"))
+UPSTREAM_RATE_RESERVE = int(os.getenv("UPSTREAM_RATE_RESERVE", "3"))
+
+# Retries of transient upstream errors (429, 5xx, connection failures)
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.25"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+# An endpoint fails fast for CIRCUIT_RESET_TIMEOUT seconds after this many consecutive failures
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Async HTTP path for the hot read endpoints (latest data, snapshots, orders, positions)
+ASYNC_HTTP = os.getenv("ASYNC_HTTP", "True").lower() in ("true", "1", "yes")
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_KEEPALIVE = int(os.getenv("HTTP_KEEPALIVE", "16"))
+# HTTP/2 is only used when the optional h2 package is installed
+HTTP2 = os.getenv("HTTP2", "True").lower() in ("true", "1", "yes")
+
+# Latest-data request batching
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SYMBOLS = int(os.getenv("BATCH_MAX_SYMBOLS", "200"))
+
+# Trade history paging
+TRADES_PAGE_SIZE = int(os.getenv("TRADES_PAGE_SIZE", "1000"))
+TRADES_RESPONSE_BUDGET = int(os.getenv("TRADES_RESPONSE_BUDGET", "60000"))
+
+# Option chain cache settings
+OPTION_CHAIN_TTL = float(os.getenv("OPTION_CHAIN_TTL", "900"))
+OPTION_CHAIN_HORIZON_DAYS = int(os.getenv("OPTION_CHAIN_HORIZON_DAYS", "1095"))
+OPTION_CHAIN_PAGE_SIZE = int(os.getenv("OPTION_CHAIN_PAGE_SIZE", "10000"))
+OPTION_CHAIN_MAX_CHAINS = int(os.getenv("OPTION_CHAIN_MAX_CHAINS", "100"))
+
+# Option snapshot fetching
+OPTION_SNAPSHOT_CHUNK_SIZE = int(os.getenv("OPTION_SNAPSHOT_CHUNK_SIZE", "100"))
+OPTION_SNAPSHOT_CONCURRENCY = int(os.getenv("OPTION_SNAPSHOT_CONCURRENCY", "4"))
+OPTION_SNAPSHOT_TTL = float(os.getenv("OPTION_SNAPSHOT_TTL", "5"))
+
+# Option pricing: a flat annual rate (e.g. "0.045") or a curve of
+# days-to-expiry:rate points (e.g. "30:0.052,180:0.050,365:0.047")
+RISK_FREE_RATE = os.getenv("RISK_FREE_RATE", "0.045")
+
+# Asset catalog settings
+ASSET_CATALOG_TTL = float(os.getenv("ASSET_CATALOG_TTL", "3600"))
+ASSET_CATALOG_CLASSES = [
+    AssetClass(asset_class.strip()) for asset_class in os.getenv("ASSET_CATALOG_CLASSES", "us_equity,crypto").split(",")
+]
+
+# Local cache directory, used for data persisted between restarts
+CACHE_DIR = os.path.expanduser(os.getenv("ALPACA_MCP_CACHE_DIR", "~/.cache/alpaca-mcp-server"))
+
+# Market calendar settings
+CALENDAR_YEARS_BACK = int(os.getenv("CALENDAR_YEARS_BACK", "5"))
+CALENDAR_YEARS_FORWARD = int(os.getenv("CALENDAR_YEARS_FORWARD", "2"))
+CALENDAR_TTL = float(os.getenv("CALENDAR_TTL", str(7 * 24 * 3600)))
+CLOCK_RECONCILE_INTERVAL = float(os.getenv("CLOCK_RECONCILE_INTERVAL", "300"))
+
+# Streaming market data settings
+STREAM_MARKET_DATA = os.getenv("STREAM_MARKET_DATA", "True").lower() in ("true", "1", "yes")
+STREAM_DATA_FEED = DataFeed(os.getenv("STREAM_DATA_FEED", "iex").lower())
+STREAM_MAX_SYMBOLS = int(os.getenv("STREAM_MAX_SYMBOLS", "30"))
+STREAM_IDLE_TTL = float(os.getenv("STREAM_IDLE_TTL", "900"))
+STREAM_REFRESH_INTERVAL = float(os.getenv("STREAM_REFRESH_INTERVAL", "300"))
+
+# Order and position mirror settings
+TRADE_STREAM = os.getenv("TRADE_STREAM", "True").lower() in ("true", "1", "yes")
+TRADE_MIRROR_ORDER_LIMIT = int(os.getenv("TRADE_MIRROR_ORDER_LIMIT", "500"))
+TRADE_MIRROR_RESYNC_INTERVAL = float(os.getenv("TRADE_MIRROR_RESYNC_INTERVAL", "300"))
+POSITION_MIRROR_TTL = float(os.getenv("POSITION_MIRROR_TTL", "30"))
+
+# Bulk order submission settings
+ORDER_BATCH_MAX = int(os.getenv("ORDER_BATCH_MAX", "100"))
+ORDER_BATCH_CONCURRENCY = int(os.getenv("ORDER_BATCH_CONCURRENCY", "8"))
+
+# Tracing and profiling; both can also be switched at runtime through the admin endpoints
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+PROFILE_DIR = os.path.expanduser(os.getenv("PROFILE_DIR", os.path.join(CACHE_DIR, "profiles")))
+# Bearer token for the /admin endpoints, which are disabled when it is not set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# /metrics only answers clients on this machine unless this is set
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "False").lower() in ("true", "1", "yes")
+
+# Multi-process mode: WORKERS server processes behind PORT, sharing read-only caches
+WORKERS = int(os.getenv("WORKERS", "1"))
+# How long latest quotes, trades and bars fetched by one worker are reused by the others
+SHARED_QUOTE_TTL = float(os.getenv("SHARED_QUOTE_TTL", "1"))
+# Set by the front end process for each worker it starts
+WORKER_INDEX = int(os.getenv("WORKER_INDEX")) if os.getenv("WORKER_INDEX") else None
+SHARED_CACHE_ADDRESS = os.getenv("SHARED_CACHE_ADDRESS", "")
+SHARED_CACHE_AUTHKEY = os.getenv("SHARED_CACHE_AUTHKEY", "")
+
+# Further accounts served by this process, as comma-separated aliases. Each
+# alias takes its keys from ALPACA_API_KEY_<ALIAS> and ALPACA_SECRET_KEY_<ALIAS>
+# and its mode from PAPER_<ALIAS> (PAPER if unset); tools then take an account
+# argument naming the alias, or "default" for the account above.
+ALPACA_ACCOUNTS = [alias.strip() for alias in os.getenv("ALPACA_ACCOUNTS", "").split(",") if alias.strip()]
+# Seconds an account's clients are kept after its last call
+ACCOUNT_IDLE_TTL = float(os.getenv("ACCOUNT_IDLE_TTL", "600"))
+
+# Check if keys are available
+if not API_KEY or not API_SECRET:
+    raise ValueError("Alpaca API credentials not found in environment variables.")
+
+# Keys and trading mode of each account, by alias
+ACCOUNT_CREDENTIALS = {DEFAULT_ACCOUNT: (API_KEY, API_SECRET, PAPER)}
+for _alias in ALPACA_ACCOUNTS:
+    _suffix = re.sub(r"\W", "_", _alias.upper())
+    _key, _secret = os.getenv(f"ALPACA_API_KEY_{_suffix}"), os.getenv(f"ALPACA_SECRET_KEY_{_suffix}")
+    if not _key or not _secret:
+        raise ValueError(f"Alpaca API credentials for account '{_alias}' not found in environment variables.")
+    ACCOUNT_CREDENTIALS[_alias] = (_key, _secret, os.getenv(f"PAPER_{_suffix}", PAPER))
+
+# Clients are built on first use for each account (see AccountPool), so a
+# launch that never calls Alpaca, such as a host listing tools, does not pay for them
+UPSTREAM_CLIENT_FACTORIES: Dict[str, Callable[[str, str, Any], RESTClient]] = {
+    # For trading
+    "trading": lambda key, secret, paper: TradingClient(key, secret, paper=paper, url_override=TRADE_API_URL),
+    # For historical market data
+    "stock_data": lambda key, secret, paper: StockHistoricalDataClient(key, secret, url_override=DATA_API_URL),
+    # For option historical data
+    "option_data": lambda key, secret, paper: OptionHistoricalDataClient(api_key=key, secret_key=secret, url_override=DATA_API_URL),
+}
+
+# ============================================================================
+# Metrics
+# ============================================================================
+
+class Histogram:
+    """Cumulative bucket counts plus the count and sum of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms, keyed by name and label values.
+
+    Safe to update from executor threads as well as the event loop. Gauges
+    that describe current state (queue depths, open sessions) are usually
+    filled in by collectors, which run just before the registry is rendered
+    in the Prometheus text format.
+    """
+
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Histogram] = {}
+        self._collectors: List[Any] = []
+
+    @staticmethod
+    def _key(name: str, labels: Optional[Dict[str, str]]) -> tuple:
+        return (name, tuple(sorted((labels or {}).items())))
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def add(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None, buckets=None) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets or self.DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    def collector(self, fn):
+        """Registers fn to be called before every render; usable as a decorator."""
+        self._collectors.append(fn)
+        return fn
+
+    @staticmethod
+    def _labels(labels: tuple, extra: tuple = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (
+            name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for name, value in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format (version 0.0.4)."""
+        for fn in self._collectors:
+            fn()
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(
+                ((key, (h.buckets, list(h.counts), h.count, h.sum)) for key, h in self.histograms.items()),
+                key=lambda item: item[0],
+            )
+        lines = []
+        declared = set()
+
+        def declare(name: str, kind: str) -> str:
+            full_name = self.namespace + name
+            if full_name not in declared:
+                declared.add(full_name)
+                lines.append(f"# TYPE {full_name} {kind}\n")
+            return full_name
+
+        for (name, labels), value in counters:
+            lines.append(f"{declare(name, 'counter')}{self._labels(labels)} {value:g}\n")
+        for (name, labels), value in gauges:
+            lines.append(f"{declare(name, 'gauge')}{self._labels(labels)} {value:g}\n")
+        for (name, labels), (buckets, counts, count, total) in histograms:
+            full_name = declare(name, "histogram")
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{full_name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {bucket_count}\n")
+            lines.append(f"{full_name}_bucket{self._labels(labels, (('le', '+Inf'),))} {count}\n")
+            lines.append(f"{full_name}_sum{self._labels(labels)} {total:g}\n")
+            lines.append(f"{full_name}_count{self._labels(labels)} {count}\n")
+        return "".join(lines)
+
+metrics = MetricsRegistry(namespace="alpaca_mcp_")
+
+def record_cache_lookup(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """Counts lookups served from (hits) and past (misses) one of the server's caches."""
+    if hits:
+        metrics.inc("cache_requests_total", {"cache": cache, "result": "hit"}, hits)
+    if misses:
+        metrics.inc("cache_requests_total", {"cache": cache, "result": "miss"}, misses)
+
+class UpstreamClock:
+    """
+    Wall time a tool call spends with at least one upstream request in flight.
+
+    Overlapping requests (e.g. concurrent snapshot chunks) are counted once, so
+    the remainder of the call's duration is time spent in this server.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._active = 0
+        self._since = 0.0
+
+    def start(self) -> None:
+        if self._active == 0:
+            self._since = time.perf_counter()
+        self._active += 1
+
+    def stop(self) -> None:
+        self._active -= 1
+        if self._active == 0:
+            self.seconds += time.perf_counter() - self._since
+
+# Upstream clock of the tool call being served, if any
+upstream_clock: contextvars.ContextVar[Optional[UpstreamClock]] = contextvars.ContextVar("upstream_clock", default=None)
+
+# ============================================================================
+# Tracing and Profiling
+# ============================================================================
+
+class Span:
+    """One timed operation of a trace, with OpenTelemetry-style ids and attributes."""
+
+    # OTLP span kinds
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"], kind: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self.root: "Span" = self if parent is None else parent.root
+        # Finished spans of the trace, exported together when the root span ends
+        self.finished: List["Span"] = [] if parent is None else parent.finished
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @staticmethod
+    def _value(value) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": self._value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+# Innermost open span of the current task, if it is being traced
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Records spans around tool calls, upstream requests and rendering.
+
+    Each sampled tool call becomes one trace. When its root span ends, the
+    trace is appended to path as one line of OTLP/JSON (the format of the
+    OpenTelemetry collector's file exporter), so it can be loaded by any
+    OTLP-aware tool. Spans that end after their root, such as background
+    refreshes, are written on lines of their own. With no path set, span()
+    costs a context variable lookup.
+    """
+
+    def __init__(self, path: str = "", sample_rate: float = 1.0):
+        self._lock = threading.Lock()
+        self._file = None
+        self.path = ""
+        self.sample_rate = sample_rate
+        self.configure(path, sample_rate)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def configure(self, path: Optional[str], sample_rate: Optional[float] = None) -> None:
+        """Switches tracing to another file, or off with an empty path."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path = os.path.expanduser(path or "")
+            if sample_rate is not None:
+                self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", buffering=1 << 16)
+
+    @contextlib.contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None, kind: int = Span.INTERNAL, root: bool = False):
+        """
+        Times the enclosed block as a child of the current span. With root=True,
+        a new trace is started if this call is sampled; otherwise nothing is
+        recorded outside a trace.
+        """
+        parent = current_span.get()
+        if not self.enabled or (parent is None and (not root or random.random() >= self.sample_rate)):
+            yield None
+            return
+        span = Span(name, parent.trace_id if parent else os.urandom(16).hex(), parent, kind, dict(attributes or {}))
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_ns = time.time_ns()
+            if parent is None:
+                span.finished.append(span)
+                self._export(span.finished)
+            elif span.root.end_ns:
+                self._export([span])
+            else:
+                span.finished.append(span)
+
+    def _export(self, spans: List[Span]) -> None:
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "alpaca-mcp-server"}}]},
+            "scopeSpans": [{"scope": {"name": "alpaca_mcp_server"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}, separators=(",", ":"))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+tracer = Tracer(TRACE_FILE, TRACE_SAMPLE_RATE)
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread while the next N calls of one tool run.
+
+    A background thread reads sys._current_frames() every interval while a
+    profiled call is in flight, so the event loop, executor workers and
+    stream threads are all covered and the profiled calls run at full speed.
+    When the last of the N calls finishes, the samples are written to
+    output_dir as collapsed stacks ("frame;frame;frame count" per line), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self.tool: Optional[str] = None
+        self.remaining = 0
+        self.interval = 0.005
+        self.last_output: Optional[str] = None
+        self._active = 0
+        self._samples: Counter = Counter()
+        self._sample_count = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def arm(self, tool: str, calls: int, interval: float = 0.005) -> None:
+        """Profiles the next calls calls of tool, replacing any profile not yet started."""
+        with self._lock:
+            if self._active:
+                raise RuntimeError(f"A profile of {self.tool} is in progress")
+            self.tool = tool
+            self.remaining = calls
+            self.interval = interval
+            self._samples = Counter()
+            self._sample_count = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "tool": self.tool, "remaining_calls": self.remaining, "active_calls": self._active,
+            "samples": self._sample_count, "last_output": self.last_output,
+        }
+
+    @contextlib.contextmanager
+    def profile(self, tool: str):
+        """Samples the enclosed call if it is one of the calls the profiler is armed for."""
+        with self._lock:
+            selected = tool == self.tool and self.remaining > 0
+            if selected:
+                self.remaining -= 1
+                self._active += 1
+                if self._thread is None:
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                    self._thread.start()
+        if not selected:
+            yield
+            return
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                done = self._active == 0
+                finished = done and self.remaining == 0
+                if done:
+                    self._stop.set()
+                    thread, self._thread = self._thread, None
+            if done:
+                thread.join()
+            if finished:
+                self._write()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self._samples[";".join(reversed(stack))] += 1
+            self._sample_count += 1
+
+    def _write(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{self.tool}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in self._samples.most_common())
+        self.last_output = path
+        self.tool = None
+
+profiler = SamplingProfiler(PROFILE_DIR)
+
+# ============================================================================
+# Upstream Execution Layer
+# ============================================================================
+
+class UpstreamBusyError(Exception):
+    """Raised when an executor already has its maximum number of calls outstanding."""
+
+class UpstreamTimeoutError(Exception):
+    """Raised when an upstream call does not finish within the tool's timeout."""
+
+class UpstreamUnavailableError(Exception):
+    """Raised without calling upstream while an endpoint's circuit breaker is open."""
+
+class UpstreamExecutor:
+    """
+    Bounded thread pool that runs the blocking calls of one alpaca-py client.
+
+    Up to max_workers calls run at once and up to max_queue more wait for a
+    worker. Beyond that, new calls are rejected with UpstreamBusyError so a slow
+    upstream cannot build an unbounded backlog. A call that times out keeps its
+    slot until the underlying request actually returns.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"alpaca-{name}")
+        self._lock = threading.Lock()
+        self._outstanding = 0
+
+    @property
+    def outstanding(self) -> int:
+        """Number of calls currently running or waiting for a worker."""
+        return self._outstanding
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a worker."""
+        return max(0, self._outstanding - self.max_workers)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._outstanding -= 1
+
+    async def run(self, call, timeout: Optional[float] = None):
+        """
+        Runs a zero-argument callable on the pool and awaits its result.
+
+        Args:
+            call: Blocking callable to run
+            timeout (Optional[float]): Seconds to wait before raising UpstreamTimeoutError
+
+        Returns:
+            The value returned by the callable
+        """
+        with self._lock:
+            if self._outstanding >= self.max_workers + self.max_queue:
+                raise UpstreamBusyError(
+                    f"Too many pending {self.name} requests ({self._outstanding}); please retry shortly."
+                )
+            self._outstanding += 1
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise UpstreamTimeoutError(
+                f"{self.name} request timed out after {timeout:g} seconds"
+            ) from None
+
+class RateLimiter:
+    """
+    Token bucket shared by every REST call of one account, with strict-priority lanes.
+
+    Tokens refill at rate per second up to burst. A call takes one token,
+    or queues in its lane until one is available; queued calls in lower
+    lanes are always served first, and lanes other than 0 may not take
+    the last reserve tokens, so order entry is not starved by a data burst.
+    Runs entirely on the event loop.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, reserve: int, lanes: int = 3):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(burst, 1)
+        self.reserve = min(reserve, self.burst - 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._queues = [deque() for _ in range(lanes)]
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _floor(self, lane: int) -> float:
+        return 1.0 if lane == 0 else 1.0 + self.reserve
+
+    def penalize(self, seconds: float) -> None:
+        """Empties the bucket for the given time, e.g. after Alpaca answers 429."""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    @property
+    def waiting(self) -> List[int]:
+        """Number of queued calls per lane."""
+        return [sum(not future.done() for future in queue) for queue in self._queues]
+
+    async def acquire(self, lane: int) -> float:
+        """
+        Waits for a token in the given lane (0 is served first) and returns the seconds spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        ahead = any(future for queue in self._queues[:lane + 1] for future in queue if not future.done())
+        if not ahead and self._tokens >= self._floor(lane):
+            self._tokens -= 1
+            return 0.0
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[lane].append(future)
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The token may have been granted just as the caller gave up; return it
+            if future.done() and not future.cancelled():
+                self._tokens += 1
+                self._schedule()
+            raise
+        return time.monotonic() - started
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        for lane, queue in enumerate(self._queues):
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                continue
+            if self._tokens >= self._floor(lane):
+                self._tokens -= 1
+                queue.popleft().set_result(None)
+                # Grant the next token (possibly to the same lane) on the next pass
+                self._timer = asyncio.get_running_loop().call_soon(self._schedule)
+            else:
+                delay = (self._floor(lane) - self._tokens) / self.rate
+                self._timer = asyncio.get_running_loop().call_later(delay, self._schedule)
+            # Lower lanes wait while a higher-priority call is queued
+            return
+
+# Lane 0: order entry and cancels; lane 1: other trading calls; lane 2: market data
+ORDER_ENTRY_METHODS = {
+    "submit_order", "replace_order_by_id", "cancel_orders", "cancel_order_by_id",
+    "close_position", "close_all_positions", "exercise_options_position",
+}
+
+def upstream_lane(client_type: str, method: str) -> int:
+    if client_type == "trading":
+        return 0 if method in ORDER_ENTRY_METHODS else 1
+    return 2
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream endpoint.
+
+    After threshold failures in a row the circuit opens and calls fail
+    immediately with UpstreamUnavailableError. Once reset_timeout seconds
+    have passed, a single probe call is let through: success closes the
+    circuit, failure opens it for another reset_timeout.
+    """
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        retry_in = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0)
+        raise UpstreamUnavailableError(
+            f"{self.name} is unavailable after repeated failures; retrying in {retry_in:.0f} seconds"
+        )
+
+    def release_probe(self) -> None:
+        """Lets another call probe a half-open circuit when this one ended without an outcome."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            if self.opened_at is None or self._probing:
+                metrics.inc("upstream_circuit_opened_total", {"endpoint": self.name})
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+def circuit_breaker(client_type: str, method: str) -> CircuitBreaker:
+    name = f"{client_type}.{method}"
+    breaker = circuit_breakers.get(name)
+    if breaker is None:
+        breaker = circuit_breakers[name] = CircuitBreaker(name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+    return breaker
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Writes that are safe to repeat; submit_order is added per call when it carries a client_order_id
+IDEMPOTENT_WRITES = {"cancel_order_by_id", "cancel_orders"}
+
+def is_transient(e: Exception) -> bool:
+    """Whether an error is worth retrying: rate limiting, a server error or a dropped connection."""
+    if isinstance(e, APIError):
+        return e.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(e, (RequestsConnectionError, RequestsTimeout, httpx.TransportError))
+
+def is_retryable_call(client_type: str, method: str, args: tuple) -> bool:
+    if client_type != "trading" or method.startswith("get_") or method in IDEMPOTENT_WRITES:
+        return True
+    # Alpaca rejects a second order with the same client_order_id, so a retry cannot double-fill
+    return method == "submit_order" and bool(args) and bool(getattr(args[0], "client_order_id", None))
+
+def retry_delay(e: Exception, attempt: int) -> float:
+    """Seconds before the next attempt: Retry-After when given, otherwise full-jitter exponential backoff."""
+    response = getattr(e, "response", None) if isinstance(e, APIError) else None
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        reset = response.headers.get("X-RateLimit-Reset")
+        if reset and e.status_code == 429:
+            try:
+                return max(float(reset) - time.time(), 0.0)
+            except ValueError:
+                pass
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+def is_duplicate_client_order_id(e: Exception) -> bool:
+    return isinstance(e, APIError) and e.status_code == 422 and "client_order_id" in str(e)
+
+class AccountClients:
+    """The REST clients of one account, each built on first use, and the account's rate limiter."""
+
+    def __init__(self, api_key: str, secret_key: str, paper):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.paper = paper
+        self.clients: Dict[str, RESTClient] = {}
+        # Alpaca limits requests per account
+        self.limiter = RateLimiter(UPSTREAM_RATE_LIMIT, UPSTREAM_RATE_BURST, UPSTREAM_RATE_RESERVE)
+        self.last_used = time.monotonic()
+
+    def client(self, client_type: str) -> RESTClient:
+        client = self.clients.get(client_type)
+        if client is None:
+            client = self.clients[client_type] = UPSTREAM_CLIENT_FACTORIES[client_type](
+                self.api_key, self.secret_key, self.paper
+            )
+            # Retries happen in run_upstream, with backoff and without holding a worker;
+            # the client's own fixed-delay retry loop is turned off
+            client._retry = 0
+        return client
+
+class AccountPool:
+    """
+    Client sets of the accounts served by this process, keyed by alias.
+
+    An account's set is built on its first call and dropped once the account
+    has made no call for idle_ttl seconds; calls still running keep their own
+    references to the clients. The default account's set is never dropped.
+    The executors, the async HTTP connection pool and all market data caches
+    are shared by every account.
+    """
+
+    def __init__(self, credentials: Dict[str, tuple], idle_ttl: float):
+        self.credentials = credentials
+        self.idle_ttl = idle_ttl
+        self.accounts: Dict[str, AccountClients] = {}
+        self._next_sweep = 0.0
+
+    def get(self, alias: Optional[str] = None) -> AccountClients:
+        """Returns the client set of alias, or of the account of the current tool call."""
+        alias = alias or current_account.get()
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + min(self.idle_ttl, 60)
+            self.evict_idle(now)
+        account = self.accounts.get(alias)
+        if account is None:
+            account = self.accounts[alias] = AccountClients(*self.credentials[alias])
+        account.last_used = now
+        return account
+
+    def evict_idle(self, now: float) -> None:
+        for alias, account in list(self.accounts.items()):
+            if alias != DEFAULT_ACCOUNT and now - account.last_used > self.idle_ttl:
+                del self.accounts[alias]
+                metrics.inc("account_evictions_total")
+
+accounts = AccountPool(ACCOUNT_CREDENTIALS, ACCOUNT_IDLE_TTL)
+
+def upstream_client(client_type: str) -> RESTClient:
+    """Returns the client for client_type of the account of the current tool call."""
+    return accounts.get().client(client_type)
+
+upstream_executors = {
+    "trading": UpstreamExecutor("trading", UPSTREAM_WORKERS_TRADING, UPSTREAM_MAX_QUEUE),
+    "stock_data": UpstreamExecutor("stock_data", UPSTREAM_WORKERS_STOCK_DATA, UPSTREAM_MAX_QUEUE),
+    "option_data": UpstreamExecutor("option_data", UPSTREAM_WORKERS_OPTION_DATA, UPSTREAM_MAX_QUEUE),
+}
+
+class AsyncHTTPBackend:
+    """
+    Serves the hot read endpoints with one shared httpx.AsyncClient, so
+    those calls await I/O on the event loop instead of holding an executor
+    thread. Connections are pooled and kept alive across the trading and
+    data hosts, over HTTP/2 when h2 is installed.
+
+    Each call reuses the base URL, API version and auth headers of the
+    alpaca-py client it stands in for and returns the same models. HTTP
+    errors are raised as APIError so retries and circuit breakers behave
+    exactly as on the synchronous path. Other methods, and clients that are
+    not alpaca-py REST clients, keep using the executors.
+    """
+
+    METHODS = {
+        ("stock_data", "get_stock_latest_quote"): ("/stocks/quotes/latest", Quote),
+        ("stock_data", "get_stock_latest_trade"): ("/stocks/trades/latest", Trade),
+        ("stock_data", "get_stock_latest_bar"): ("/stocks/bars/latest", Bar),
+        ("option_data", "get_option_latest_quote"): ("/options/quotes/latest", Quote),
+        ("option_data", "get_option_snapshot"): ("/options/snapshots", OptionsSnapshot),
+        ("trading", "get_orders"): ("/orders", Order),
+        ("trading", "get_order_by_id"): ("/orders/{}", Order),
+        ("trading", "get_all_positions"): ("/positions", Position),
+    }
+
+    def __init__(self, enabled: bool, pool_size: int, keepalive: int, http2: bool):
+        self.enabled = enabled
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        try:
+            import h2  # noqa: F401
+            self.http2 = http2
+        except ImportError:
+            self.http2 = False
+        self._client: Optional[httpx.AsyncClient] = None
+        # httpcore rescans its whole wait queue whenever a connection frees up,
+        # so excess requests queue here instead, where waiting is O(1)
+        self._slots = asyncio.Semaphore(pool_size)
+        self.in_flight = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.keepalive,
+                    keepalive_expiry=30,
+                ),
+                timeout=httpx.Timeout(UPSTREAM_TIMEOUT),
+                follow_redirects=False,
+            )
+        return self._client
+
+    def supports(self, client_type: str, method: str) -> bool:
+        client = upstream_client(client_type)
+        return (
+            self.enabled and (client_type, method) in self.METHODS
+            and isinstance(client, RESTClient) and not client._use_raw_data
+        )
+
+    @staticmethod
+    def _params(request) -> Dict[str, Any]:
+        params = request.to_request_fields() if request is not None else {}
+        for key, value in params.items():
+            if isinstance(value, Enum):
+                params[key] = value.value
+            elif isinstance(value, (datetime, date)):
+                params[key] = value.isoformat()
+            elif isinstance(value, list):
+                params[key] = ",".join(str(item) for item in value)
+        return params
+
+    async def _get(self, client: RESTClient, path: str, params: Optional[Dict[str, Any]] = None):
+        # Concatenation, not formatting, so BaseURL enum members yield their value
+        url = client._base_url + "/" + client._api_version + path
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                response = await self.client.get(url, params=params, headers=client._get_default_headers())
+            finally:
+                self.in_flight -= 1
+        if response.is_error:
+            raise APIError(
+                response.text,
+                httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response),
+            )
+        return response.json() if response.content else None
+
+    async def call(self, client_type: str, method: str, *args, **kwargs):
+        client = upstream_client(client_type)
+        path, model = self.METHODS[(client_type, method)]
+        if client_type == "trading":
+            if method == "get_order_by_id":
+                return model(**await self._get(client, path.format(quote(str(args[0]), safe=""))))
+            params = self._params(args[0] if args else kwargs.get("filter"))
+            return [model(**item) for item in await self._get(client, path, params) or []]
+
+        params = self._params(args[0] if args else kwargs.get("request_params"))
+        data = {}
+        # Snapshots are paged; the latest-data endpoints return a single page
+        while True:
+            response = await self._get(client, path, params)
+            key = next(k for k in ("quotes", "trades", "bars", "snapshots") if k in response)
+            data.update(response[key] or {})
+            params["page_token"] = response.get("next_page_token")
+            if not params["page_token"]:
+                break
+        return {symbol: model(symbol=symbol, raw_data=raw) for symbol, raw in data.items() if raw is not None}
+
+# httpx logs every request at INFO, which FastMCP's log level would let through
+logging.getLogger("httpx").setLevel(logging.WARNING)
+async_http = AsyncHTTPBackend(ASYNC_HTTP, HTTP_POOL_SIZE, HTTP_KEEPALIVE, HTTP2)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+@metrics.collector
+def collect_upstream_state() -> None:
+    for name, executor in upstream_executors.items():
+        metrics.set("upstream_executor_outstanding", executor.outstanding, {"client": name})
+        metrics.set("upstream_executor_queue_depth", executor.queue_depth, {"client": name})
+    waiting = [account.limiter.waiting for account in list(accounts.accounts.values())]
+    for lane, count in enumerate(map(sum, zip(*waiting))):
+        metrics.set("upstream_rate_limit_waiting", count, {"lane": str(lane)})
+    metrics.set("account_client_sets", len(accounts.accounts))
+    metrics.set("upstream_async_http_in_flight", async_http.in_flight)
+    for name, breaker in list(circuit_breakers.items()):
+        metrics.set("upstream_circuit_state", CIRCUIT_STATES[breaker.state], {"endpoint": name})
+
+def error_message(e: Exception) -> str:
+    """The message of an Alpaca API error without its JSON wrapping, or the exception text."""
+    if isinstance(e, APIError):
+        try:
+            return e.message
+        except (ValueError, KeyError, TypeError):
+            pass
+    return str(e)
+
+def tool_timeout() -> float:
+    """Returns the upstream timeout for the tool currently being served."""
+    return TOOL_TIMEOUTS.get(current_tool.get(), UPSTREAM_TIMEOUT)
+
+def record_upstream_request(endpoint: str, error: Optional[BaseException], seconds: float) -> None:
+    """Counts one upstream request by outcome (ok, HTTP status or error type) and records its latency."""
+    if error is None:
+        code = "ok"
+    elif isinstance(error, APIError):
+        code = str(error.status_code or "unknown")
+    elif isinstance(error, UpstreamTimeoutError):
+        code = "timeout"
+    elif isinstance(error, UpstreamBusyError):
+        code = "busy"
+    elif isinstance(error, asyncio.CancelledError):
+        code = "cancelled"
+    else:
+        code = type(error).__name__
+    metrics.inc("upstream_requests_total", {"endpoint": endpoint, "code": code})
+    metrics.observe("upstream_request_seconds", seconds, {"endpoint": endpoint})
+
+async def run_upstream(client_type: str, method: str, *args, **kwargs):
+    """
+    Calls a method of one of the alpaca-py clients without blocking the event loop.
+    
+    The call uses the clients of the current tool call's account. It first
+    takes a token from the account's rate limiter, in the order-entry lane
+    for orders and cancels, then runs on the async HTTP backend for the hot
+    read endpoints, or on the client's executor for everything else. Reads,
+    cancels and orders with a client_order_id are retried on 429, 5xx and
+    connection errors while the tool timeout allows; every endpoint has a
+    circuit breaker that fails fast while it keeps failing.
+    
+    Args:
+        client_type (str): Which client to use ('trading', 'stock_data' or 'option_data')
+        method (str): Name of the client method to call (e.g., 'get_account')
+        *args, **kwargs: Arguments passed through to the client method
+    
+    Returns:
+        The value returned by the client method
+    """
+    account = accounts.get()
+    fn = getattr(account.client(client_type), method)
+    loop = asyncio.get_running_loop()
+    timeout = tool_timeout()
+    deadline = loop.time() + timeout
+    lane = upstream_lane(client_type, method)
+    breaker = circuit_breaker(client_type, method)
+    retryable = is_retryable_call(client_type, method, args)
+    clock = upstream_clock.get()
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            try:
+                waited = await asyncio.wait_for(account.limiter.acquire(lane), max(deadline - loop.time(), 0.001))
+            except asyncio.TimeoutError:
+                raise UpstreamTimeoutError(
+                    f"{client_type} request waited more than {timeout:g} seconds for the rate limit"
+                ) from None
+            metrics.observe("upstream_rate_limit_wait_seconds", waited, {"lane": str(lane)})
+            remaining = max(deadline - loop.time(), 0.001)
+            started = time.perf_counter()
+            if clock is not None:
+                clock.start()
+            native = async_http.supports(client_type, method)
+            span_attributes = {"alpaca.endpoint": breaker.name, "alpaca.attempt": attempt, "alpaca.async_http": native}
+            try:
+                with tracer.span(f"upstream {breaker.name}", span_attributes, kind=Span.CLIENT):
+                    if native:
+                        try:
+                            result = await asyncio.wait_for(async_http.call(client_type, method, *args, **kwargs), remaining)
+                        except asyncio.TimeoutError:
+                            raise UpstreamTimeoutError(
+                                f"{client_type} request timed out after {timeout:g} seconds"
+                            ) from None
+                    else:
+                        result = await upstream_executors[client_type].run(partial(fn, *args, **kwargs), timeout=remaining)
+            except BaseException as e:
+                record_upstream_request(breaker.name, e, time.perf_counter() - started)
+                raise
+            finally:
+                if clock is not None:
+                    clock.stop()
+            record_upstream_request(breaker.name, None, time.perf_counter() - started)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            if attempt > 0 and method == "submit_order" and is_duplicate_client_order_id(e):
+                # An earlier attempt reached Alpaca even though its response was lost
+                breaker.record_success()
+                return await run_upstream("trading", "get_order_by_client_id", args[0].client_order_id)
+            transient = is_transient(e)
+            rate_limited = isinstance(e, APIError) and e.status_code == 429
+            if isinstance(e, UpstreamTimeoutError) or (transient and not rate_limited):
+                breaker.record_failure()
+            elif rate_limited or isinstance(e, UpstreamBusyError):
+                breaker.release_probe()
+            else:
+                # The endpoint answered; the request itself was refused
+                breaker.record_success()
+            if not transient or not retryable or attempt >= UPSTREAM_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            if rate_limited:
+                account.limiter.penalize(delay)
+            if loop.time() + delay >= deadline:
+                raise
+            metrics.inc("upstream_retries_total", {"endpoint": breaker.name})
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+# ============================================================================
+# Shared Cache
+# ============================================================================
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Holds an exclusive lock on path against the other worker processes sharing CACHE_DIR."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class SharedCacheStore:
+    """
+    Key/value store with expiry that lives in the cache process.
+
+    Values are pickled by the workers, so the store only handles bytes. A
+    lease marks a key as being fetched by one worker, so the others wait for
+    its result instead of sending the same upstream request.
+    """
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}
+        self._leases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        now = time.time()
+        with self._lock:
+            entries = ((key, self._entries.get(key)) for key in keys)
+            return {key: entry[1] for key, entry in entries if entry is not None and entry[0] > now}
+
+    def put_many(self, items: Dict[str, bytes], ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (now + ttl, value)
+                self._leases.pop(key, None)
+            if len(self._entries) > self.max_entries:
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+
+    def lease(self, key: str, seconds: float) -> bool:
+        """Claims the fetch of a key; False if it is cached or another worker holds the lease."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry[0] > now) or self._leases.get(key, 0.0) > now:
+                return False
+            self._leases[key] = now + seconds
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._leases.pop(key, None)
+
+class SharedCacheManager(BaseManager):
+    pass
+
+_shared_cache_store: Optional[SharedCacheStore] = None
+
+def _get_shared_cache_store() -> SharedCacheStore:
+    global _shared_cache_store
+    if _shared_cache_store is None:
+        _shared_cache_store = SharedCacheStore()
+    return _shared_cache_store
+
+SharedCacheManager.register("store", callable=_get_shared_cache_store)
+
+class SharedCache:
+    """
+    A worker's handle on the cache process shared by all workers.
+
+    The asset catalog, the trading calendar, option chains, option
+    snapshots and latest quotes, trades and bars are fetched through it, so adding workers does
+    not multiply their upstream requests.
+    In single-process mode (no address) every lookup misses and fetch just
+    runs its loader, so callers need no special case. Calls to the cache
+    process block, so they run on a thread. If the cache process cannot be
+    reached, the worker falls back to its own fetches.
+    """
+
+    def __init__(self, address: str, authkey: str, lease_seconds: float = 60.0):
+        self.enabled = bool(address)
+        self.address = address
+        self.authkey = authkey
+        self.lease_seconds = lease_seconds
+        self._store = None
+        self._connect_lock = threading.Lock()
+
+    def _get_store(self):
+        with self._connect_lock:
+            if self._store is None:
+                host, port = self.address.rsplit(":", 1)
+                manager = SharedCacheManager(address=(host, int(port)), authkey=bytes.fromhex(self.authkey))
+                manager.connect()
+                self._store = manager.store()
+            return self._store
+
+    async def _call(self, method: str, *args):
+        return await asyncio.to_thread(lambda: getattr(self._get_store(), method)(*args))
+
+    def _disable(self, e: Exception) -> None:
+        logger.warning(f"Shared cache unavailable, caching in this worker only: {e}")
+        self.enabled = False
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Returns the cached values of the keys that are present."""
+        if not self.enabled or not keys:
+            return {}
+        try:
+            found = await self._call("get_many", keys)
+        except Exception as e:
+            self._disable(e)
+            return {}
+        record_cache_lookup("shared", hits=len(found), misses=len(keys) - len(found))
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    async def put_many(self, items: Dict[str, Any], ttl: float) -> None:
+        """Caches values for ttl seconds."""
+        if not self.enabled or not items:
+            return
+        try:
+            await self._call("put_many", {key: pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for key, value in items.items()}, ttl)
+        except Exception as e:
+            self._disable(e)
+
+    async def fetch(self, key: str, ttl: float, loader, refresh: bool = False):
+        """
+        Returns the cached value of key, or runs loader and caches its result.
+        
+        When several workers miss at once, one of them runs loader and the
+        others wait for its result (up to lease_seconds).
+        
+        Args:
+            key (str): Cache key
+            ttl (float): Seconds to keep the loaded value
+            loader: Callable returning an awaitable of the value
+            refresh (bool): Skip the cached value, e.g. because it is known to be outdated
+        """
+        if not self.enabled:
+            return await loader()
+        deadline = time.monotonic() + self.lease_seconds
+        try:
+            while True:
+                if not refresh:
+                    found = await self.get_many([key])
+                    if key in found:
+                        return found[key]
+                if await self._call("lease", key, self.lease_seconds) or refresh or time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.05)
+        except Exception as e:
+            self._disable(e)
+            return await loader()
+        try:
+            value = await loader()
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await self._call("release", key)
+            raise
+        await self.put_many({key: value}, ttl)
+        return value
+
+shared_cache = SharedCache(SHARED_CACHE_ADDRESS, SHARED_CACHE_AUTHKEY)
+
+# ============================================================================
+# Latest Data Batching
+# ============================================================================
+
+class LatestDataBatcher:
+    """
+    Coalesces single-symbol latest-data lookups into multi-symbol requests.
+
+    Lookups that arrive within window seconds of each other (and share the
+    same account and feed/currency parameters) are sent upstream as one
+    request, outside the context of any one caller, and
+    each caller receives the entry for its own symbol. A batch is sent early
+    once it reaches max_symbols. In multi-process mode, entries fetched by
+    any worker, for any account, are reused by all of them for
+    SHARED_QUOTE_TTL seconds.
+
+    When upstream rejects a batch as a bad request, the batch is split in
+    halves and resent, so only the callers of the offending symbols receive
+    the error.
+    """
+
+    def __init__(self, client_type: str, method: str, request_class, window: float, max_symbols: int):
+        self.client_type = client_type
+        self.method = method
+        self.request_class = request_class
+        self.window = window
+        self.max_symbols = max_symbols
+        self._pending: Dict[tuple, Dict[str, asyncio.Future]] = {}
+
+    async def get(self, symbol: str, **params):
+        """
+        Returns the latest entry for one symbol, or None if upstream has no data for it.
+        
+        Args:
+            symbol (str): Stock ticker symbol
+            **params: Extra request parameters (e.g., feed, currency)
+        """
+        return (await self.get_many([symbol], **params)).get(symbol)
+
+    async def get_many(self, symbols: List[str], **params) -> Dict[str, Any]:
+        """
+        Returns the latest entries for several symbols, keyed by symbol.
+        
+        Args:
+            symbols (List[str]): Stock ticker symbols
+            **params: Extra request parameters (e.g., feed, currency)
+        """
+        key = (current_account.get(), *sorted(params.items()))
+        symbols = list(dict.fromkeys(symbols))
+        shared = await shared_cache.get_many([self._shared_key(key, symbol) for symbol in symbols])
+        entries = {symbol: shared[self._shared_key(key, symbol)] for symbol in symbols if self._shared_key(key, symbol) in shared}
+        futures = {symbol: self._enqueue(key, symbol, params) for symbol in symbols if symbol not in entries}
+        # Shield the shared futures so one cancelled caller does not fail the others
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        entries.update((symbol, result) for symbol, result in zip(futures, results) if result is not None)
+        return entries
+
+    def _shared_key(self, key: tuple, symbol: str) -> str:
+        # Market data is the same for every account, so entries are shared between them
+        return f"{self.method}:{symbol}:{key[1:]}"
+
+    def _enqueue(self, key: tuple, symbol: str, params: Dict[str, Any]) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = {}
+            loop.call_later(self.window, self._flush, key, batch, params)
+        future = batch.get(symbol)
+        if future is None:
+            future = batch[symbol] = loop.create_future()
+            if len(batch) >= self.max_symbols:
+                self._flush(key, batch, params)
+        return future
+
+    def _flush(self, key: tuple, batch: Dict[str, asyncio.Future], params: Dict[str, Any]) -> None:
+        # The timer may fire after the batch was already sent for being full
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        # A fresh context, so the batch runs with its own account and the default timeout
+        # rather than the account, tool and trace of whichever caller opened it
+        context = contextvars.Context()
+        context.run(current_account.set, key[0])
+        context.run(asyncio.get_running_loop().create_task, self._send(key, batch, params))
+
+    async def _send(self, key: tuple, batch: Dict[str, asyncio.Future], params: Dict[str, Any]) -> None:
+        try:
+            request = self.request_class(symbol_or_symbols=list(batch), **params)
+            result = await run_upstream(self.client_type, self.method, request)
+        except Exception as e:
+            if len(batch) > 1 and self._rejects_symbols(e):
+                symbols = list(batch)
+                half = len(symbols) // 2
+                await asyncio.gather(
+                    self._send(key, {symbol: batch[symbol] for symbol in symbols[:half]}, params),
+                    self._send(key, {symbol: batch[symbol] for symbol in symbols[half:]}, params),
+                )
+                return
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for symbol, future in batch.items():
+            if not future.done():
+                future.set_result(result.get(symbol))
+        await shared_cache.put_many(
+            {self._shared_key(key, symbol): result[symbol] for symbol in batch if result.get(symbol) is not None}, SHARED_QUOTE_TTL
+        )
+
+    @staticmethod
+    def _rejects_symbols(e: Exception) -> bool:
+        # Authentication and rate limit errors hold for any symbol, so splitting would not help
+        return (
+            isinstance(e, APIError)
+            and e.status_code is not None
+            and 400 <= e.status_code < 500
+            and e.status_code not in (401, 403, 429)
+        )
+
+quote_batcher = LatestDataBatcher(
+    "stock_data", "get_stock_latest_quote", StockLatestQuoteRequest, BATCH_WINDOW_MS / 1000, BATCH_MAX_SYMBOLS
+)
+trade_batcher = LatestDataBatcher(
+    "stock_data", "get_stock_latest_trade", StockLatestTradeRequest, BATCH_WINDOW_MS / 1000, BATCH_MAX_SYMBOLS
+)
+bar_batcher = LatestDataBatcher(
+    "stock_data", "get_stock_latest_bar", StockLatestBarRequest, BATCH_WINDOW_MS / 1000, BATCH_MAX_SYMBOLS
+)
+
+# ============================================================================
+# Asset Catalog
+# ============================================================================
+
+class AssetCatalog:
+    """
+    In-memory copy of the asset universe with hash indexes for filtering.
+
+    Assets are indexed by symbol, and secondary indexes map each value of
+    exchange, asset class, status, the boolean trading flags and the
+    upstream attribute tags to the set of symbols that have it. Filters are
+    answered by intersecting those sets. The catalog loads on first use and
+    is refreshed in the background once it is older than ttl seconds, while
+    the previous copy keeps serving requests.
+    """
+
+    FLAGS = ("tradable", "marginable", "shortable", "easy_to_borrow", "fractionable")
+
+    def __init__(self, asset_classes: List[AssetClass], ttl: float):
+        self.asset_classes = asset_classes
+        self.ttl = ttl
+        self.by_symbol: Dict[str, Any] = {}
+        self._index: Dict[str, Dict[str, set]] = {}
+        self.loaded_at: Optional[float] = None
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _value(value) -> str:
+        return str(getattr(value, "value", value)).lower()
+
+    def _add(self, asset) -> None:
+        symbol = asset.symbol
+        self.by_symbol[symbol] = asset
+        keys = [
+            ("exchange", self._value(asset.exchange)),
+            ("asset_class", self._value(asset.asset_class)),
+            ("status", self._value(asset.status)),
+        ]
+        keys += [("flag", flag) for flag in self.FLAGS if getattr(asset, flag)]
+        keys += [("attribute", attribute.lower()) for attribute in asset.attributes or []]
+        for field, value in keys:
+            self._index.setdefault(field, {}).setdefault(value, set()).add(symbol)
+
+    def load(self, assets) -> None:
+        """Replaces the catalog contents and rebuilds all indexes."""
+        self.by_symbol = {}
+        self._index = {}
+        for asset in assets:
+            self._add(asset)
+        self.loaded_at = time.monotonic()
+
+    @property
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def _fetch(self) -> None:
+        async def fetch_assets() -> List[Any]:
+            assets = []
+            for asset_class in self.asset_classes:
+                assets.extend(await run_upstream("trading", "get_all_assets", GetAssetsRequest(asset_class=asset_class)))
+            return assets
+        key = "asset_catalog:" + ",".join(self._value(asset_class) for asset_class in self.asset_classes)
+        self.load(await shared_cache.fetch(key, self.ttl, fetch_assets))
+
+    async def ensure_loaded(self) -> None:
+        """Loads the catalog if it is empty, or starts a background refresh if it is stale."""
+        if not self.is_stale:
+            return
+        if self.loaded_at is not None:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.get_running_loop().create_task(self._fetch())
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self.loaded_at is None:
+                await self._fetch()
+
+    async def get(self, symbol: str):
+        """
+        Returns one asset by symbol, asking the API for symbols the catalog does not know yet.
+        
+        Args:
+            symbol (str): The asset symbol (e.g., 'AAPL', 'BTC/USD')
+        """
+        await self.ensure_loaded()
+        asset = self.by_symbol.get(symbol.upper())
+        record_cache_lookup("asset_catalog", hits=asset is not None, misses=asset is None)
+        if asset is None:
+            asset = await run_upstream("trading", "get_asset", symbol)
+            self._add(asset)
+        return asset
+
+    async def filter(
+        self,
+        status: Optional[str] = None,
+        asset_class: Optional[str] = None,
+        exchange: Optional[str] = None,
+        attributes: Optional[str] = None
+    ) -> List[Any]:
+        """
+        Returns the assets matching every given filter, sorted by symbol.
+        
+        Args:
+            status: Asset status (e.g., 'active')
+            asset_class: Asset class (e.g., 'us_equity', 'crypto')
+            exchange: Exchange (e.g., 'NASDAQ')
+            attributes: Comma-separated attributes. Trading flags (tradable, marginable,
+                shortable, easy_to_borrow, fractionable) must all hold; upstream attribute
+                tags (e.g., 'ptp_no_exception') match if the asset has any of them.
+        """
+        await self.ensure_loaded()
+        selections = []
+        for field, value in (("status", status), ("asset_class", asset_class), ("exchange", exchange)):
+            if value:
+                selections.append(self._index.get(field, {}).get(value.lower(), set()))
+        if attributes:
+            tags = set()
+            has_tags = False
+            for attribute in (a.strip().lower() for a in attributes.split(",") if a.strip()):
+                if attribute in self.FLAGS:
+                    selections.append(self._index.get("flag", {}).get(attribute, set()))
+                else:
+                    has_tags = True
+                    tags |= self._index.get("attribute", {}).get(attribute, set())
+            if has_tags:
+                selections.append(tags)
+        if not selections:
+            return [self.by_symbol[symbol] for symbol in sorted(self.by_symbol)]
+        selections.sort(key=len)
+        symbols = set(selections[0]).intersection(*selections[1:])
+        return [self.by_symbol[symbol] for symbol in sorted(symbols)]
+
+asset_catalog = AssetCatalog(ASSET_CATALOG_CLASSES, ASSET_CATALOG_TTL)
+
+# ============================================================================
+# Market Calendar Engine
+# ============================================================================
+
+MARKET_TZ = ZoneInfo("America/New_York")
+
+class MarketCalendarEngine:
+    """
+    Local trading calendar and market clock.
+
+    A multi-year calendar is fetched once, persisted to CACHE_DIR and kept as
+    sorted session arrays, so calendar ranges are answered by binary search
+    and the clock (is_open, next_open, next_close) is computed from the
+    current time. The clock is periodically reconciled against the REST
+    clock; when they disagree (e.g., an unscheduled closure) the REST answer
+    is served until its next open/close transition and the calendar is
+    refetched.
+    """
+
+    def __init__(self, path: str, years_back: int, years_forward: int, ttl: float, reconcile_interval: float):
+        self.path = path
+        self.years_back = years_back
+        self.years_forward = years_forward
+        self.ttl = ttl
+        self.reconcile_interval = reconcile_interval
+        self.sessions: List[Any] = []
+        self._dates: List[date] = []
+        self._opens: List[datetime] = []
+        self._closes: List[datetime] = []
+        self.start: Optional[date] = None
+        self.end: Optional[date] = None
+        self.fetched_at: Optional[float] = None
+        self._override: Optional[Clock] = None
+        self._last_reconcile = 0.0
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._background: Optional[asyncio.Task] = None
+
+    def _set_sessions(self, sessions, start: date, end: date, fetched_at: float) -> None:
+        self.sessions = sorted(sessions, key=lambda day: day.date)
+        self._dates = [day.date for day in self.sessions]
+        self._opens = [day.open.replace(tzinfo=MARKET_TZ) for day in self.sessions]
+        self._closes = [day.close.replace(tzinfo=MARKET_TZ) for day in self.sessions]
+        self.start = start
+        self.end = end
+        self.fetched_at = fetched_at
+
+    def _load_from_disk(self) -> bool:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            sessions = [Calendar(date=d, open=o, close=c) for d, o, c in data["sessions"]]
+            self._set_sessions(
+                sessions, date.fromisoformat(data["start"]), date.fromisoformat(data["end"]), data["fetched_at"]
+            )
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _save_to_disk(self) -> None:
+        data = {
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "fetched_at": self.fetched_at,
+            "sessions": [
+                [day.date.isoformat(), day.open.strftime("%H:%M"), day.close.strftime("%H:%M")] for day in self.sessions
+            ],
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Error saving market calendar cache: {e}")
+
+    async def _fetch(self, refresh: bool = False) -> None:
+        today = datetime.now(MARKET_TZ).date()
+        start = today.replace(year=today.year - self.years_back, month=1, day=1)
+        end = today.replace(year=today.year + self.years_forward, month=12, day=31)
+        sessions = await shared_cache.fetch(
+            f"calendar:{start}:{end}",
+            self.ttl,
+            lambda: run_upstream("trading", "get_calendar", GetCalendarRequest(start=start, end=end)),
+            refresh=refresh,
+        )
+        if sessions:
+            # The API only publishes a few years ahead; don't claim coverage past its last session
+            end = min(end, max(day.date for day in sessions))
+        self._set_sessions(sessions, start, end, time.time())
+        self._save_to_disk()
+
+    def _start_background(self, coro) -> None:
+        if self._background is None or self._background.done():
+            self._background = asyncio.get_running_loop().create_task(coro)
+        else:
+            coro.close()
+
+    async def ensure_loaded(self) -> None:
+        """Loads the calendar from disk or the API, refreshing it in the background when stale."""
+        if self.fetched_at is None:
+            if self._load_lock is None:
+                self._load_lock = asyncio.Lock()
+            async with self._load_lock:
+                if self.fetched_at is None and not self._load_from_disk():
+                    await self._fetch()
+        if time.time() - self.fetched_at > self.ttl:
+            self._start_background(self._fetch())
+
+    def covers(self, start: date, end: date) -> bool:
+        return self.start is not None and self.start <= start and end <= self.end
+
+    async def get_calendar(self, start: date, end: date) -> List[Any]:
+        """
+        Returns the trading sessions between start and end (inclusive).
+        
+        Args:
+            start (date): First date of the range
+            end (date): Last date of the range
+        """
+        await self.ensure_loaded()
+        if not self.covers(start, end):
+            record_cache_lookup("market_calendar", misses=1)
+            return await run_upstream("trading", "get_calendar", GetCalendarRequest(start=start, end=end))
+        record_cache_lookup("market_calendar", hits=1)
+        lo = bisect.bisect_left(self._dates, start)
+        hi = bisect.bisect_right(self._dates, end)
+        return self.sessions[lo:hi]
+
+    def compute_clock(self, now: datetime) -> Optional[Clock]:
+        """Computes the market clock at a given time, or None if it falls outside the calendar."""
+        # Sessions whose close is after now: the first is either in progress or next
+        i = bisect.bisect_right(self._closes, now)
+        if i >= len(self.sessions):
+            return None
+        is_open = self._opens[i] <= now
+        next_open_index = i + 1 if is_open else i
+        if next_open_index >= len(self.sessions):
+            return None
+        return Clock(
+            timestamp=now,
+            is_open=is_open,
+            next_open=self._opens[next_open_index],
+            next_close=self._closes[i],
+        )
+
+    async def _reconcile(self) -> None:
+        clock = await run_upstream("trading", "get_clock")
+        local = self.compute_clock(clock.timestamp)
+        if local is None or (local.is_open, local.next_open, local.next_close) != (
+            clock.is_open, clock.next_open, clock.next_close
+        ):
+            logger.warning(f"Local market clock disagrees with the API at {clock.timestamp}; using the API clock")
+            self._override = clock
+            await self._fetch(refresh=True)
+        else:
+            self._override = None
+
+    async def get_clock(self) -> Clock:
+        """Returns the current market clock, computed locally when possible."""
+        await self.ensure_loaded()
+        now = datetime.now(MARKET_TZ)
+        if time.monotonic() - self._last_reconcile > self.reconcile_interval:
+            self._last_reconcile = time.monotonic()
+            self._start_background(self._reconcile())
+        override = self._override
+        if override is not None and now < min(override.next_open, override.next_close):
+            return Clock(
+                timestamp=now, is_open=override.is_open, next_open=override.next_open, next_close=override.next_close
+            )
+        clock = self.compute_clock(now)
+        record_cache_lookup("market_clock", hits=clock is not None, misses=clock is None)
+        if clock is None:
+            clock = await run_upstream("trading", "get_clock")
+        return clock
+
+market_calendar = MarketCalendarEngine(
+    os.path.join(CACHE_DIR, "calendar.json"),
+    CALENDAR_YEARS_BACK,
+    CALENDAR_YEARS_FORWARD,
+    CALENDAR_TTL,
+    CLOCK_RECONCILE_INTERVAL,
+)
+
+# ============================================================================
+# Historical Bar Store
+# ============================================================================
+
+BAR_TIMEFRAMES = {
+    "1Min": (TimeFrame.Minute, timedelta(minutes=1)),
+    "1Hour": (TimeFrame.Hour, timedelta(hours=1)),
+    "1Day": (TimeFrame.Day, timedelta(days=1)),
+}
+
+class BarStore:
+    """
+    Persistent columnar store of historical bars per symbol and timeframe.
+
+    Each series lives in one uncompressed .npz file under root holding an
+    array per column (timestamps as int64 nanoseconds since the epoch, prices
+    and volumes as float64). Checking coverage loads only that member; a
+    read loads every column of the series. A coverage member records which time ranges have already been fetched;
+    get_bars() requests only the missing ranges from the API, merges them
+    into the arrays and then answers from disk. Ranges are only marked as
+    covered up to one bar period before the time of the fetch so the still
+    forming bar is always refetched.
+
+    Every write produces a complete new file under a unique temporary name
+    and renames it over the old one, so a reader always sees columns and
+    coverage from the same write. Writers hold a lock file next to the
+    series while they read, merge and replace it, so workers sharing root do
+    not drop each other's bars.
+    """
+
+    COLUMNS = ("timestamp", "open", "high", "low", "close", "volume", "trade_count", "vwap")
+
+    def __init__(self, root: str):
+        self.root = root
+        # Per series lock and the number of calls holding or waiting for it
+        self._locks: Dict[tuple, list] = {}
+
+    def _path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, timeframe, quote(symbol.upper(), safe="") + ".npz")
+
+    @contextlib.asynccontextmanager
+    async def _series_lock(self, key: tuple):
+        # Dropped once no call uses it, so the dict only holds series in use
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def _read_coverage(self, path: str) -> List[List[int]]:
+        try:
+            with np.load(path) as data:
+                return data["coverage"].tolist()
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def read(self, symbol: str, timeframe: str) -> Dict[str, np.ndarray]:
+        """Returns the stored columns for a series (empty arrays if nothing is stored)."""
+        try:
+            with np.load(self._path(symbol, timeframe)) as data:
+                return {column: data[column] for column in self.COLUMNS}
+        except (OSError, ValueError, KeyError):
+            return {
+                column: np.empty(0, dtype=np.int64 if column == "timestamp" else np.float64)
+                for column in self.COLUMNS
+            }
+
+    @staticmethod
+    def _missing(coverage: List[List[int]], start: int, end: int) -> List[tuple]:
+        gaps = []
+        cursor = start
+        for covered_start, covered_end in coverage:
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    @staticmethod
+    def _merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+        merged: List[List[int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def _write(self, symbol: str, timeframe: str, bars, fetched: List[List[int]]) -> None:
+        path = self._path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(f"{path}.lock"):
+            self._merge_into(path, symbol, timeframe, bars, fetched)
+
+    def _merge_into(self, path: str, symbol: str, timeframe: str, bars, fetched: List[List[int]]) -> None:
+        existing = self.read(symbol, timeframe)
+        new = {
+            "timestamp": np.array(
+                [int(bar.timestamp.timestamp()) * 1_000_000_000 for bar in bars], dtype=np.int64
+            ),
+            **{
+                column: np.array(
+                    [float(getattr(bar, column) if getattr(bar, column) is not None else np.nan) for bar in bars],
+                    dtype=np.float64,
+                )
+                for column in self.COLUMNS[1:]
+            },
+        }
+        # Newly fetched bars win over stored ones with the same timestamp
+        combined = {column: np.concatenate([new[column], existing[column]]) for column in self.COLUMNS}
+        _, first = np.unique(combined["timestamp"], return_index=True)
+        coverage = self._merge_ranges(self._read_coverage(path) + fetched)
+        tmp_path = f"{path}.{os.getpid()}.{uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    coverage=np.array(coverage, dtype=np.int64).reshape(-1, 2),
+                    **{column: combined[column][first] for column in self.COLUMNS},
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+    async def get_bars(self, symbol: str, timeframe: str, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+        """
+        Returns the bars of a series between start and end, fetching any missing ranges first.
+        
+        Args:
+            symbol (str): Stock ticker symbol
+            timeframe (str): One of '1Min', '1Hour' or '1Day'
+            start (datetime): Timezone-aware start of the range
+            end (datetime): Timezone-aware end of the range
+        
+        Returns:
+            Dict[str, np.ndarray]: Column arrays restricted to the requested range
+        """
+        symbol = symbol.upper()
+        alpaca_timeframe, period = BAR_TIMEFRAMES[timeframe]
+        start_s, end_s = int(start.timestamp()), int(end.timestamp())
+        async with self._series_lock((symbol, timeframe)):
+            coverage = await asyncio.to_thread(self._read_coverage, self._path(symbol, timeframe))
+            gaps = self._missing(coverage, start_s, end_s)
+            record_cache_lookup("bar_store", hits=not gaps, misses=bool(gaps))
+            for gap_start, gap_end in gaps:
+                fetched_at = datetime.now(timezone.utc)
+                request = StockBarsRequest(
+                    symbol_or_symbols=symbol,
+                    timeframe=alpaca_timeframe,
+                    start=datetime.fromtimestamp(gap_start, timezone.utc),
+                    end=datetime.fromtimestamp(gap_end, timezone.utc),
+                )
+                try:
+                    bars = (await run_upstream("stock_data", "get_stock_bars", request)).data.get(symbol, [])
+                except UpstreamUnavailableError:
+                    # Serve the stored bars, without the missing ranges, while the endpoint is failing
+                    if not coverage:
+                        raise
+                    break
+                settled_end = min(gap_end, int((fetched_at - period).timestamp()))
+                fetched = [[gap_start, settled_end]] if settled_end > gap_start else []
+                await asyncio.to_thread(self._write, symbol, timeframe, bars, fetched)
+            # Read before releasing the lock, so no write of this series runs meanwhile
+            columns = await asyncio.to_thread(self.read, symbol, timeframe)
+        lo, hi = np.searchsorted(columns["timestamp"], [start_s * 1_000_000_000, end_s * 1_000_000_000], side="left")
+        return {column: values[lo:hi] for column, values in columns.items()}
+
+bar_store = BarStore(os.path.join(CACHE_DIR, "bars"))
+
+# ============================================================================
+# Option Chain Engine
+# ============================================================================
+
+class OptionChain:
+    """
+    All contracts of one underlying, sorted by expiration and then strike.
+
+    Expirations (as date ordinals), strikes and call/put flags are kept in
+    parallel numpy arrays, so an expiration range is found by binary search
+    and the strike and type filters are applied as vectorized masks over
+    that slice only.
+    """
+
+    def __init__(self, underlying_symbol: str, contracts, fetched_at: float):
+        self.underlying_symbol = underlying_symbol
+        self.contracts = sorted(contracts, key=lambda c: (c.expiration_date, float(c.strike_price), c.symbol))
+        self.expirations = np.array([c.expiration_date.toordinal() for c in self.contracts], dtype=np.int64)
+        self.strikes = np.array([float(c.strike_price) for c in self.contracts], dtype=np.float64)
+        self.is_call = np.array([c.type == ContractType.CALL for c in self.contracts], dtype=bool)
+        self.fetched_at = fetched_at
+
+    def __len__(self) -> int:
+        return len(self.contracts)
+
+    def query(
+        self,
+        expiration_date: Optional[date] = None,
+        expiration_date_gte: Optional[date] = None,
+        expiration_date_lte: Optional[date] = None,
+        strike_price_gte: Optional[float] = None,
+        strike_price_lte: Optional[float] = None,
+        type: Optional[ContractType] = None,
+        root_symbol: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Any]:
+        """Returns the contracts matching every given filter, in expiration/strike order."""
+        if expiration_date is not None:
+            expiration_date_gte = expiration_date_lte = expiration_date
+        lo = 0 if expiration_date_gte is None else int(np.searchsorted(self.expirations, expiration_date_gte.toordinal(), "left"))
+        hi = len(self.contracts) if expiration_date_lte is None else int(np.searchsorted(self.expirations, expiration_date_lte.toordinal(), "right"))
+        mask = np.ones(max(hi - lo, 0), dtype=bool)
+        if strike_price_gte is not None:
+            mask &= self.strikes[lo:hi] >= strike_price_gte
+        if strike_price_lte is not None:
+            mask &= self.strikes[lo:hi] <= strike_price_lte
+        if type is not None:
+            mask &= self.is_call[lo:hi] == (ContractType(type) == ContractType.CALL)
+        matches = (self.contracts[lo + i] for i in np.flatnonzero(mask))
+        if root_symbol:
+            matches = (c for c in matches if c.root_symbol == root_symbol)
+        return list(matches)[:limit] if limit else list(matches)
+
+# Contracts returned by get_option_contracts when no limit is given, as the API does
+OPTION_CONTRACTS_DEFAULT_LIMIT = 100
+
+class OptionChainEngine:
+    """
+    Per-underlying cache of complete option chains.
+
+    A chain is fetched by following next_page_token through every page of
+    contracts expiring within horizon_days, and kept for ttl seconds. Stale
+    chains keep answering queries while a background refresh runs. At most
+    max_chains chains are kept; the least recently used is dropped. Queries
+    the cached chains cannot answer, such as expired or inactive contracts,
+    go to the API with fetch_contracts.
+    """
+
+    def __init__(self, ttl: float, horizon_days: int, page_size: int, max_chains: int):
+        self.ttl = ttl
+        self.horizon_days = horizon_days
+        self.page_size = page_size
+        self.max_chains = max_chains
+        # Ordered from least to most recently used
+        self._chains: Dict[tuple, OptionChain] = {}
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+        self._refreshing: Dict[tuple, asyncio.Task] = {}
+
+    async def _fetch(self, key: tuple) -> OptionChain:
+        underlying_symbol, status = key
+        today = datetime.now(MARKET_TZ).date()
+        
+        async def fetch_contracts() -> List[Any]:
+            contracts = []
+            page_token = None
+            while True:
+                request = GetOptionContractsRequest(
+                    underlying_symbols=[underlying_symbol],
+                    status=status,
+                    expiration_date_gte=today,
+                    expiration_date_lte=today + timedelta(days=self.horizon_days),
+                    limit=self.page_size,
+                    page_token=page_token
+                )
+                response = await run_upstream("trading", "get_option_contracts", request)
+                contracts.extend(response.option_contracts or [])
+                page_token = response.next_page_token
+                if not page_token:
+                    break
+            return contracts
+        
+        shared_key = f"option_chain:{underlying_symbol}:{getattr(status, 'value', status)}:{today}"
+        contracts = await shared_cache.fetch(shared_key, self.ttl, fetch_contracts)
+        chain = OptionChain(underlying_symbol, contracts, time.monotonic())
+        self._chains.pop(key, None)
+        self._chains[key] = chain
+        while len(self._chains) > self.max_chains:
+            evicted = next(iter(self._chains))
+            del self._chains[evicted]
+            self._locks.pop(evicted, None)
+            self._refreshing.pop(evicted, None)
+        return chain
+
+    def covers(
+        self,
+        status: Optional[AssetStatus] = None,
+        expiration_date_gte: Optional[date] = None,
+        expiration_date_lte: Optional[date] = None
+    ) -> bool:
+        """Whether a query falls within a cached chain: active contracts expiring between today and the horizon."""
+        if (status or AssetStatus.ACTIVE) != AssetStatus.ACTIVE:
+            return False
+        today = datetime.now(MARKET_TZ).date()
+        horizon = today + timedelta(days=self.horizon_days)
+        return all(day is None or today <= day <= horizon for day in (expiration_date_gte, expiration_date_lte))
+
+    async def fetch_contracts(self, underlying_symbol: str, limit: int, **filters) -> List[Any]:
+        """
+        Fetches up to limit contracts matching filters straight from the API, following next_page_token.
+        
+        Args:
+            underlying_symbol (str): The symbol of the underlying asset (e.g., 'SPY')
+            limit (int): Maximum number of contracts to return
+            **filters: Other GetOptionContractsRequest fields
+        """
+        contracts = []
+        page_token = None
+        while len(contracts) < limit:
+            request = GetOptionContractsRequest(
+                underlying_symbols=[underlying_symbol],
+                limit=min(limit - len(contracts), self.page_size),
+                page_token=page_token,
+                **filters
+            )
+            response = await run_upstream("trading", "get_option_contracts", request)
+            contracts.extend(response.option_contracts or [])
+            page_token = response.next_page_token
+            if not page_token:
+                break
+        return contracts[:limit]
+
+    async def get_chain(self, underlying_symbol: str, status: Optional[AssetStatus] = AssetStatus.ACTIVE) -> OptionChain:
+        """
+        Returns the complete chain for an underlying, fetching it on first use.
+        
+        Args:
+            underlying_symbol (str): The symbol of the underlying asset (e.g., 'SPY')
+            status (Optional[AssetStatus]): Contract status to load (default: ACTIVE)
+        """
+        key = (underlying_symbol.upper(), status or AssetStatus.ACTIVE)
+        chain = self._chains.get(key)
+        record_cache_lookup("option_chain", hits=chain is not None, misses=chain is None)
+        if chain is not None:
+            self._chains[key] = self._chains.pop(key)
+            if time.monotonic() - chain.fetched_at > self.ttl:
+                task = self._refreshing.get(key)
+                if task is None or task.done():
+                    self._refreshing[key] = asyncio.get_running_loop().create_task(self._fetch(key))
+            return chain
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = await self._fetch(key)
+        return chain
+
+option_chains = OptionChainEngine(OPTION_CHAIN_TTL, OPTION_CHAIN_HORIZON_DAYS, OPTION_CHAIN_PAGE_SIZE, OPTION_CHAIN_MAX_CHAINS)
+
+class OptionSnapshotCache:
+    """
+    Fetches option snapshots in upstream-sized chunks and caches them briefly.
+
+    Symbols without a fresh cached snapshot are split into chunks of
+    chunk_size, which are requested concurrently with at most concurrency
+    requests in flight. Each snapshot is kept for ttl seconds, so repeated
+    scans of the same chain within that window need no upstream requests.
+    """
+
+    def __init__(self, chunk_size: int, concurrency: int, ttl: float, max_entries: int = 100_000):
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[tuple, tuple] = {}
+
+    def _prune(self, now: float) -> None:
+        if len(self._entries) > self.max_entries:
+            self._entries = {key: entry for key, entry in self._entries.items() if now - entry[0] <= self.ttl}
+
+    async def get_snapshots(self, symbols: List[str], feed: Optional[OptionsFeed] = None) -> Dict[str, Any]:
+        """
+        Returns snapshots keyed by symbol; symbols without upstream data are omitted.
+        
+        Args:
+            symbols (List[str]): Option contract symbols
+            feed (Optional[OptionsFeed]): The source feed of the data (opra or indicative)
+        """
+        now = time.monotonic()
+        snapshots = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            entry = self._entries.get((symbol, feed))
+            if entry is not None and now - entry[0] <= self.ttl:
+                if entry[1] is not None:
+                    snapshots[symbol] = entry[1]
+            else:
+                missing.append(symbol)
+        if missing:
+            # Snapshots fetched by other workers within the TTL
+            shared = await shared_cache.get_many([f"option_snapshot:{symbol}:{feed}" for symbol in missing])
+            for symbol in missing:
+                snapshot = shared.get(f"option_snapshot:{symbol}:{feed}")
+                if snapshot is not None:
+                    self._entries[(symbol, feed)] = (now, snapshot)
+                    snapshots[symbol] = snapshot
+            missing = [symbol for symbol in missing if symbol not in snapshots]
+        record_cache_lookup("option_snapshot", hits=len(set(symbols)) - len(missing), misses=len(missing))
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def fetch(chunk: List[str]):
+            async with semaphore:
+                request = OptionSnapshotRequest(symbol_or_symbols=chunk, feed=feed)
+                try:
+                    return chunk, await run_upstream("option_data", "get_option_snapshot", request)
+                except UpstreamUnavailableError:
+                    # Serve expired snapshots while the endpoint is failing, if there are any
+                    if not any((symbol, feed) in self._entries for symbol in chunk):
+                        raise
+                    return chunk, None
+        
+        chunks = [missing[i:i + self.chunk_size] for i in range(0, len(missing), self.chunk_size)]
+        for chunk, result in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+            if result is None:
+                for symbol in chunk:
+                    entry = self._entries.get((symbol, feed))
+                    if entry is not None and entry[1] is not None:
+                        snapshots[symbol] = entry[1]
+                continue
+            fetched_at = time.monotonic()
+            for symbol in chunk:
+                snapshot = result.get(symbol)
+                # Remember misses too, so unknown symbols are not re-requested within the TTL
+                self._entries[(symbol, feed)] = (fetched_at, snapshot)
+                if snapshot is not None:
+                    snapshots[symbol] = snapshot
+            await shared_cache.put_many(
+                {f"option_snapshot:{symbol}:{feed}": result[symbol] for symbol in chunk if result.get(symbol) is not None}, self.ttl
+            )
+        self._prune(time.monotonic())
+        return snapshots
+
+option_snapshots = OptionSnapshotCache(OPTION_SNAPSHOT_CHUNK_SIZE, OPTION_SNAPSHOT_CONCURRENCY, OPTION_SNAPSHOT_TTL)
+
+# ============================================================================
+# Option Pricing
+# ============================================================================
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / np.sqrt(2.0 * np.pi)
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF (Abramowitz and Stegun 26.2.17, absolute error below 7.5e-8)."""
+    t = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = 1.0 - norm_pdf(np.abs(x)) * poly
+    return np.where(x >= 0, upper, 1.0 - upper)
+
+class RateCurve:
+    """Risk-free rates by time to expiry, linearly interpolated and flat beyond the end points."""
+
+    def __init__(self, spec: str):
+        points = []
+        for item in spec.split(","):
+            if ":" in item:
+                days, rate = item.split(":", 1)
+                points.append((float(days), float(rate)))
+            elif item.strip():
+                points.append((0.0, float(item)))
+        points.sort()
+        self.days = np.array([days for days, _ in points] or [0.0])
+        self.rates = np.array([rate for _, rate in points] or [0.0])
+
+    def rate(self, years: np.ndarray) -> np.ndarray:
+        return np.interp(np.asarray(years) * 365.0, self.days, self.rates)
+
+rate_curve = RateCurve(RISK_FREE_RATE)
+
+def black_scholes(S, K, T, r, sigma, is_call, q=0.0) -> Dict[str, np.ndarray]:
+    """
+    Prices European options and their Greeks for whole arrays of contracts at once.
+    
+    Args:
+        S: Underlying price
+        K: Strike prices
+        T: Years to expiration
+        r: Continuously compounded risk-free rates
+        sigma: Annualized volatilities
+        is_call: True for calls, False for puts
+        q: Continuous dividend yield
+    
+    Returns:
+        Dict[str, np.ndarray]: price, delta, gamma, theta (per calendar day),
+        vega (per 1% volatility) and rho (per 1% rate)
+    """
+    S, K, T, r, sigma, q = (np.asarray(v, dtype=np.float64) for v in (S, K, T, r, sigma, q))
+    w = np.where(is_call, 1.0, -1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sqrt_t = np.sqrt(T)
+        vol_t = sigma * sqrt_t
+        d1 = (np.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / vol_t
+        d2 = d1 - vol_t
+        spot_df = S * np.exp(-q * T)
+        strike_df = K * np.exp(-r * T)
+        pdf_d1 = norm_pdf(d1)
+        cdf_wd1 = norm_cdf(w * d1)
+        cdf_wd2 = norm_cdf(w * d2)
+        return {
+            "price": w * (spot_df * cdf_wd1 - strike_df * cdf_wd2),
+            "delta": w * np.exp(-q * T) * cdf_wd1,
+            "gamma": np.exp(-q * T) * pdf_d1 / (S * vol_t),
+            "theta": (-spot_df * pdf_d1 * sigma / (2.0 * sqrt_t) - w * r * strike_df * cdf_wd2 + w * q * spot_df * cdf_wd1) / 365.0,
+            "vega": spot_df * pdf_d1 * sqrt_t / 100.0,
+            "rho": w * strike_df * T * cdf_wd2 / 100.0,
+        }
+
+def implied_volatility(price, S, K, T, r, is_call, q=0.0, tol: float = 1e-6, max_iter: int = 64) -> np.ndarray:
+    """
+    Solves Black-Scholes implied volatility for whole arrays of contracts at once.
+    
+    Each contract takes Newton steps on vega, kept inside a bracket that
+    shrinks after every evaluation; a step leaving the bracket is replaced
+    by bisection, so deep in- or out-of-the-money contracts with tiny vega
+    still converge. Prices outside the no-arbitrage bounds give NaN.
+    """
+    price, S, K, T, r, q = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (price, S, K, T, r, q)))
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), price.shape)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        spot_df = S * np.exp(-q * T)
+        strike_df = K * np.exp(-r * T)
+        lower = np.maximum(np.where(is_call, spot_df - strike_df, strike_df - spot_df), 0.0)
+        upper = np.where(is_call, spot_df, strike_df)
+        valid = np.isfinite(price) & (T > 0) & (price > lower) & (price < upper)
+        lo = np.full(price.shape, 1e-4)
+        hi = np.full(price.shape, 5.0)
+        # Brenner-Subrahmanyam approximation as the starting point
+        sigma = np.clip(np.sqrt(2.0 * np.pi / T) * price / S, 0.05, 2.0)
+        sigma = np.where(np.isfinite(sigma), sigma, 0.3)
+        active = valid.copy()
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            idx = np.flatnonzero(active)
+            values = black_scholes(S[idx], K[idx], T[idx], r[idx], sigma[idx], is_call[idx], q[idx])
+            diff = values["price"] - price[idx]
+            vega = values["vega"] * 100.0
+            hi[idx] = np.where(diff > 0, sigma[idx], hi[idx])
+            lo[idx] = np.where(diff < 0, sigma[idx], lo[idx])
+            step = sigma[idx] - diff / vega
+            inside = np.isfinite(step) & (step > lo[idx]) & (step < hi[idx])
+            sigma[idx] = np.where(inside, step, 0.5 * (lo[idx] + hi[idx]))
+            active[idx] = (np.abs(diff) > tol) & (hi[idx] - lo[idx] > 1e-10)
+    return np.where(valid & ~active, sigma, np.nan)
 
-# Initialize Alpaca clients using environment variables
-# Import our .env file within the same directory
-load_dotenv()
+def years_to_expiration(expirations: List[date], now: Optional[datetime] = None) -> np.ndarray:
+    """Years from now until 4:00 p.m. Eastern on each expiration date."""
+    now = now or datetime.now(timezone.utc)
+    seconds = [
+        (datetime.combine(expiration, datetime.min.time(), MARKET_TZ).replace(hour=16) - now).total_seconds()
+        for expiration in expirations
+    ]
+    return np.maximum(np.array(seconds, dtype=np.float64), 0.0) / (365.0 * 24 * 3600)
 
-API_KEY = os.getenv("ALPACA_API_KEY")
-API_SECRET = os.getenv("ALPACA_SECRET_KEY")
-PAPER = os.getenv("PAPER", "True")
-TRADE_API_URL = os.getenv("TRADE_API_URL")
-TRDE_API_WSS = os.getenv("TRDE_API_WSS")
-DATA_API_URL = os.getenv("DATA_API_URL")
-STREAM_DATA_WSS = os.getenv("STREAM_DATA_WSS")
+def quote_mid(quote) -> Optional[float]:
+    """Midpoint of a two-sided quote, or None if either side is missing."""
+    if quote is None or not quote.bid_price or not quote.ask_price:
+        return None
+    return (float(quote.bid_price) + float(quote.ask_price)) / 2
 
-PORT = os.getenv("PORT")
+async def underlying_price(symbol: str) -> Optional[float]:
+    """Latest quote midpoint for a stock, falling back to its last trade price."""
+    quote = market_data_book.latest_quote(symbol)
+    if quote is None:
+        quote = await quote_batcher.get(symbol, feed=STREAM_DATA_FEED)
+    price = quote_mid(quote)
+    if price is None:
+        trade = market_data_book.latest_trade(symbol) or await trade_batcher.get(symbol, feed=STREAM_DATA_FEED)
+        price = float(trade.price) if trade is not None else None
+    return price
 
-# Check if keys are available
-if not API_KEY or not API_SECRET:
-    raise ValueError("Alpaca API credentials not found in environment variables.")
+def price_option_chain(
+    contracts,
+    snapshots: Dict[str, Any],
+    spot: float,
+    dividend_yield: float = 0.0,
+    volatility: Optional[float] = None,
+    now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Solves implied volatility and Greeks for a list of option contracts in one vectorized pass.
+    
+    The market price of each contract is its quote midpoint, or its last trade
+    when the quote is one-sided. Contracts whose IV cannot be solved are priced
+    with the snapshot IV, then with the given volatility, and are otherwise left empty.
+    
+    Returns:
+        List[Dict[str, Any]]: One record per contract, in the order given
+    """
+    if not contracts:
+        return []
+    K = np.array([float(c.strike_price) for c in contracts])
+    T = years_to_expiration([c.expiration_date for c in contracts], now)
+    is_call = np.array([c.type == ContractType.CALL for c in contracts])
+    market = np.full(len(contracts), np.nan)
+    upstream_iv = np.full(len(contracts), np.nan)
+    for i, contract in enumerate(contracts):
+        snapshot = snapshots.get(contract.symbol)
+        if snapshot is None:
+            continue
+        mid = quote_mid(snapshot.latest_quote)
+        if mid is None and snapshot.latest_trade is not None:
+            mid = float(snapshot.latest_trade.price)
+        if mid is not None:
+            market[i] = mid
+        if snapshot.implied_volatility:
+            upstream_iv[i] = snapshot.implied_volatility
+    r = rate_curve.rate(T)
+    iv = implied_volatility(market, spot, K, T, r, is_call, dividend_yield)
+    sigma = np.where(np.isfinite(iv), iv, upstream_iv)
+    if volatility is not None:
+        sigma = np.where(np.isfinite(sigma), sigma, volatility)
+    greeks = black_scholes(spot, K, T, r, sigma, is_call, dividend_yield)
+    
+    def value(array, i):
+        return float(array[i]) if np.isfinite(array[i]) else None
+    
+    records = []
+    for i, contract in enumerate(contracts):
+        snapshot = snapshots.get(contract.symbol)
+        quote = snapshot.latest_quote if snapshot is not None else None
+        records.append({
+            "symbol": contract.symbol,
+            "type": "call" if is_call[i] else "put",
+            "strike_price": float(K[i]),
+            "expiration_date": contract.expiration_date,
+            "bid_price": float(quote.bid_price) if quote is not None else None,
+            "ask_price": float(quote.ask_price) if quote is not None else None,
+            "market_price": value(market, i),
+            "implied_volatility": value(iv, i),
+            "volatility": value(sigma, i),
+            "theoretical_price": value(greeks["price"], i),
+            "delta": value(greeks["delta"], i),
+            "gamma": value(greeks["gamma"], i),
+            "theta": value(greeks["theta"], i),
+            "vega": value(greeks["vega"], i),
+            "rho": value(greeks["rho"], i),
+            "rate": float(r[i]),
+            "years_to_expiration": float(T[i]),
+        })
+    return records
+
+# ============================================================================
+# Portfolio Risk
+# ============================================================================
+
+OPTION_CONTRACT_MULTIPLIER = 100
+
+class OptionSymbol(NamedTuple):
+    """The parts of an OCC option symbol, e.g. AAPL250613P00205000."""
+    symbol: str
+    underlying_symbol: str
+    expiration_date: date
+    type: ContractType
+    strike_price: float
+
+def parse_option_symbol(symbol: str) -> OptionSymbol:
+    """Splits an OCC option symbol into root, expiration, type and strike."""
+    root, body = symbol[:-15], symbol[-15:]
+    if not root or body[6] not in "CP" or not (body[:6] + body[7:]).isdigit():
+        raise ValueError(f"Not an option symbol: {symbol}")
+    return OptionSymbol(
+        symbol=symbol,
+        underlying_symbol=root,
+        expiration_date=datetime.strptime(body[:6], "%y%m%d").date(),
+        type=ContractType.CALL if body[6] == "C" else ContractType.PUT,
+        strike_price=int(body[7:]) / 1000
+    )
+
+def portfolio_exposures(
+    positions,
+    prices: Dict[str, float],
+    snapshots: Dict[str, Any],
+    now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Aggregates position-level Greeks into net exposures per underlying.
+    
+    Stock and crypto positions count as delta 1. Option legs use the Greeks of
+    their snapshot and fall back to the local Black-Scholes engine when the
+    feed omits them. All sums are taken with one bincount per measure.
+    
+    Args:
+        positions: Positions as returned by get_all_positions
+        prices (Dict[str, float]): Underlying prices keyed by symbol
+        snapshots (Dict[str, Any]): Option snapshots keyed by contract symbol
+    
+    Returns:
+        List[Dict[str, Any]]: One record per underlying, largest delta exposure first. Delta
+        and gamma are in shares, vega and theta in dollars per vol point and per day.
+    """
+    if not positions:
+        return []
+    legs = []
+    for position in positions:
+        option = parse_option_symbol(position.symbol) if position.asset_class == AssetClass.US_OPTION else None
+        legs.append((position, option))
+    underlyings = sorted({option.underlying_symbol if option else position.symbol for position, option in legs})
+    index = {symbol: i for i, symbol in enumerate(underlyings)}
+    
+    n = len(legs)
+    group = np.array([index[option.underlying_symbol if option else position.symbol] for position, option in legs])
+    qty = np.array([abs(float(position.qty)) * (-1 if str(position.side).lower().endswith("short") else 1) for position, _ in legs])
+    multiplier = np.array([OPTION_CONTRACT_MULTIPLIER if option else 1 for _, option in legs], dtype=np.float64)
+    market_value = np.array([float(position.market_value or 0) for position, _ in legs])
+    unrealized_pl = np.array([float(position.unrealized_pl or 0) for position, _ in legs])
+    spot = np.array([prices.get(underlying, np.nan) for underlying in underlyings])
+    is_option = np.array([option is not None for _, option in legs])
+    
+    # Stocks: delta 1, no other Greeks; options are filled in below
+    greeks = {name: np.zeros(n) for name in ("delta", "gamma", "vega", "theta")}
+    greeks["delta"][~is_option] = 1.0
+    option_legs = [(i, option) for i, (_, option) in enumerate(legs) if option is not None]
+    local = [(i, option) for i, option in option_legs if getattr(snapshots.get(option.symbol), "greeks", None) is None]
+    for i, option in option_legs:
+        upstream = getattr(snapshots.get(option.symbol), "greeks", None)
+        if upstream is not None:
+            for name in greeks:
+                greeks[name][i] = getattr(upstream, name) or 0.0
+    if local:
+        rows = [i for i, _ in local]
+        records = price_option_chain([option for _, option in local], snapshots, spot[group[rows]], now=now)
+        for i, record in zip(rows, records):
+            for name in greeks:
+                greeks[name][i] = record[name] if record[name] is not None else np.nan
+    
+    units = qty * multiplier
+    
+    def total(values):
+        return np.bincount(group, weights=values, minlength=len(underlyings))
+    
+    net_delta = total(units * greeks["delta"])
+    net_gamma = total(units * greeks["gamma"])
+    delta_dollars = net_delta * spot
+    gross_delta = np.nansum(np.abs(delta_dollars))
+    columns = {
+        "underlying_price": spot,
+        "positions": total(np.ones(n)),
+        "option_legs": total(is_option.astype(np.float64)),
+        "market_value": total(market_value),
+        "unrealized_pl": total(unrealized_pl),
+        "net_delta": net_delta,
+        "delta_dollars": delta_dollars,
+        "net_gamma": net_gamma,
+        # Change in dollar delta for a 1% move in the underlying
+        "gamma_dollars_1pct": net_gamma * spot * spot * 0.01,
+        "net_vega": total(units * greeks["vega"]),
+        "net_theta": total(units * greeks["theta"]),
+        "notional": total(np.abs(units)) * spot,
+        "concentration": np.abs(delta_dollars) / gross_delta if gross_delta else np.full(len(underlyings), np.nan),
+    }
+    
+    exposures = []
+    for j in np.argsort(-np.nan_to_num(np.abs(delta_dollars)), kind="stable"):
+        record = {"underlying_symbol": underlyings[j]}
+        for name, values in columns.items():
+            record[name] = float(values[j]) if np.isfinite(values[j]) else None
+        record["positions"] = int(record["positions"])
+        record["option_legs"] = int(record["option_legs"])
+        exposures.append(record)
+    return exposures
+
+# ============================================================================
+# Streaming Market Data
+# ============================================================================
+
+class MarketDataBook:
+    """
+    In-memory book of the latest quote, trade and minute bar per symbol, kept
+    current by a StockDataStream built by stream_factory on first subscription.
+
+    A symbol is subscribed while it holds at least one reference. References
+    come from sources (symbols on the account's watchlists and open stock
+    positions, refreshed periodically) and from recent use: every lookup
+    holds the symbol for STREAM_IDLE_TTL seconds. Symbols that lose their
+    last reference are unsubscribed and dropped from the book, and at most
+    max_symbols are subscribed at once, preferring source-held symbols and
+    then the most recently used ones.
+    """
+
+    CHANNELS = ("quotes", "trades", "bars")
+
+    def __init__(self, stream_factory: Callable[[], StockDataStream], max_symbols: int, idle_ttl: float, refresh_interval: float):
+        self._stream_factory = stream_factory
+        self._stream: Optional[StockDataStream] = None
+        self.max_symbols = max_symbols
+        self.idle_ttl = idle_ttl
+        self.refresh_interval = refresh_interval
+        self.quotes: Dict[str, Any] = {}
+        self.trades: Dict[str, Any] = {}
+        self.bars: Dict[str, Any] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._sources: Dict[str, set] = {}
+        self._last_used: Dict[str, float] = {}
+        self._subscribed: set = set()
+        # subscribe/unsubscribe block until the stream thread sends the message,
+        # so they run on their own thread rather than on the event loop
+        self._control = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alpaca-stream-control")
+        self._stream_thread: Optional[threading.Thread] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def stream(self) -> StockDataStream:
+        if self._stream is None:
+            self._stream = self._stream_factory()
+        return self._stream
+
+    def _acquire(self, symbol: str) -> None:
+        self._refcounts[symbol] = self._refcounts.get(symbol, 0) + 1
+
+    def _release(self, symbol: str) -> None:
+        count = self._refcounts.get(symbol, 0) - 1
+        if count > 0:
+            self._refcounts[symbol] = count
+        else:
+            self._refcounts.pop(symbol, None)
+
+    def set_source(self, name: str, symbols) -> None:
+        """Replaces the set of symbols held by a named source (e.g., 'positions')."""
+        new = {symbol.upper() for symbol in symbols}
+        old = self._sources.get(name, set())
+        for symbol in new - old:
+            self._acquire(symbol)
+        for symbol in old - new:
+            self._release(symbol)
+        self._sources[name] = new
+        self._request_sync()
+
+    def touch(self, symbol: str) -> None:
+        """Marks a symbol as recently used, subscribing it if needed."""
+        if not STREAM_MARKET_DATA:
+            return
+        self.ensure_started()
+        if symbol not in self._last_used:
+            self._acquire(symbol)
+            self._request_sync()
+        self._last_used[symbol] = time.monotonic()
+
+    def _lookup(self, table: Dict[str, Any], symbol: str):
+        symbol = symbol.upper()
+        self.touch(symbol)
+        value = table.get(symbol) if symbol in self._subscribed and self.is_streaming else None
+        record_cache_lookup("stream_book", hits=value is not None, misses=value is None)
+        return value
+
+    def latest_quote(self, symbol: str):
+        """Returns the streamed latest quote for a symbol, or None if it is not in the book."""
+        return self._lookup(self.quotes, symbol)
+
+    def latest_trade(self, symbol: str):
+        """Returns the streamed latest trade for a symbol, or None if it is not in the book."""
+        return self._lookup(self.trades, symbol)
+
+    def latest_bar(self, symbol: str):
+        """Returns the streamed latest minute bar for a symbol, or None if it is not in the book."""
+        return self._lookup(self.bars, symbol)
+
+    @property
+    def is_streaming(self) -> bool:
+        return self._stream_thread is not None and self._stream_thread.is_alive()
+
+    @property
+    def subscribed(self) -> set:
+        return set(self._subscribed)
+
+    async def _on_quote(self, quote) -> None:
+        self.quotes[quote.symbol] = quote
+
+    async def _on_trade(self, trade) -> None:
+        self.trades[trade.symbol] = trade
+
+    async def _on_bar(self, bar) -> None:
+        self.bars[bar.symbol] = bar
+
+    def ensure_started(self) -> None:
+        """Starts the maintenance task on the running event loop if it is not running yet."""
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._wakeup = asyncio.Event()
+            self._maintenance_task = asyncio.get_running_loop().create_task(self._maintain())
+
+    def _request_sync(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _expire_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        for symbol, last_used in list(self._last_used.items()):
+            if last_used < cutoff:
+                del self._last_used[symbol]
+                self._release(symbol)
+
+    def _desired_symbols(self) -> set:
+        held = {symbol for symbols in self._sources.values() for symbol in symbols}
+        by_recency = sorted(
+            (symbol for symbol in self._refcounts if symbol not in held),
+            key=lambda symbol: self._last_used.get(symbol, 0.0),
+            reverse=True,
+        )
+        return set((sorted(held) + by_recency)[: self.max_symbols])
+
+    def _apply_subscriptions(self, added: List[str], removed: List[str]) -> None:
+        # Runs on the control thread
+        if removed:
+            self.stream.unsubscribe_quotes(*removed)
+            self.stream.unsubscribe_trades(*removed)
+            self.stream.unsubscribe_bars(*removed)
+        if added:
+            self.stream.subscribe_quotes(self._on_quote, *added)
+            self.stream.subscribe_trades(self._on_trade, *added)
+            self.stream.subscribe_bars(self._on_bar, *added)
+            if not self.is_streaming:
+                self._stream_thread = threading.Thread(
+                    target=self.stream.run, name="alpaca-stock-stream", daemon=True
+                )
+                self._stream_thread.start()
+
+    async def _sync_subscriptions(self) -> None:
+        desired = self._desired_symbols()
+        added = sorted(desired - self._subscribed)
+        removed = sorted(self._subscribed - desired)
+        if not added and not removed:
+            return
+        await asyncio.get_running_loop().run_in_executor(self._control, self._apply_subscriptions, added, removed)
+        self._subscribed = desired
+        for symbol in removed:
+            for table in (self.quotes, self.trades, self.bars):
+                table.pop(symbol, None)
+
+    async def _refresh_sources(self) -> None:
+        positions = await run_upstream("trading", "get_all_positions")
+        self.set_source("positions", [
+            position.symbol for position in positions if position.asset_class == AssetClass.US_EQUITY
+        ])
+        watchlist_symbols = []
+        for watchlist in await run_upstream("trading", "get_watchlists"):
+            assets = watchlist.assets
+            if assets is None:
+                assets = (await run_upstream("trading", "get_watchlist_by_id", watchlist.id)).assets or []
+            watchlist_symbols.extend(
+                asset.symbol for asset in assets if asset.asset_class == AssetClass.US_EQUITY
+            )
+        self.set_source("watchlists", watchlist_symbols)
+
+    async def _maintain(self) -> None:
+        # Sources are the default account's positions and watchlists, whichever call started the task
+        current_account.set(DEFAULT_ACCOUNT)
+        next_refresh = 0.0
+        while True:
+            if time.monotonic() >= next_refresh:
+                next_refresh = time.monotonic() + self.refresh_interval
+                try:
+                    await self._refresh_sources()
+                except Exception as e:
+                    logger.warning(f"Error refreshing streamed symbols: {e}")
+            self._expire_idle()
+            try:
+                await self._sync_subscriptions()
+            except Exception as e:
+                logger.warning(f"Error updating stream subscriptions: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(self.refresh_interval, 60))
+            except asyncio.TimeoutError:
+                pass
+
+market_data_book = MarketDataBook(
+    lambda: StockDataStream(API_KEY, API_SECRET, feed=STREAM_DATA_FEED, url_override=STREAM_DATA_WSS),
+    STREAM_MAX_SYMBOLS, STREAM_IDLE_TTL, STREAM_REFRESH_INTERVAL,
+)
+
+# ============================================================================
+# Order and Position Mirror
+# ============================================================================
+
+class TradeUpdatesStream(TradingStream):
+    """TradingStream that reports when its websocket connects and closes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected = False
+        self.on_connect = None
+        self.on_disconnect = None
+
+    async def _start_ws(self):
+        await super()._start_ws()
+        self.connected = True
+        if self.on_connect is not None:
+            self.on_connect()
+
+    async def close(self) -> None:
+        self.connected = False
+        if self.on_disconnect is not None:
+            self.on_disconnect()
+        await super().close()
+
+class TradingMirror:
+    """
+    In-memory copy of the account's recent orders and open positions, kept
+    current by the trade updates websocket.
+
+    The stream runs on its own thread and hands every update to the event
+    loop, where all state changes happen. The mirror is rebuilt from REST
+    each time the websocket (re)connects, so updates missed while it was
+    down are recovered, and again every resync_interval seconds as a guard
+    against silent gaps. Fills update position quantities immediately;
+    prices and market values come from REST and are refreshed once they
+    are older than position_ttl. Until the stream is connected and the
+    first resync since the last (re)connect has finished, every lookup
+    falls back to REST.
+
+    The mirror follows the default account; calls for other accounts
+    always go to REST.
+    """
+
+    TERMINAL_STATUSES = {
+        OrderStatus.FILLED, OrderStatus.CANCELED, OrderStatus.EXPIRED,
+        OrderStatus.REJECTED, OrderStatus.REPLACED, OrderStatus.DONE_FOR_DAY,
+    }
+    OPENING_EVENTS = {TradeEvent.NEW, TradeEvent.PENDING_NEW, TradeEvent.ACCEPTED}
+
+    def __init__(self, stream_factory: Callable[[], TradeUpdatesStream], order_limit: int, resync_interval: float, position_ttl: float):
+        self._stream_factory = stream_factory
+        self._stream: Optional[TradeUpdatesStream] = None
+        self.order_limit = order_limit
+        self.resync_interval = resync_interval
+        self.position_ttl = position_ttl
+        self.orders: Dict[str, Order] = {}
+        self.positions: Dict[str, Any] = {}
+        self.orders_as_of: Optional[datetime] = None
+        self.positions_as_of: Optional[datetime] = None
+        # True when the last resync returned every recent order, not just the first order_limit
+        self._orders_complete = False
+        # Set by a resync that ran entirely within the current connection, cleared on disconnect
+        self._synced = False
+        self._connection = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stream_thread: Optional[threading.Thread] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._resync_task: Optional[asyncio.Task] = None
+        self._positions_task: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    @property
+    def stream(self) -> TradeUpdatesStream:
+        if self._stream is None:
+            self._stream = self._stream_factory()
+        return self._stream
+
+    @property
+    def is_live(self) -> bool:
+        """Whether lookups for the account of the current call can be served from the mirror."""
+        return (
+            current_account.get() == DEFAULT_ACCOUNT
+            and self._stream_thread is not None and self._stream_thread.is_alive()
+            and self.stream.connected and self._synced
+        )
+
+    def ensure_started(self) -> None:
+        """Starts the stream thread and the periodic resync on the running event loop."""
+        if not TRADE_STREAM or current_account.get() != DEFAULT_ACCOUNT:
+            return
+        if self._stream_thread is None or not self._stream_thread.is_alive():
+            self._loop = asyncio.get_running_loop()
+            self.stream.on_connect = self._on_connect
+            self.stream.on_disconnect = self._on_disconnect
+            self.stream.subscribe_trade_updates(self._on_trade_update)
+            self._stream_thread = threading.Thread(target=self.stream.run, name="alpaca-trade-stream", daemon=True)
+            self._stream_thread.start()
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.get_running_loop().create_task(self._maintain())
+
+    def _on_connect(self) -> None:
+        # Runs on the stream thread
+        self._loop.call_soon_threadsafe(self.request_resync)
+
+    def _on_disconnect(self) -> None:
+        # Runs on the stream thread; cleared here rather than on the loop so no
+        # lookup can be served between the reconnect and the resync it triggers
+        self._synced = False
+        self._connection += 1
+
+    async def _on_trade_update(self, update) -> None:
+        # Runs on the stream thread
+        self._loop.call_soon_threadsafe(self._apply_update, update)
+
+    def _store_order(self, order: Order) -> None:
+        key = str(order.id)
+        existing = self.orders.get(key)
+        # Updates can overtake a resync that started before them; keep the newer copy
+        if existing is not None and existing.updated_at and order.updated_at and order.updated_at < existing.updated_at:
+            return
+        self.orders[key] = order
+
+    def _apply_update(self, update) -> None:
+        order = update.order
+        key = str(order.id)
+        if key not in self.orders and update.event not in self.OPENING_EVENTS and self._synced:
+            # An update for an order we never saw means events were missed
+            self.request_resync()
+        self._store_order(order)
+        self.orders_as_of = datetime.now(timezone.utc)
+        if update.event in (TradeEvent.FILL, TradeEvent.PARTIAL_FILL) and update.position_qty is not None:
+            self._apply_fill(order.symbol, float(update.position_qty))
+        self._notify(key)
+
+    def _apply_fill(self, symbol: str, qty: float) -> None:
+        position = self.positions.get(symbol)
+        if qty == 0:
+            self.positions.pop(symbol, None)
+        elif position is not None:
+            self.positions[symbol] = position.model_copy(update={
+                "qty": f"{qty:g}",
+                "side": PositionSide.LONG if qty > 0 else PositionSide.SHORT,
+            })
+        # Entry price and market value are only known to REST
+        self.positions_as_of = None
+        if self._positions_task is None or self._positions_task.done():
+            self._positions_task = self._loop.create_task(self._refresh_positions())
+
+    def _notify(self, key: str) -> None:
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result(None)
+
+    def request_resync(self) -> None:
+        """Rebuilds the mirror from REST in the background, unless a rebuild is already running."""
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = asyncio.get_running_loop().create_task(self._resync())
+
+    async def _resync(self) -> None:
+        # A disconnect while the requests are in flight may hide updates from them, so start over
+        while True:
+            connection = self._connection
+            started = datetime.now(timezone.utc)
+            try:
+                recent, open_orders, positions = await asyncio.gather(
+                    run_upstream("trading", "get_orders", GetOrdersRequest(status=QueryOrderStatus.ALL, limit=self.order_limit)),
+                    run_upstream("trading", "get_orders", GetOrdersRequest(status=QueryOrderStatus.OPEN, limit=self.order_limit)),
+                    run_upstream("trading", "get_all_positions"),
+                )
+            except Exception as e:
+                logger.warning(f"Error resyncing order and position mirror: {e}")
+                return
+            if connection == self._connection:
+                break
+        previous = self.orders
+        self.orders = {str(order.id): order for order in list(recent) + list(open_orders)}
+        # Keep updates that arrived while the REST requests were in flight
+        for order in previous.values():
+            if order.updated_at and order.updated_at >= started:
+                self._store_order(order)
+        self._orders_complete = len(recent) < self.order_limit
+        self.positions = {position.symbol: position for position in positions}
+        self.orders_as_of = self.positions_as_of = datetime.now(timezone.utc)
+        self._synced = True
+        for key in list(self._waiters):
+            self._notify(key)
+
+    async def _refresh_positions(self) -> None:
+        positions = await run_upstream("trading", "get_all_positions")
+        self.positions = {position.symbol: position for position in positions}
+        self.positions_as_of = datetime.now(timezone.utc)
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            self.request_resync()
+
+    async def get_orders(self, status: QueryOrderStatus, limit: int):
+        """
+        Returns (orders, as_of) for the given status, newest first.
+        
+        Open orders always come from the mirror when it is live; closed and all
+        orders do too unless the request reaches past the orders it holds.
+        """
+        self.ensure_started()
+        if self.is_live:
+            orders = [
+                order for order in self.orders.values()
+                if status == QueryOrderStatus.ALL
+                or (order.status in self.TERMINAL_STATUSES) == (status == QueryOrderStatus.CLOSED)
+            ]
+            if status == QueryOrderStatus.OPEN or self._orders_complete or len(orders) >= limit:
+                orders.sort(key=lambda order: order.submitted_at or order.created_at, reverse=True)
+                record_cache_lookup("order_mirror", hits=1)
+                return orders[:limit], self.orders_as_of
+        record_cache_lookup("order_mirror", misses=1)
+        orders = await run_upstream("trading", "get_orders", GetOrdersRequest(status=status, limit=limit))
+        return orders, datetime.now(timezone.utc)
+
+    async def get_positions(self):
+        """Returns (positions, as_of), refreshing prices from REST when they are older than position_ttl."""
+        self.ensure_started()
+        if self.is_live:
+            if self.positions_as_of is None or (datetime.now(timezone.utc) - self.positions_as_of).total_seconds() > self.position_ttl:
+                if self._positions_task is None or self._positions_task.done():
+                    self._positions_task = asyncio.get_running_loop().create_task(self._refresh_positions())
+                await asyncio.shield(self._positions_task)
+            record_cache_lookup("position_mirror", hits=1)
+            return list(self.positions.values()), self.positions_as_of
+        record_cache_lookup("position_mirror", misses=1)
+        positions = await run_upstream("trading", "get_all_positions")
+        return positions, datetime.now(timezone.utc)
+
+    async def get_position(self, symbol: str):
+        """
+        Returns (position or None, as_of) for one symbol or asset id.
+        
+        Lookups the mirror cannot match go to REST, which accepts more spellings of a symbol.
+        """
+        if self.is_live:
+            positions, as_of = await self.get_positions()
+            wanted = symbol.upper().replace("/", "")
+            position = next((p for p in positions if p.symbol == wanted or str(p.asset_id) == symbol.lower()), None)
+            if position is not None:
+                return position, as_of
+        record_cache_lookup("position_mirror", misses=1)
+        position = await run_upstream("trading", "get_open_position", symbol)
+        return position, datetime.now(timezone.utc)
+
+    async def wait_for_order(self, order_id: str, timeout: float, poll_interval: float = 2.0) -> Order:
+        """
+        Waits until an order reaches a final status or the timeout passes, and returns its latest state.
+        
+        With the stream connected this sleeps until an update for the order
+        arrives; otherwise it polls REST every poll_interval seconds.
+        """
+        self.ensure_started()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        
+        async def latest() -> Order:
+            order = self.orders.get(order_id) if self.is_live else None
+            if order is None:
+                order = await run_upstream("trading", "get_order_by_id", order_id)
+                if self.is_live:
+                    self._store_order(order)
+            return order
+        
+        order = await latest()
+        while order.status not in self.TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            future = loop.create_future()
+            waiters = self._waiters.setdefault(order_id, [])
+            waiters.append(future)
+            try:
+                await asyncio.wait_for(future, remaining if self.is_live else min(remaining, poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if future in waiters:
+                    waiters.remove(future)
+                if not waiters and self._waiters.get(order_id) is waiters:
+                    del self._waiters[order_id]
+            order = await latest()
+        return order
+
+trading_mirror = TradingMirror(
+    lambda: TradeUpdatesStream(API_KEY, API_SECRET, paper=PAPER, url_override=TRDE_API_WSS),
+    TRADE_MIRROR_ORDER_LIMIT, TRADE_MIRROR_RESYNC_INTERVAL, POSITION_MIRROR_TTL,
+)
+
+# ============================================================================
+# Output Formatting
+# ============================================================================
+
+OUTPUT_FORMATS = ("text", "json", "csv", "table")
+
+def resolve_format(format: Optional[str]) -> str:
+    """
+    Returns the output format for a tool call, falling back to OUTPUT_FORMAT.
+    
+    Raises:
+        ValueError: If the format is not one of OUTPUT_FORMATS
+    """
+    fmt = (format or OUTPUT_FORMAT).lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format: {format}. Must be one of: {', '.join(OUTPUT_FORMATS)}.")
+    return fmt
 
-# Initialize clients
-# For trading
-trade_client = TradingClient(API_KEY, API_SECRET, paper=PAPER)
-# For historical market data
-stock_historical_data_client = StockHistoricalDataClient(API_KEY, API_SECRET)
-# For streaming market data
-stock_data_stream_client = StockDataStream(API_KEY, API_SECRET, url_override=STREAM_DATA_WSS)
-# For option historical data
-option_historical_data_client = OptionHistoricalDataClient(api_key=API_KEY, secret_key=API_SECRET)
+def to_plain(value):
+    """Converts enums, dates, UUIDs, models and numpy scalars into JSON-friendly values."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return to_plain(value.model_dump())
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def to_record(obj) -> Dict[str, Any]:
+    """Converts an alpaca-py model, dict or plain object into a flat record."""
+    if isinstance(obj, BaseModel):
+        obj = dict(obj)
+    elif not isinstance(obj, dict):
+        obj = vars(obj)
+    return {key: to_plain(value) for key, value in obj.items()}
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), default=str)
+    return str(value)
+
+def render(records, fmt: str, fields: Optional[str] = None, meta: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Renders records as compact JSON, CSV or a fixed-width table.
+    
+    Args:
+        records: alpaca-py models, dicts or objects to render
+        fmt (str): 'json', 'csv' or 'table'
+        fields (Optional[str]): Comma-separated fields to keep, in order (default: all fields)
+        meta (Optional[Dict[str, Any]]): Extra values such as a paging cursor. JSON output
+            wraps the records as {"data": [...], **meta}; CSV and table output append
+            them as '# key: value' lines.
+    
+    Returns:
+        str: The rendered records
+    """
+    with tracer.span("render", {"format": fmt}) as span:
+        records = [to_record(record) for record in records]
+        if span is not None:
+            span.set("records", len(records))
+        if fields:
+            columns = [field.strip() for field in fields.split(",") if field.strip()]
+            records = [{column: record.get(column) for column in columns} for record in records]
+        else:
+            columns = list(dict.fromkeys(key for record in records for key in record))
+    
+        if fmt == "json":
+            payload = {**meta, "data": records} if meta else records
+            return json.dumps(payload, separators=(",", ":"), default=str)
+    
+        rows = [[_cell(record.get(column)) for column in columns] for record in records]
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerow(columns)
+            writer.writerows(rows)
+            text = buffer.getvalue()
+        else:
+            widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(columns)]
+            lines = [" ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in [columns] + rows]
+            text = "\n".join(lines) + "\n"
+        if meta:
+            text += "".join(f"# {key}: {value}\n" for key, value in meta.items())
+        return text
 
 # ============================================================================
 # Account Information Tools
 # ============================================================================
 
 @mcp.tool()
-async def get_account_info() -> str:
+async def get_account_info(format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats the current account information including balances and status.
     
+    Args:
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
     Returns:
         str: Formatted string containing account details including:
             - Account ID
@@ -73,7 +3343,10 @@ async def get_account_info() -> str:
             - Pattern Day Trader Status
             - Day Trades Remaining
     """
-    account = trade_client.get_account()
+    fmt = resolve_format(format)
+    account = await run_upstream("trading", "get_account")
+    if fmt != "text":
+        return render([account], fmt, fields)
     
     info = f"""
             Account Information:
@@ -93,10 +3366,17 @@ async def get_account_info() -> str:
     return info
 
 @mcp.tool()
-async def get_positions() -> str:
+async def get_positions(format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats all current positions in the portfolio.
     
+    Positions are served from the streamed account mirror when it is connected,
+    with prices no older than POSITION_MIRROR_TTL seconds.
+    
+    Args:
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
     Returns:
         str: Formatted string containing details of all open positions including:
             - Symbol
@@ -105,8 +3385,12 @@ async def get_positions() -> str:
             - Average Entry Price
             - Current Price
             - Unrealized P/L
+            - As Of (time the data was last synced)
     """
-    positions = trade_client.get_all_positions()
+    fmt = resolve_format(format)
+    positions, as_of = await trading_mirror.get_positions()
+    if fmt != "text":
+        return render(positions, fmt, fields, meta={"as_of": as_of.isoformat()})
     
     if not positions:
         return "No open positions found."
@@ -122,21 +3406,31 @@ async def get_positions() -> str:
                     Unrealized P/L: ${float(position.unrealized_pl):.2f} ({float(position.unrealized_plpc) * 100:.2f}%)
                     -------------------
                     """
+    result += f"As Of: {as_of.isoformat()}\n"
     return result
 
 @mcp.tool()
-async def get_open_position(symbol: str) -> str:
+async def get_open_position(symbol: str, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats details for a specific open position.
     
+    The position is served from the streamed account mirror when it is connected.
+    
     Args:
         symbol (str): The symbol name of the asset to get position for (e.g., 'AAPL', 'MSFT')
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing the position details or an error message
     """
     try:
-        position = trade_client.get_open_position(symbol)
+        fmt = resolve_format(format)
+        position, as_of = await trading_mirror.get_position(symbol)
+        if position is None:
+            return f"No open position found for {symbol}."
+        if fmt != "text":
+            return render([position], fmt, fields, meta={"as_of": as_of.isoformat()})
         
         # Check if it's an options position by looking for the options symbol pattern
         is_option = len(symbol) > 6 and any(c in symbol for c in ['C', 'P'])
@@ -152,21 +3446,105 @@ async def get_open_position(symbol: str) -> str:
                 Average Entry Price: ${float(position.avg_entry_price):.2f}
                 Current Price: ${float(position.current_price):.2f}
                 Unrealized P/L: ${float(position.unrealized_pl):.2f}
+                As Of: {as_of.isoformat()}
                 """ 
     except Exception as e:
         return f"Error fetching position: {str(e)}"
 
+@mcp.tool()
+async def get_portfolio_risk(format: Optional[str] = None, fields: Optional[str] = None) -> str:
+    """
+    Computes net Greeks, notional and concentration of all open positions, grouped by underlying.
+    
+    Positions are fetched once, underlying quotes and option snapshots are requested
+    in batches, and option legs without Greeks in their snapshot are priced locally.
+    
+    Args:
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
+    Returns:
+        str: Formatted string containing, per underlying:
+            - Underlying Price, Positions and Option Legs
+            - Market Value and Unrealized P/L
+            - Net Delta (shares and dollars) and Net Gamma
+            - Net Vega (per vol point) and Net Theta (per day)
+            - Notional and Share of Gross Delta
+    """
+    try:
+        fmt = resolve_format(format)
+        positions, as_of = await trading_mirror.get_positions()
+        if not positions:
+            return "No open positions found."
+        
+        options = [p.symbol for p in positions if p.asset_class == AssetClass.US_OPTION]
+        stocks = {p.symbol: float(p.current_price) for p in positions if p.asset_class != AssetClass.US_OPTION}
+        crypto = {p.symbol for p in positions if p.asset_class == AssetClass.CRYPTO}
+        underlyings = sorted({parse_option_symbol(symbol).underlying_symbol for symbol in options} | set(stocks))
+        
+        # Quote lookups issued together are combined into one request by the batcher
+        async def price(symbol: str) -> Optional[float]:
+            if symbol in crypto:
+                return stocks[symbol]
+            try:
+                return await underlying_price(symbol) or stocks.get(symbol)
+            except Exception:
+                return stocks.get(symbol)
+        
+        quoted, snapshots = await asyncio.gather(
+            asyncio.gather(*(price(symbol) for symbol in underlyings)),
+            option_snapshots.get_snapshots(options)
+        )
+        prices = {symbol: value for symbol, value in zip(underlyings, quoted) if value is not None}
+        exposures = portfolio_exposures(positions, prices, snapshots)
+        
+        totals = {
+            "market_value": sum(e["market_value"] or 0 for e in exposures),
+            "delta_dollars": sum(e["delta_dollars"] or 0 for e in exposures),
+            "net_vega": sum(e["net_vega"] or 0 for e in exposures),
+            "net_theta": sum(e["net_theta"] or 0 for e in exposures),
+        }
+        if fmt != "text":
+            return render(exposures, fmt, fields, meta={"totals": totals, "as_of": as_of.isoformat()})
+        
+        def num(value, spec):
+            return f"{value:{spec}}" if value is not None else "N/A"
+        
+        result = ["Portfolio Risk by Underlying:\n"]
+        result.append("-----------------------------\n")
+        for e in exposures:
+            result.append(
+                f"{e['underlying_symbol']} @ ${num(e['underlying_price'], ',.2f')}"
+                f"  ({e['positions']} positions, {e['option_legs']} option legs)\n"
+                f"  Market Value: ${num(e['market_value'], ',.2f')}  Unrealized P/L: ${num(e['unrealized_pl'], ',.2f')}\n"
+                f"  Delta: {num(e['net_delta'], ',.1f')} shares (${num(e['delta_dollars'], ',.0f')})"
+                f"  Gamma: {num(e['net_gamma'], ',.2f')} (${num(e['gamma_dollars_1pct'], ',.0f')} per 1%)\n"
+                f"  Vega: ${num(e['net_vega'], ',.2f')}  Theta: ${num(e['net_theta'], ',.2f')}/day"
+                f"  Notional: ${num(e['notional'], ',.0f')}  Concentration: {num(e['concentration'], '.1%')}\n"
+            )
+        result.append("-----------------------------\n")
+        result.append(
+            f"Total Market Value: ${totals['market_value']:,.2f}  Delta: ${totals['delta_dollars']:,.0f}"
+            f"  Vega: ${totals['net_vega']:,.2f}  Theta: ${totals['net_theta']:,.2f}/day\n"
+        )
+        result.append(f"Positions As Of: {as_of.isoformat()}\n")
+        return "".join(result)
+    except Exception as e:
+        return f"Error computing portfolio risk: {str(e)}"
+
 # ============================================================================
 # Market Data Tools
 # ============================================================================
 
 @mcp.tool()
-async def get_stock_quote(symbol: str) -> str:
+async def get_stock_quote(symbol: str, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats the latest quote for a stock.
     
     Args:
         symbol (str): Stock ticker symbol (e.g., AAPL, MSFT)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing:
@@ -177,11 +3555,17 @@ async def get_stock_quote(symbol: str) -> str:
             - Timestamp
     """
     try:
-        request_params = StockLatestQuoteRequest(symbol_or_symbols=symbol)
-        quotes = stock_historical_data_client.get_stock_latest_quote(request_params)
+        fmt = resolve_format(format)
         
-        if symbol in quotes:
-            quote = quotes[symbol]
+        # Serve from the streamed book when possible, otherwise ask the REST API
+        # Both paths use the stream's feed, so the answer does not depend on whether the symbol is streamed
+        quote = market_data_book.latest_quote(symbol)
+        if quote is None:
+            quote = await quote_batcher.get(symbol, feed=STREAM_DATA_FEED)
+        
+        if quote is not None:
+            if fmt != "text":
+                return render([quote], fmt, fields)
             return f"""
                     Latest Quote for {symbol}:
                     ------------------------
@@ -197,17 +3581,75 @@ async def get_stock_quote(symbol: str) -> str:
         return f"Error fetching quote for {symbol}: {str(e)}"
 
 @mcp.tool()
-async def get_stock_bars(symbol: str, days: int = 5) -> str:
+async def get_stock_quotes(symbols: List[str], format: Optional[str] = None, fields: Optional[str] = None) -> str:
+    """
+    Retrieves and formats the latest quotes for several stocks in one call.
+    
+    Args:
+        symbols (List[str]): Stock ticker symbols (e.g., ['AAPL', 'MSFT', 'NVDA'])
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
+    Returns:
+        str: Formatted string containing, for each symbol:
+            - Ask Price
+            - Bid Price
+            - Ask Size
+            - Bid Size
+            - Timestamp
+    """
+    try:
+        fmt = resolve_format(format)
+        if not symbols:
+            return "No symbols provided."
+        
+        # Serve what we can from the streamed book and batch the rest into one request
+        quotes = {}
+        missing = []
+        for symbol in symbols:
+            quote = market_data_book.latest_quote(symbol)
+            if quote is None:
+                missing.append(symbol)
+            else:
+                quotes[symbol] = quote
+        if missing:
+            quotes.update(await quote_batcher.get_many(missing, feed=STREAM_DATA_FEED))
+        
+        if fmt != "text":
+            return render([quotes[symbol] for symbol in symbols if symbol in quotes], fmt, fields)
+        
+        result = [f"Latest Quotes ({len(quotes)} of {len(symbols)} symbols):", "------------------------"]
+        for symbol in symbols:
+            quote = quotes.get(symbol)
+            if quote is None:
+                result.append(f"{symbol}: No quote data found.")
+                continue
+            result.append(
+                f"{symbol}: Ask ${quote.ask_price:.2f} x {quote.ask_size}, "
+                f"Bid ${quote.bid_price:.2f} x {quote.bid_size}, Timestamp: {quote.timestamp}"
+            )
+        return "\n".join(result)
+    except Exception as e:
+        return f"Error fetching quotes: {str(e)}"
+
+@mcp.tool()
+async def get_stock_bars(symbol: str, days: int = 5, timeframe: str = "1Day", format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats historical price bars for a stock.
     
+    Bars are kept in a local store, so only the part of the window that has
+    not been fetched before is requested from Alpaca.
+    
     Args:
         symbol (str): Stock ticker symbol (e.g., AAPL, MSFT)
-        days (int): Number of trading days to look back (default: 5)
+        days (int): Number of days to look back (default: 5)
+        timeframe (str): Bar size: '1Min', '1Hour' or '1Day' (default: '1Day')
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing historical price data including:
-            - Date
+            - Date (or time for intraday bars)
             - Open
             - High
             - Low
@@ -215,31 +3657,51 @@ async def get_stock_bars(symbol: str, days: int = 5) -> str:
             - Volume
     """
     try:
-        # Calculate start time based on days
-        start_time = datetime.now().date() - timedelta(days=days)
+        fmt = resolve_format(format)
+        if timeframe not in BAR_TIMEFRAMES:
+            return f"Invalid timeframe: {timeframe}. Must be one of: {', '.join(BAR_TIMEFRAMES)}."
+        symbol = symbol.upper()
         
-        request_params = StockBarsRequest(
-            symbol_or_symbols=symbol,
-            timeframe=TimeFrame.Day,
-            start=start_time
-        )
+        # Calculate start time based on days
+        start_time = datetime.combine(datetime.now(MARKET_TZ).date() - timedelta(days=days), datetime.min.time(), MARKET_TZ)
         
-        bars = stock_historical_data_client.get_stock_bars(request_params)
+        bars = await bar_store.get_bars(symbol, timeframe, start_time, datetime.now(timezone.utc))
         
-        # if symbol in bars and bars[symbol]:
-        if bars[symbol]:
-            result = f"Historical Data for {symbol} (Last {days} trading days):\n"
-            result += "---------------------------------------------------\n"
+        if len(bars["timestamp"]):
+            if fmt != "text":
+                timestamps = bars["timestamp"].astype("datetime64[ns]").astype(str)
+                return render([
+                    {"timestamp": f"{ts}Z", **{column: float(bars[column][i]) for column in BarStore.COLUMNS[1:]}}
+                    for i, ts in enumerate(timestamps)
+                ], fmt, fields)
             
-            for bar in bars[symbol]:
-                result += f"Date: {bar.timestamp.date()}, Open: ${bar.open:.2f}, High: ${bar.high:.2f}, Low: ${bar.low:.2f}, Close: ${bar.close:.2f}, Volume: {bar.volume}\n"
+            result = [f"Historical Data for {symbol} (Last {days} days, {timeframe} bars):"]
+            result.append("---------------------------------------------------")
             
-            return result
+            for ts, open_, high, low, close, volume in zip(
+                bars["timestamp"], bars["open"], bars["high"], bars["low"], bars["close"], bars["volume"]
+            ):
+                bar_time = datetime.fromtimestamp(int(ts) / 1_000_000_000, timezone.utc)
+                label = bar_time.date() if timeframe == "1Day" else bar_time.astimezone(MARKET_TZ)
+                result.append(f"Date: {label}, Open: ${open_:.2f}, High: ${high:.2f}, Low: ${low:.2f}, Close: ${close:.2f}, Volume: {float(volume)}")
+            
+            return "\n".join(result) + "\n"
         else:
             return f"No historical data found for {symbol} in the last {days} days."
     except Exception as e:
         return f"Error fetching historical data for {symbol}: {str(e)}"
 
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Encodes paging state as an opaque cursor string."""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decodes a cursor produced by encode_cursor."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+
 @mcp.tool()
 async def get_stock_trades(
     symbol: str,
@@ -248,11 +3710,18 @@ async def get_stock_trades(
     sort: Optional[Sort] = Sort.ASC,
     feed: Optional[DataFeed] = None,
     currency: Optional[SupportedCurrencies] = None,
-    asof: Optional[str] = None
+    asof: Optional[str] = None,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Retrieves and formats historical trades for a stock.
     
+    Trades are fetched page by page and the response is capped in size. When more
+    trades are available, the response ends with a cursor; pass it back (with the
+    same symbol) to continue where the previous response stopped.
+    
     Args:
         symbol (str): Stock ticker symbol (e.g., 'AAPL', 'MSFT')
         days (int): Number of days to look back (default: 5)
@@ -261,35 +3730,63 @@ async def get_stock_trades(
         feed (Optional[DataFeed]): The stock data feed to retrieve from
         currency (Optional[SupportedCurrencies]): Currency for prices (default: USD)
         asof (Optional[str]): The asof date in YYYY-MM-DD format
+        cursor (Optional[str]): Cursor from a previous response; the other filters are taken from it
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing trade history or an error message
     """
     try:
-        # Calculate start time based on days
-        start_time = datetime.now() - timedelta(days=days)
+        fmt = resolve_format(format)
+        # The response is keyed by the upper-case symbol
+        symbol = symbol.upper()
+        if cursor:
+            state = decode_cursor(cursor)
+        else:
+            # Calculate start time based on days
+            start_time = datetime.now() - timedelta(days=days)
+            
+            # Create the request object with all available parameters
+            request_params = StockTradesRequest(
+                symbol_or_symbols=symbol,
+                start=start_time,
+                end=datetime.now(),
+                limit=limit,
+                sort=sort,
+                feed=feed,
+                currency=currency,
+                asof=asof
+            )
+            state = {"params": request_params.to_request_fields(), "page_token": None, "offset": 0, "returned": 0}
         
-        # Create the request object with all available parameters
-        request_params = StockTradesRequest(
-            symbol_or_symbols=symbol,
-            start=start_time,
-            end=datetime.now(),
-            limit=limit,
-            sort=sort,
-            feed=feed,
-            currency=currency,
-            asof=asof
-        )
+        params = dict(state["params"])
+        remaining = params.pop("limit", None)
+        if remaining is not None:
+            remaining -= state["returned"]
+        page_token = state["page_token"]
+        offset = state["offset"]
         
-        # Get the trades
-        trades = stock_historical_data_client.get_stock_trades(request_params)
+        if cursor:
+            header = f"Historical Trades for {symbol} (continued):\n"
+        else:
+            header = f"Historical Trades for {symbol} (Last {days} days):\n"
+        header += "---------------------------------------------------\n"
+        entries = []
+        size = len(header)
+        next_state = None
         
-        if symbol in trades:
-            result = f"Historical Trades for {symbol} (Last {days} days):\n"
-            result += "---------------------------------------------------\n"
-            
-            for trade in trades[symbol]:
-                result += f"""
+        # Only one page of trades is held at a time; stop once the response budget is used up
+        while True:
+            page = await run_upstream(
+                "stock_data", "get", "/stocks/trades", {**params, "limit": TRADES_PAGE_SIZE, "page_token": page_token}
+            )
+            raw_trades = (page.get("trades") or {}).get(symbol, [])
+            index = offset
+            while index < len(raw_trades) and (remaining is None or remaining > 0):
+                trade = Trade(symbol, raw_trades[index])
+                if fmt == "text":
+                    entry = f"""
                     Time: {trade.timestamp}
                     Price: ${float(trade.price):.6f}
                     Size: {trade.size}
@@ -298,9 +3795,48 @@ async def get_stock_trades(
                     Conditions: {trade.conditions}
                     -------------------
                     """
-            return result
-        else:
+                    entry_size = len(entry)
+                else:
+                    entry = to_record(trade)
+                    entry_size = len(json.dumps(entry, default=str))
+                if entries and size + entry_size > TRADES_RESPONSE_BUDGET:
+                    break
+                entries.append(entry)
+                size += entry_size
+                index += 1
+                if remaining is not None:
+                    remaining -= 1
+            
+            if remaining is not None and remaining <= 0:
+                break
+            if index < len(raw_trades):
+                # Budget reached part way through this page
+                next_state = {"page_token": page_token, "offset": index}
+                break
+            page_token = page.get("next_page_token")
+            offset = 0
+            if not page_token:
+                break
+            if size >= TRADES_RESPONSE_BUDGET:
+                next_state = {"page_token": page_token, "offset": 0}
+                break
+        
+        if not entries:
             return f"No trade data found for {symbol} in the last {days} days."
+        
+        if next_state is not None:
+            next_state = {**state, **next_state, "returned": state["returned"] + len(entries)}
+        if fmt != "text":
+            meta = {"next_cursor": encode_cursor(next_state)} if next_state is not None else None
+            return render(entries, fmt, fields, meta)
+        
+        result = header + "".join(entries)
+        if next_state is not None:
+            result += (
+                f"\nShowing {len(entries)} trades. More trades are available; "
+                f"call again with cursor='{encode_cursor(next_state)}' to continue.\n"
+            )
+        return result
     except Exception as e:
         return f"Error fetching trades: {str(e)}"
 
@@ -308,31 +3844,37 @@ async def get_stock_trades(
 async def get_stock_latest_trade(
     symbol: str,
     feed: Optional[DataFeed] = None,
-    currency: Optional[SupportedCurrencies] = None
+    currency: Optional[SupportedCurrencies] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """Get the latest trade for a stock.
     
     Args:
         symbol: Stock ticker symbol (e.g., 'AAPL', 'MSFT')
-        feed: The stock data feed to retrieve from (optional)
+        feed: The stock data feed to retrieve from (optional, defaults to the STREAM_DATA_FEED setting)
         currency: The currency for prices (optional, defaults to USD)
+        format: Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields: Comma-separated fields to include in json, csv or table output
     
     Returns:
         A formatted string containing the latest trade details or an error message
     """
     try:
-        # Create the request object with all available parameters
-        request_params = StockLatestTradeRequest(
-            symbol_or_symbols=symbol,
-            feed=feed,
-            currency=currency
-        )
+        fmt = resolve_format(format)
         
-        # Get the latest trade
-        latest_trades = stock_historical_data_client.get_stock_latest_trade(request_params)
+        # The streamed book only carries the stream's feed in USD
+        trade = None
+        if feed in (None, STREAM_DATA_FEED) and currency is None:
+            trade = market_data_book.latest_trade(symbol)
         
-        if symbol in latest_trades:
-            trade = latest_trades[symbol]
+        if trade is None:
+            # Concurrent lookups are batched into one latest-trade request
+            trade = await trade_batcher.get(symbol, feed=feed or STREAM_DATA_FEED, currency=currency)
+        
+        if trade is not None:
+            if fmt != "text":
+                return render([trade], fmt, fields)
             return f"""
                 Latest Trade for {symbol}:
                 ---------------------------
@@ -352,31 +3894,37 @@ async def get_stock_latest_trade(
 async def get_stock_latest_bar(
     symbol: str,
     feed: Optional[DataFeed] = None,
-    currency: Optional[SupportedCurrencies] = None
+    currency: Optional[SupportedCurrencies] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """Get the latest minute bar for a stock.
     
     Args:
         symbol: Stock ticker symbol (e.g., 'AAPL', 'MSFT')
-        feed: The stock data feed to retrieve from (optional)
+        feed: The stock data feed to retrieve from (optional, defaults to the STREAM_DATA_FEED setting)
         currency: The currency for prices (optional, defaults to USD)
+        format: Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields: Comma-separated fields to include in json, csv or table output
     
     Returns:
         A formatted string containing the latest bar details or an error message
     """
     try:
-        # Create the request object with all available parameters
-        request_params = StockLatestBarRequest(
-            symbol_or_symbols=symbol,
-            feed=feed,
-            currency=currency
-        )
+        fmt = resolve_format(format)
         
-        # Get the latest bar
-        latest_bars = stock_historical_data_client.get_stock_latest_bar(request_params)
+        # The streamed book only carries the stream's feed in USD
+        bar = None
+        if feed in (None, STREAM_DATA_FEED) and currency is None:
+            bar = market_data_book.latest_bar(symbol)
         
-        if symbol in latest_bars:
-            bar = latest_bars[symbol]
+        if bar is None:
+            # Concurrent lookups are batched into one latest-bar request
+            bar = await bar_batcher.get(symbol, feed=feed or STREAM_DATA_FEED, currency=currency)
+        
+        if bar is not None:
+            if fmt != "text":
+                return render([bar], fmt, fields)
             return f"""
                 Latest Minute Bar for {symbol}:
                 ---------------------------
@@ -397,13 +3945,18 @@ async def get_stock_latest_bar(
 # ============================================================================
 
 @mcp.tool()
-async def get_orders(status: str = "all", limit: int = 10) -> str:
+async def get_orders(status: str = "all", limit: int = 10, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats orders with the specified status.
     
+    Orders are served from the streamed account mirror when it is connected and
+    holds enough history for the request.
+    
     Args:
         status (str): Order status to filter by (open, closed, all)
         limit (int): Maximum number of orders to return (default: 10)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing order details including:
@@ -415,8 +3968,11 @@ async def get_orders(status: str = "all", limit: int = 10) -> str:
             - Status
             - Submission Time
             - Fill Details (if applicable)
+            - As Of (time the data was last synced)
     """
     try:
+        fmt = resolve_format(format)
+        
         # Convert status string to enum
         if status.lower() == "open":
             query_status = QueryOrderStatus.OPEN
@@ -425,15 +3981,12 @@ async def get_orders(status: str = "all", limit: int = 10) -> str:
         else:
             query_status = QueryOrderStatus.ALL
             
-        request_params = GetOrdersRequest(
-            status=query_status,
-            limit=limit
-        )
-        
-        orders = trade_client.get_orders(request_params)
+        orders, as_of = await trading_mirror.get_orders(query_status, limit)
         
         if not orders:
             return f"No {status} orders found."
+        if fmt != "text":
+            return render(orders, fmt, fields, meta={"as_of": as_of.isoformat()})
         
         result = f"{status.capitalize()} Orders (Last {len(orders)}):\n"
         result += "-----------------------------------\n"
@@ -455,11 +4008,163 @@ async def get_orders(status: str = "all", limit: int = 10) -> str:
                 result += f"Filled Price: ${float(order.filled_avg_price):.2f}\n"
                 
             result += "-----------------------------------\n"
-            
+        
+        result += f"As Of: {as_of.isoformat()}\n"
         return result
     except Exception as e:
         return f"Error fetching orders: {str(e)}"
 
+@mcp.tool(annotations=ToolAnnotations(readOnlyHint=True))
+async def wait_for_order_fill(order_id: str, timeout_seconds: int = 60, format: Optional[str] = None, fields: Optional[str] = None) -> str:
+    """
+    Waits until an order is filled or otherwise closed (canceled, expired, rejected, replaced).
+    
+    The wait ends as soon as the trade updates stream reports the final state, so
+    there is no need to poll get_orders. Without the stream it checks the order every
+    few seconds instead.
+    
+    Args:
+        order_id (str): The ID of the order to wait for
+        timeout_seconds (int): Maximum number of seconds to wait (default: 60, max: 600)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
+    Returns:
+        str: Formatted string containing the order's final or current state:
+            - Status (and whether the wait timed out)
+            - Filled Quantity and Average Fill Price
+            - Filled At
+    """
+    try:
+        fmt = resolve_format(format)
+        timeout = min(max(timeout_seconds, 0), 600)
+        order = await trading_mirror.wait_for_order(order_id, timeout)
+        done = order.status in TradingMirror.TERMINAL_STATUSES
+        if fmt != "text":
+            return render([order], fmt, fields, meta={"timed_out": not done})
+        
+        filled_price = f"${float(order.filled_avg_price):.2f}" if order.filled_avg_price else "N/A"
+        return f"""
+                Order {order_id} {'is ' + order.status.value if done else f'still {order.status.value} after {timeout} seconds'}:
+                ---------------------------
+                Symbol: {order.symbol}
+                Side: {order.side}
+                Quantity: {order.qty}
+                Filled Quantity: {order.filled_qty}
+                Average Fill Price: {filled_price}
+                Filled At: {order.filled_at}
+                """
+    except Exception as e:
+        return f"Error waiting for order {order_id}: {str(e)}"
+
+class InvalidOrderError(ValueError):
+    """Raised when order parameters are rejected before anything is sent to Alpaca."""
+
+def build_stock_order_request(
+    symbol: str,
+    side: str,
+    quantity: float,
+    order_type: str = "market",
+    time_in_force: str = "day",
+    limit_price: float = None,
+    stop_price: float = None,
+    trail_price: float = None,
+    trail_percent: float = None,
+    extended_hours: bool = False,
+    client_order_id: str = None
+):
+    """
+    Builds the Alpaca request for a MARKET, LIMIT, STOP, STOP_LIMIT or TRAILING_STOP stock order.
+    
+    Raises:
+        InvalidOrderError: If the side, time in force or order type is invalid, or a price the type needs is missing
+    """
+    # Unique per order, so orders built within the same second are not rejected as duplicates
+    client_order_id = client_order_id or f"order_{int(time.time())}_{uuid4().hex[:8]}"
+    
+    # Validate side
+    if side.lower() == "buy":
+        order_side = OrderSide.BUY
+    elif side.lower() == "sell":
+        order_side = OrderSide.SELL
+    else:
+        raise InvalidOrderError(f"Invalid order side: {side}. Must be 'buy' or 'sell'.")
+
+    # Validate time_in_force
+    try:
+        tif_enum = TimeInForce[time_in_force.upper()]
+    except KeyError:
+        raise InvalidOrderError(f"Invalid time_in_force: {time_in_force}.")
+
+    # Validate order_type
+    order_type_upper = order_type.upper()
+    if order_type_upper == "MARKET":
+        return MarketOrderRequest(
+            symbol=symbol,
+            qty=quantity,
+            side=order_side,
+            type=OrderType.MARKET,
+            time_in_force=tif_enum,
+            extended_hours=extended_hours,
+            client_order_id=client_order_id
+        )
+    elif order_type_upper == "LIMIT":
+        if limit_price is None:
+            raise InvalidOrderError("limit_price is required for LIMIT orders.")
+        return LimitOrderRequest(
+            symbol=symbol,
+            qty=quantity,
+            side=order_side,
+            type=OrderType.LIMIT,
+            time_in_force=tif_enum,
+            limit_price=limit_price,
+            extended_hours=extended_hours,
+            client_order_id=client_order_id
+        )
+    elif order_type_upper == "STOP":
+        if stop_price is None:
+            raise InvalidOrderError("stop_price is required for STOP orders.")
+        return StopOrderRequest(
+            symbol=symbol,
+            qty=quantity,
+            side=order_side,
+            type=OrderType.STOP,
+            time_in_force=tif_enum,
+            stop_price=stop_price,
+            extended_hours=extended_hours,
+            client_order_id=client_order_id
+        )
+    elif order_type_upper == "STOP_LIMIT":
+        if stop_price is None or limit_price is None:
+            raise InvalidOrderError("Both stop_price and limit_price are required for STOP_LIMIT orders.")
+        return StopLimitOrderRequest(
+            symbol=symbol,
+            qty=quantity,
+            side=order_side,
+            type=OrderType.STOP_LIMIT,
+            time_in_force=tif_enum,
+            stop_price=stop_price,
+            limit_price=limit_price,
+            extended_hours=extended_hours,
+            client_order_id=client_order_id
+        )
+    elif order_type_upper == "TRAILING_STOP":
+        if trail_price is None and trail_percent is None:
+            raise InvalidOrderError("Either trail_price or trail_percent is required for TRAILING_STOP orders.")
+        return TrailingStopOrderRequest(
+            symbol=symbol,
+            qty=quantity,
+            side=order_side,
+            type=OrderType.TRAILING_STOP,
+            time_in_force=tif_enum,
+            trail_price=trail_price,
+            trail_percent=trail_percent,
+            extended_hours=extended_hours,
+            client_order_id=client_order_id
+        )
+    else:
+        raise InvalidOrderError(f"Invalid order type: {order_type}. Must be one of: MARKET, LIMIT, STOP, STOP_LIMIT, TRAILING_STOP.")
+
 @mcp.tool()
 async def place_stock_order(
     symbol: str,
@@ -472,7 +4177,9 @@ async def place_stock_order(
     trail_price: float = None,
     trail_percent: float = None,
     extended_hours: bool = False,
-    client_order_id: str = None
+    client_order_id: str = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Places an order of any supported type (MARKET, LIMIT, STOP, STOP_LIMIT, TRAILING_STOP) using the correct Alpaca request class.
@@ -489,96 +4196,33 @@ async def place_stock_order(
         trail_percent (float): Trail percent (for TRAILING_STOP)
         extended_hours (bool): Allow execution during extended hours (default: False)
         client_order_id (str): Optional custom identifier for the order
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
 
     Returns:
         str: Formatted string containing order details or error message.
     """
     try:
-        # Validate side
-        if side.lower() == "buy":
-            order_side = OrderSide.BUY
-        elif side.lower() == "sell":
-            order_side = OrderSide.SELL
-        else:
-            return f"Invalid order side: {side}. Must be 'buy' or 'sell'."
-
-        # Validate time_in_force
-        try:
-            tif_enum = TimeInForce[time_in_force.upper()]
-        except KeyError:
-            return f"Invalid time_in_force: {time_in_force}."
-
-        # Validate order_type
-        order_type_upper = order_type.upper()
-        if order_type_upper == "MARKET":
-            order_data = MarketOrderRequest(
-                symbol=symbol,
-                qty=quantity,
-                side=order_side,
-                type=OrderType.MARKET,
-                time_in_force=tif_enum,
-                extended_hours=extended_hours,
-                client_order_id=client_order_id or f"order_{int(time.time())}"
-            )
-        elif order_type_upper == "LIMIT":
-            if limit_price is None:
-                return "limit_price is required for LIMIT orders."
-            order_data = LimitOrderRequest(
-                symbol=symbol,
-                qty=quantity,
-                side=order_side,
-                type=OrderType.LIMIT,
-                time_in_force=tif_enum,
-                limit_price=limit_price,
-                extended_hours=extended_hours,
-                client_order_id=client_order_id or f"order_{int(time.time())}"
-            )
-        elif order_type_upper == "STOP":
-            if stop_price is None:
-                return "stop_price is required for STOP orders."
-            order_data = StopOrderRequest(
-                symbol=symbol,
-                qty=quantity,
-                side=order_side,
-                type=OrderType.STOP,
-                time_in_force=tif_enum,
-                stop_price=stop_price,
-                extended_hours=extended_hours,
-                client_order_id=client_order_id or f"order_{int(time.time())}"
-            )
-        elif order_type_upper == "STOP_LIMIT":
-            if stop_price is None or limit_price is None:
-                return "Both stop_price and limit_price are required for STOP_LIMIT orders."
-            order_data = StopLimitOrderRequest(
-                symbol=symbol,
-                qty=quantity,
-                side=order_side,
-                type=OrderType.STOP_LIMIT,
-                time_in_force=tif_enum,
-                stop_price=stop_price,
-                limit_price=limit_price,
-                extended_hours=extended_hours,
-                client_order_id=client_order_id or f"order_{int(time.time())}"
-            )
-        elif order_type_upper == "TRAILING_STOP":
-            if trail_price is None and trail_percent is None:
-                return "Either trail_price or trail_percent is required for TRAILING_STOP orders."
-            order_data = TrailingStopOrderRequest(
-                symbol=symbol,
-                qty=quantity,
-                side=order_side,
-                type=OrderType.TRAILING_STOP,
-                time_in_force=tif_enum,
-                trail_price=trail_price,
-                trail_percent=trail_percent,
-                extended_hours=extended_hours,
-                client_order_id=client_order_id or f"order_{int(time.time())}"
-            )
-        else:
-            return f"Invalid order type: {order_type}. Must be one of: MARKET, LIMIT, STOP, STOP_LIMIT, TRAILING_STOP."
+        fmt = resolve_format(format)
+        
+        order_data = build_stock_order_request(
+            symbol=symbol,
+            side=side,
+            quantity=quantity,
+            order_type=order_type,
+            time_in_force=time_in_force,
+            limit_price=limit_price,
+            stop_price=stop_price,
+            trail_price=trail_price,
+            trail_percent=trail_percent,
+            extended_hours=extended_hours,
+            client_order_id=client_order_id
+        )
 
         # Submit order
-        order = trade_client.submit_order(order_data)
+        order = await run_upstream("trading", "submit_order", order_data)
+        if fmt != "text":
+            return render([order], fmt, fields)
         return f"""
 Order Placed Successfully:
 -------------------------
@@ -591,23 +4235,152 @@ Time In Force: {order.time_in_force}
 Status: {order.status}
 Client Order ID: {order.client_order_id}
 """
+    except InvalidOrderError as e:
+        return str(e)
     except Exception as e:
         return f"Error placing order: {str(e)}"
 
 @mcp.tool()
-async def cancel_all_orders() -> str:
+async def place_stock_orders(
+    orders: List[Dict[str, Any]],
+    format: Optional[str] = None,
+    fields: Optional[str] = None
+) -> str:
+    """
+    Places several stock orders in one call, e.g. for a portfolio rebalance.
+    
+    Every order is validated before any is sent; if one is invalid, nothing is
+    submitted. Valid batches are submitted concurrently, at the pace the
+    account's order-entry rate limit allows, and each order's outcome is
+    reported on its own row.
+    
+    Args:
+        orders (List[Dict[str, Any]]): Orders to place. Each takes the parameters of place_stock_order:
+            symbol, side, quantity, and optionally order_type, time_in_force, limit_price,
+            stop_price, trail_price, trail_percent, extended_hours and client_order_id
+            (e.g., [{"symbol": "AAPL", "side": "buy", "quantity": 10, "order_type": "limit", "limit_price": 190}])
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
+    Returns:
+        str: Table with one row per order containing:
+            - Symbol, Side, Quantity and Type
+            - Result (accepted, rejected or invalid) and Reason
+            - Order ID, Client Order ID and Status
+    """
+    try:
+        fmt = resolve_format(format)
+        if not orders:
+            return "No orders given."
+        if len(orders) > ORDER_BATCH_MAX:
+            return f"Too many orders: {len(orders)}. At most {ORDER_BATCH_MAX} can be placed per call."
+        
+        allowed = {
+            "symbol", "side", "quantity", "order_type", "time_in_force", "limit_price",
+            "stop_price", "trail_price", "trail_percent", "extended_hours", "client_order_id",
+        }
+        results = []
+        requests = []
+        for spec in orders:
+            result = {
+                "symbol": spec.get("symbol"),
+                "side": spec.get("side"),
+                "quantity": spec.get("quantity"),
+                "order_type": spec.get("order_type", "market"),
+                "result": None,
+                "reason": None,
+                "order_id": None,
+                "client_order_id": None,
+                "status": None,
+            }
+            results.append(result)
+            try:
+                unknown = sorted(set(spec) - allowed)
+                if unknown:
+                    raise InvalidOrderError(f"Unknown order parameters: {', '.join(unknown)}.")
+                missing = [name for name in ("symbol", "side", "quantity") if spec.get(name) is None]
+                if missing:
+                    raise InvalidOrderError(f"Missing required parameters: {', '.join(missing)}.")
+                not_text = [
+                    name for name in ("symbol", "side", "order_type", "time_in_force", "client_order_id")
+                    if spec.get(name) is not None and not isinstance(spec[name], str)
+                ]
+                if not_text:
+                    raise InvalidOrderError(f"Parameters must be strings: {', '.join(not_text)}.")
+                request = build_stock_order_request(**spec)
+                result["client_order_id"] = request.client_order_id
+                requests.append(request)
+            except InvalidOrderError as e:
+                result["result"] = "invalid"
+                result["reason"] = str(e)
+            except ValueError as e:
+                # Field validation errors from the request models
+                result["result"] = "invalid"
+                result["reason"] = "; ".join(error["msg"] for error in e.errors()) if hasattr(e, "errors") else str(e)
+        
+        invalid = [result for result in results if result["result"] == "invalid"]
+        if invalid:
+            for result in results:
+                if result["result"] is None:
+                    result["result"] = "not_submitted"
+        else:
+            client_order_ids = [request.client_order_id for request in requests]
+            duplicates = sorted({cid for cid in client_order_ids if client_order_ids.count(cid) > 1})
+            if duplicates:
+                return f"Duplicate client_order_id values: {', '.join(duplicates)}. Nothing was submitted."
+            
+            # The account's rate limiter paces the submissions; this only bounds how many are in flight
+            semaphore = asyncio.Semaphore(ORDER_BATCH_CONCURRENCY)
+            
+            async def submit(request, result: Dict[str, Any]) -> None:
+                async with semaphore:
+                    try:
+                        order = await run_upstream("trading", "submit_order", request)
+                    except Exception as e:
+                        result["result"] = "rejected"
+                        result["reason"] = error_message(e)
+                        return
+                result["result"] = "accepted"
+                result["order_id"] = str(order.id)
+                result["status"] = order.status
+            
+            await asyncio.gather(*(submit(request, result) for request, result in zip(requests, results)))
+        
+        accepted = sum(result["result"] == "accepted" for result in results)
+        summary = {"accepted": accepted, "rejected": sum(result["result"] == "rejected" for result in results), "invalid": len(invalid)}
+        if fmt != "text":
+            return render(results, fmt, fields, meta=summary)
+        
+        if invalid:
+            header = f"Batch not submitted: {len(invalid)} of {len(results)} orders are invalid.\n\n"
+        else:
+            header = f"Placed {accepted} of {len(results)} orders ({summary['rejected']} rejected).\n\n"
+        return header + render(results, "table", fields)
+    except Exception as e:
+        return f"Error placing orders: {str(e)}"
+
+@mcp.tool()
+async def cancel_all_orders(format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Cancel all open orders.
     
+    Args:
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
     Returns:
         A formatted string containing the status of each cancelled order.
     """
     try:
+        fmt = resolve_format(format)
+        
         # Cancel all orders
-        cancel_responses = trade_client.cancel_orders()
+        cancel_responses = await run_upstream("trading", "cancel_orders")
         
         if not cancel_responses:
             return "No orders were found to cancel."
+        if fmt != "text":
+            return render(cancel_responses, fmt, fields)
         
         # Format the response
         response_parts = ["Order Cancellation Results:"]
@@ -627,30 +4400,37 @@ async def cancel_all_orders() -> str:
         return f"Error cancelling orders: {str(e)}"
 
 @mcp.tool()
-async def cancel_order_by_id(order_id: str) -> str:
+async def cancel_order_by_id(order_id: str, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Cancel a specific order by its ID.
     
     Args:
         order_id: The UUID of the order to cancel
+        format: Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields: Comma-separated fields to include in json, csv or table output
         
     Returns:
         A formatted string containing the status of the cancelled order.
     """
     try:
+        fmt = resolve_format(format)
+        
         # Cancel the specific order
-        response = trade_client.cancel_order_by_id(order_id)
+        response = await run_upstream("trading", "cancel_order_by_id", order_id)
         
-        # Format the response
-        status = "Success" if response.status == 200 else "Failed"
+        if fmt != "text":
+            return render([response if response is not None else {"id": order_id}], fmt, fields)
+        
+        # Format the response; a successful cancellation is answered with 204 and no body
+        status = "Success" if response is None or response.status == 200 else "Failed"
         result = f"""
         Order Cancellation Result:
         ------------------------
-        Order ID: {response.id}
+        Order ID: {response.id if response is not None else order_id}
         Status: {status}
         """
         
-        if response.body:
+        if response is not None and response.body:
             result += f"Details: {response.body}\n"
             
         return result
@@ -663,7 +4443,13 @@ async def cancel_order_by_id(order_id: str) -> str:
 # ============================================================================
 
 @mcp.tool()
-async def close_position(symbol: str, qty: Optional[str] = None, percentage: Optional[str] = None) -> str:
+async def close_position(
+    symbol: str,
+    qty: Optional[str] = None,
+    percentage: Optional[str] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
+) -> str:
     """
     Closes a specific position for a single symbol.
     
@@ -671,11 +4457,15 @@ async def close_position(symbol: str, qty: Optional[str] = None, percentage: Opt
         symbol (str): The symbol of the position to close
         qty (Optional[str]): Optional number of shares to liquidate
         percentage (Optional[str]): Optional percentage of shares to liquidate (must result in at least 1 share)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing position closure details or error message
     """
     try:
+        fmt = resolve_format(format)
+        
         # Create close position request if options are provided
         close_options = None
         if qty or percentage:
@@ -685,7 +4475,9 @@ async def close_position(symbol: str, qty: Optional[str] = None, percentage: Opt
             )
         
         # Close the position
-        order = trade_client.close_position(symbol, close_options)
+        order = await run_upstream("trading", "close_position", symbol, close_options)
+        if fmt != "text":
+            return render([order], fmt, fields)
         
         return f"""
                 Position Closed Successfully:
@@ -714,22 +4506,28 @@ async def close_position(symbol: str, qty: Optional[str] = None, percentage: Opt
         return f"Error closing position: {str(e)}"
     
 @mcp.tool()
-async def close_all_positions(cancel_orders: bool = False) -> str:
+async def close_all_positions(cancel_orders: bool = False, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Closes all open positions.
     
     Args:
         cancel_orders (bool): If True, cancels all open orders before liquidating positions
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing position closure results
     """
     try:
+        fmt = resolve_format(format)
+        
         # Close all positions
-        close_responses = trade_client.close_all_positions(cancel_orders=cancel_orders)
+        close_responses = await run_upstream("trading", "close_all_positions", cancel_orders=cancel_orders)
         
         if not close_responses:
             return "No positions were found to close."
+        if fmt != "text":
+            return render(close_responses, fmt, fields)
         
         # Format the response
         response_parts = ["Position Closure Results:"]
@@ -752,12 +4550,14 @@ async def close_all_positions(cancel_orders: bool = False) -> str:
 # ============================================================================
 
 @mcp.tool()
-async def get_asset_info(symbol: str) -> str:
+async def get_asset_info(symbol: str, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats detailed information about a specific asset.
     
     Args:
         symbol (str): The symbol of the asset to get information for
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing asset details including:
@@ -768,7 +4568,10 @@ async def get_asset_info(symbol: str) -> str:
             - Trading Properties
     """
     try:
-        asset = trade_client.get_asset(symbol)
+        fmt = resolve_format(format)
+        asset = await asset_catalog.get(symbol)
+        if fmt != "text":
+            return render([asset], fmt, fields)
         return f"""
                 Asset Information for {symbol}:
                 ----------------------------
@@ -790,7 +4593,9 @@ async def get_all_assets(
     status: Optional[str] = None,
     asset_class: Optional[str] = None,
     exchange: Optional[str] = None,
-    attributes: Optional[str] = None
+    attributes: Optional[str] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Get all available assets with optional filtering.
@@ -799,24 +4604,28 @@ async def get_all_assets(
         status: Filter by asset status (e.g., 'active', 'inactive')
         asset_class: Filter by asset class (e.g., 'us_equity', 'crypto')
         exchange: Filter by exchange (e.g., 'NYSE', 'NASDAQ')
-        attributes: Comma-separated values to query for multiple attributes
+        attributes: Comma-separated attributes. Trading flags (tradable, marginable, shortable,
+            easy_to_borrow, fractionable) must all hold; other attribute tags (e.g., 'ptp_no_exception')
+            match if the asset has any of them.
+        format: Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields: Comma-separated fields to include in json, csv or table output
+            (e.g., 'symbol,name,exchange')
     """
     try:
-        # Create filter if any parameters are provided
-        filter_params = None
-        if any([status, asset_class, exchange, attributes]):
-            filter_params = GetAssetsRequest(
-                status=status,
-                asset_class=asset_class,
-                exchange=exchange,
-                attributes=attributes
-            )
+        fmt = resolve_format(format)
         
-        # Get all assets
-        assets = trade_client.get_all_assets(filter_params)
+        # Filter the local catalog; like the API, asset_class defaults to us_equity
+        assets = await asset_catalog.filter(
+            status=status,
+            asset_class=asset_class or AssetClass.US_EQUITY.value,
+            exchange=exchange,
+            attributes=attributes
+        )
         
         if not assets:
             return "No assets found matching the criteria."
+        if fmt != "text":
+            return render(assets, fmt, fields)
         
         # Format the response
         response_parts = ["Available Assets:"]
@@ -841,29 +4650,43 @@ async def get_all_assets(
 # ============================================================================
 
 @mcp.tool()
-async def create_watchlist(name: str, symbols: List[str]) -> str:
+async def create_watchlist(name: str, symbols: List[str], format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Creates a new watchlist with specified symbols.
     
     Args:
         name (str): Name of the watchlist
         symbols (List[str]): List of symbols to include in the watchlist
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Confirmation message with watchlist creation status
     """
     try:
+        fmt = resolve_format(format)
         watchlist_data = CreateWatchlistRequest(name=name, symbols=symbols)
-        watchlist = trade_client.create_watchlist(watchlist_data)
+        watchlist = await run_upstream("trading", "create_watchlist", watchlist_data)
+        if fmt != "text":
+            return render([watchlist], fmt, fields)
         return f"Watchlist '{name}' created successfully with {len(symbols)} symbols."
     except Exception as e:
         return f"Error creating watchlist: {str(e)}"
 
 @mcp.tool()
-async def get_watchlists() -> str:
-    """Get all watchlists for the account."""
+async def get_watchlists(format: Optional[str] = None, fields: Optional[str] = None) -> str:
+    """
+    Get all watchlists for the account.
+    
+    Args:
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    """
     try:
-        watchlists = trade_client.get_watchlists()
+        fmt = resolve_format(format)
+        watchlists = await run_upstream("trading", "get_watchlists")
+        if fmt != "text":
+            return render(watchlists, fmt, fields)
         result = "Watchlists:\n------------\n"
         for wl in watchlists:
             result += f"Name: {wl.name}\n"
@@ -877,11 +4700,29 @@ async def get_watchlists() -> str:
         return f"Error fetching watchlists: {str(e)}"
 
 @mcp.tool()
-async def update_watchlist(watchlist_id: str, name: str = None, symbols: List[str] = None) -> str:
-    """Update an existing watchlist."""
+async def update_watchlist(
+    watchlist_id: str,
+    name: str = None,
+    symbols: List[str] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
+) -> str:
+    """
+    Update an existing watchlist.
+    
+    Args:
+        watchlist_id (str): ID of the watchlist to update
+        name (str): Optional new name for the watchlist
+        symbols (List[str]): Optional new list of symbols
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    """
     try:
+        fmt = resolve_format(format)
         update_request = UpdateWatchlistRequest(name=name, symbols=symbols)
-        watchlist = trade_client.update_watchlist_by_id(watchlist_id, update_request)
+        watchlist = await run_upstream("trading", "update_watchlist_by_id", watchlist_id, update_request)
+        if fmt != "text":
+            return render([watchlist], fmt, fields)
         return f"Watchlist updated successfully: {watchlist.name}"
     except Exception as e:
         return f"Error updating watchlist: {str(e)}"
@@ -891,10 +4732,14 @@ async def update_watchlist(watchlist_id: str, name: str = None, symbols: List[st
 # ============================================================================
 
 @mcp.tool()
-async def get_market_clock() -> str:
+async def get_market_clock(format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats current market status and next open/close times.
     
+    Args:
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
     Returns:
         str: Formatted string containing:
             - Current Time
@@ -903,7 +4748,10 @@ async def get_market_clock() -> str:
             - Next Close Time
     """
     try:
-        clock = trade_client.get_clock()
+        fmt = resolve_format(format)
+        clock = await market_calendar.get_clock()
+        if fmt != "text":
+            return render([clock], fmt, fields)
         return f"""
 Market Status:
 -------------
@@ -916,19 +4764,24 @@ Next Close: {clock.next_close}
         return f"Error fetching market clock: {str(e)}"
 
 @mcp.tool()
-async def get_market_calendar(start_date: str, end_date: str) -> str:
+async def get_market_calendar(start_date: str, end_date: str, format: Optional[str] = None, fields: Optional[str] = None) -> str:
     """
     Retrieves and formats market calendar for specified date range.
     
     Args:
         start_date (str): Start date in YYYY-MM-DD format
         end_date (str): End date in YYYY-MM-DD format
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing market calendar information
     """
     try:
-        calendar = trade_client.get_calendar(start=start_date, end=end_date)
+        fmt = resolve_format(format)
+        calendar = await market_calendar.get_calendar(date.fromisoformat(start_date), date.fromisoformat(end_date))
+        if fmt != "text":
+            return render(calendar, fmt, fields)
         result = f"Market Calendar ({start_date} to {end_date}):\n----------------------------\n"
         for day in calendar:
             result += f"Date: {day.date}, Open: {day.open}, Close: {day.close}\n"
@@ -947,7 +4800,9 @@ async def get_corporate_announcements(
     until: date,
     symbol: Optional[str] = None,
     cusip: Optional[str] = None,
-    date_type: Optional[CorporateActionDateType] = None
+    date_type: Optional[CorporateActionDateType] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Retrieves and formats corporate action announcements.
@@ -959,11 +4814,14 @@ async def get_corporate_announcements(
         symbol (Optional[str]): Optional stock symbol to filter by
         cusip (Optional[str]): Optional CUSIP to filter by
         date_type (Optional[CorporateActionDateType]): Optional date type to filter by
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing corporate announcement details
     """
     try:
+        fmt = resolve_format(format)
         request = GetCorporateAnnouncementsRequest(
             ca_types=ca_types,
             since=since,
@@ -972,7 +4830,9 @@ async def get_corporate_announcements(
             cusip=cusip,
             date_type=date_type
         )
-        announcements = trade_client.get_corporate_announcements(request)
+        announcements = await run_upstream("trading", "get_corporate_announcements", request)
+        if fmt != "text":
+            return render(announcements, fmt, fields)
         result = "Corporate Announcements:\n----------------------\n"
         for ann in announcements:
             result += f"""
@@ -1003,26 +4863,38 @@ async def get_corporate_announcements(
 async def get_option_contracts(
     underlying_symbol: str,
     expiration_date: Optional[date] = None,
+    expiration_date_gte: Optional[date] = None,
+    expiration_date_lte: Optional[date] = None,
     strike_price_gte: Optional[str] = None,
     strike_price_lte: Optional[str] = None,
     type: Optional[ContractType] = None,
     status: Optional[AssetStatus] = None,
     root_symbol: Optional[str] = None,
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Retrieves metadata for option contracts based on specified criteria. This endpoint returns contract specifications
     and static data, not real-time pricing information.
     
+    The complete chain of the underlying is loaded once and cached, and the filters
+    are applied locally. Inactive contracts and expirations outside the cached
+    window are requested from the API.
+    
     Args:
         underlying_symbol (str): The symbol of the underlying asset (e.g., 'AAPL')
         expiration_date (Optional[date]): Optional expiration date for the options
+        expiration_date_gte (Optional[date]): Optional earliest expiration date
+        expiration_date_lte (Optional[date]): Optional latest expiration date
         strike_price_gte (Optional[str]): Optional minimum strike price
         strike_price_lte (Optional[str]): Optional maximum strike price
         type (Optional[ContractType]): Optional contract type (CALL or PUT)
         status (Optional[AssetStatus]): Optional asset status filter (e.g., ACTIVE)
         root_symbol (Optional[str]): Optional root symbol for the option
-        limit (Optional[int]): Optional maximum number of contracts to return
+        limit (Optional[int]): Optional maximum number of contracts to return (default: 100)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing option contract metadata including:
@@ -1040,30 +4912,49 @@ async def get_option_contracts(
         information (bid/ask prices, sizes, etc.), use get_option_latest_quote instead.
     """
     try:
-        # Create the request object with all available parameters
-        request = GetOptionContractsRequest(
-            underlying_symbols=[underlying_symbol],
-            expiration_date=expiration_date,
-            strike_price_gte=strike_price_gte,
-            strike_price_lte=strike_price_lte,
-            type=type,
-            status=status,
-            root_symbol=root_symbol,
-            limit=limit
-        )
+        fmt = resolve_format(format)
+        underlying_symbol = underlying_symbol.upper()
         
-        # Get the option contracts
-        response = trade_client.get_option_contracts(request)
+        limit = limit or OPTION_CONTRACTS_DEFAULT_LIMIT
+        if option_chains.covers(status, expiration_date or expiration_date_gte, expiration_date or expiration_date_lte):
+            # Query the cached chain for the underlying
+            chain = await option_chains.get_chain(underlying_symbol, status)
+            contracts = chain.query(
+                expiration_date=expiration_date,
+                expiration_date_gte=expiration_date_gte,
+                expiration_date_lte=expiration_date_lte,
+                strike_price_gte=float(strike_price_gte) if strike_price_gte is not None else None,
+                strike_price_lte=float(strike_price_lte) if strike_price_lte is not None else None,
+                type=type,
+                root_symbol=root_symbol,
+                limit=limit
+            )
+        else:
+            contracts = await option_chains.fetch_contracts(
+                underlying_symbol,
+                limit,
+                status=status,
+                expiration_date=expiration_date,
+                expiration_date_gte=expiration_date_gte,
+                expiration_date_lte=expiration_date_lte,
+                strike_price_gte=strike_price_gte,
+                strike_price_lte=strike_price_lte,
+                type=type,
+                root_symbol=root_symbol
+            )
         
-        if not response or not response.option_contracts:
+        if not contracts:
             return f"No option contracts found for {underlying_symbol} matching the criteria."
         
+        if fmt != "text":
+            return render(contracts, fmt, fields)
+        
         # Format the response
-        result = f"Option Contracts for {underlying_symbol}:\n"
-        result += "----------------------------------------\n"
+        result = [f"Option Contracts for {underlying_symbol}:\n"]
+        result.append("----------------------------------------\n")
         
-        for contract in response.option_contracts:
-            result += f"""
+        for contract in contracts:
+            result.append(f"""
                 Symbol: {contract.symbol}
                 Name: {contract.name}
                 Type: {contract.type}
@@ -1079,9 +4970,9 @@ async def get_option_contracts(
                 Close Price: ${float(contract.close_price) if contract.close_price else 'N/A'}
                 Close Price Date: {contract.close_price_date}
                 -------------------------
-                """
+                """)
         
-        return result
+        return "".join(result)
         
     except Exception as e:
         return f"Error fetching option contracts: {str(e)}"
@@ -1089,7 +4980,9 @@ async def get_option_contracts(
 @mcp.tool()
 async def get_option_latest_quote(
     symbol: str,
-    feed: Optional[OptionsFeed] = None
+    feed: Optional[OptionsFeed] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Retrieves and formats the latest quote for an option contract. This endpoint returns real-time
@@ -1099,6 +4992,8 @@ async def get_option_latest_quote(
         symbol (str): The option contract symbol (e.g., 'AAPL230616C00150000')
         feed (Optional[OptionsFeed]): The source feed of the data (opra or indicative).
             Default: opra if the user has the options subscription, indicative otherwise.
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing the latest quote information including:
@@ -1114,6 +5009,8 @@ async def get_option_latest_quote(
         use get_option_contracts instead.
     """
     try:
+        fmt = resolve_format(format)
+        
         # Create the request object
         request = OptionLatestQuoteRequest(
             symbol_or_symbols=symbol,
@@ -1121,10 +5018,12 @@ async def get_option_latest_quote(
         )
         
         # Get the latest quote
-        quotes = option_historical_data_client.get_option_latest_quote(request)
+        quotes = await run_upstream("option_data", "get_option_latest_quote", request)
         
         if symbol in quotes:
             quote = quotes[symbol]
+            if fmt != "text":
+                return render([quote], fmt, fields)
             return f"""
                 Latest Quote for {symbol}:
                 ------------------------
@@ -1146,16 +5045,26 @@ async def get_option_latest_quote(
 
 
 @mcp.tool()
-async def get_option_snapshot(symbol_or_symbols: Union[str, List[str]], feed: Optional[OptionsFeed] = None) -> str:
+async def get_option_snapshot(
+    symbol_or_symbols: Union[str, List[str]],
+    feed: Optional[OptionsFeed] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
+) -> str:
     """
     Retrieves comprehensive snapshots of option contracts including latest trade, quote, implied volatility, and Greeks.
     This endpoint provides a complete view of an option's current market state and theoretical values.
     
+    Large symbol lists are fetched in concurrent chunks, and snapshots are cached for a
+    few seconds so repeated scans of the same contracts are answered locally.
+    
     Args:
         symbol_or_symbols (Union[str, List[str]]): Single option symbol or list of option symbols
             (e.g., 'AAPL250613P00205000')
         feed (Optional[OptionsFeed]): The source feed of the data (opra or indicative).
             Default: opra if the user has the options subscription, indicative otherwise.
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing a comprehensive snapshot including:
@@ -1180,91 +5089,186 @@ async def get_option_snapshot(symbol_or_symbols: Union[str, List[str]], feed: Op
                 * Vega (volatility sensitivity)
     """
     try:
-        # Create snapshot request
-        request = OptionSnapshotRequest(
-            symbol_or_symbols=symbol_or_symbols,
-            feed=feed
-        )
+        fmt = resolve_format(format)
+        
+        # Handle both single symbol and list of symbols
+        symbols = [symbol_or_symbols] if isinstance(symbol_or_symbols, str) else symbol_or_symbols
         
         # Get snapshots
-        snapshots = option_historical_data_client.get_option_snapshot(request)
+        snapshots = await option_snapshots.get_snapshots(symbols, feed)
         
-        # Format the response
-        result = "Option Snapshots:\n"
-        result += "================\n\n"
+        if fmt != "text":
+            return render([snapshots[symbol] for symbol in symbols if symbol in snapshots], fmt, fields)
         
-        # Handle both single symbol and list of symbols
-        symbols = [symbol_or_symbols] if isinstance(symbol_or_symbols, str) else symbol_or_symbols
+        # Format the response
+        result = ["Option Snapshots:\n"]
+        result.append("================\n\n")
         
         for symbol in symbols:
             snapshot = snapshots.get(symbol)
             if snapshot is None:
-                result += f"No data available for {symbol}\n"
+                result.append(f"No data available for {symbol}\n")
                 continue
                 
-            result += f"Symbol: {symbol}\n"
-            result += "-----------------\n"
+            result.append(f"Symbol: {symbol}\n")
+            result.append("-----------------\n")
             
             # Latest Quote
             if snapshot.latest_quote:
                 quote = snapshot.latest_quote
-                result += f"Latest Quote:\n"
-                result += f"  Bid Price: ${quote.bid_price:.6f}\n"
-                result += f"  Bid Size: {quote.bid_size}\n"
-                result += f"  Bid Exchange: {quote.bid_exchange}\n"
-                result += f"  Ask Price: ${quote.ask_price:.6f}\n"
-                result += f"  Ask Size: {quote.ask_size}\n"
-                result += f"  Ask Exchange: {quote.ask_exchange}\n"
+                result.append(f"Latest Quote:\n")
+                result.append(f"  Bid Price: ${quote.bid_price:.6f}\n")
+                result.append(f"  Bid Size: {quote.bid_size}\n")
+                result.append(f"  Bid Exchange: {quote.bid_exchange}\n")
+                result.append(f"  Ask Price: ${quote.ask_price:.6f}\n")
+                result.append(f"  Ask Size: {quote.ask_size}\n")
+                result.append(f"  Ask Exchange: {quote.ask_exchange}\n")
                 if quote.conditions:
-                    result += f"  Conditions: {quote.conditions}\n"
+                    result.append(f"  Conditions: {quote.conditions}\n")
                 if quote.tape:
-                    result += f"  Tape: {quote.tape}\n"
-                result += f"  Timestamp: {quote.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f %Z')}\n"
+                    result.append(f"  Tape: {quote.tape}\n")
+                result.append(f"  Timestamp: {quote.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f %Z')}\n")
             
             # Latest Trade
             if snapshot.latest_trade:
                 trade = snapshot.latest_trade
-                result += f"Latest Trade:\n"
-                result += f"  Price: ${trade.price:.6f}\n"
-                result += f"  Size: {trade.size}\n"
+                result.append(f"Latest Trade:\n")
+                result.append(f"  Price: ${trade.price:.6f}\n")
+                result.append(f"  Size: {trade.size}\n")
                 if trade.exchange:
-                    result += f"  Exchange: {trade.exchange}\n"
+                    result.append(f"  Exchange: {trade.exchange}\n")
                 if trade.conditions:
-                    result += f"  Conditions: {trade.conditions}\n"
+                    result.append(f"  Conditions: {trade.conditions}\n")
                 if trade.tape:
-                    result += f"  Tape: {trade.tape}\n"
+                    result.append(f"  Tape: {trade.tape}\n")
                 if trade.id:
-                    result += f"  Trade ID: {trade.id}\n"
-                result += f"  Timestamp: {trade.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f %Z')}\n"
+                    result.append(f"  Trade ID: {trade.id}\n")
+                result.append(f"  Timestamp: {trade.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f %Z')}\n")
             
             # Implied Volatility
             if snapshot.implied_volatility is not None:
-                result += f"Implied Volatility: {snapshot.implied_volatility:.2%}\n"
+                result.append(f"Implied Volatility: {snapshot.implied_volatility:.2%}\n")
             
             # Greeks
             if snapshot.greeks:
                 greeks = snapshot.greeks
-                result += f"Greeks:\n"
-                result += f"  Delta: {greeks.delta:.4f}\n"
-                result += f"  Gamma: {greeks.gamma:.4f}\n"
-                result += f"  Rho: {greeks.rho:.4f}\n"
-                result += f"  Theta: {greeks.theta:.4f}\n"
-                result += f"  Vega: {greeks.vega:.4f}\n"
+                result.append(f"Greeks:\n")
+                result.append(f"  Delta: {greeks.delta:.4f}\n")
+                result.append(f"  Gamma: {greeks.gamma:.4f}\n")
+                result.append(f"  Rho: {greeks.rho:.4f}\n")
+                result.append(f"  Theta: {greeks.theta:.4f}\n")
+                result.append(f"  Vega: {greeks.vega:.4f}\n")
             
-            result += "\n"
+            result.append("\n")
         
-        return result
+        return "".join(result)
         
     except Exception as e:
         return f"Error retrieving option snapshots: {str(e)}"
 
+@mcp.tool()
+async def get_option_chain_greeks(
+    underlying_symbol: str,
+    expiration_date: Optional[date] = None,
+    expiration_date_gte: Optional[date] = None,
+    expiration_date_lte: Optional[date] = None,
+    strike_price_gte: Optional[str] = None,
+    strike_price_lte: Optional[str] = None,
+    type: Optional[ContractType] = None,
+    limit: Optional[int] = None,
+    dividend_yield: float = 0.0,
+    volatility: Optional[float] = None,
+    feed: Optional[OptionsFeed] = None,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
+) -> str:
+    """
+    Computes implied volatility, theoretical price and Greeks for an option chain locally.
+    
+    Contracts come from the cached chain of the underlying and are priced with a
+    vectorized Black-Scholes model from their quote midpoints, the underlying price
+    and the RISK_FREE_RATE curve. Contracts are treated as European, so results for
+    deep in-the-money American options can differ from the snapshot values.
+    
+    Args:
+        underlying_symbol (str): The symbol of the underlying asset (e.g., 'SPY')
+        expiration_date (Optional[date]): Optional expiration date for the options
+        expiration_date_gte (Optional[date]): Optional earliest expiration date
+        expiration_date_lte (Optional[date]): Optional latest expiration date
+        strike_price_gte (Optional[str]): Optional minimum strike price
+        strike_price_lte (Optional[str]): Optional maximum strike price
+        type (Optional[ContractType]): Optional contract type (CALL or PUT)
+        limit (Optional[int]): Optional maximum number of contracts to price
+        dividend_yield (float): Continuous annual dividend yield of the underlying (default: 0.0)
+        volatility (Optional[float]): Volatility used for contracts without a usable quote (e.g., 0.25)
+        feed (Optional[OptionsFeed]): The source feed of the option quotes (opra or indicative)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
+    
+    Returns:
+        str: Formatted string containing, per contract:
+            - Symbol, Type, Strike and Expiration
+            - Bid/Ask and Market Price
+            - Implied Volatility and Theoretical Price
+            - Delta, Gamma, Theta (per day), Vega and Rho (per 1%)
+    """
+    try:
+        fmt = resolve_format(format)
+        underlying_symbol = underlying_symbol.upper()
+        
+        chain = await option_chains.get_chain(underlying_symbol)
+        contracts = chain.query(
+            expiration_date=expiration_date,
+            expiration_date_gte=expiration_date_gte,
+            expiration_date_lte=expiration_date_lte,
+            strike_price_gte=float(strike_price_gte) if strike_price_gte is not None else None,
+            strike_price_lte=float(strike_price_lte) if strike_price_lte is not None else None,
+            type=type,
+            limit=limit
+        )
+        if not contracts:
+            return f"No option contracts found for {underlying_symbol} matching the criteria."
+        
+        spot, snapshots = await asyncio.gather(
+            underlying_price(underlying_symbol),
+            option_snapshots.get_snapshots([c.symbol for c in contracts], feed)
+        )
+        if spot is None:
+            return f"No price data found for {underlying_symbol}."
+        
+        records = price_option_chain(contracts, snapshots, spot, dividend_yield, volatility)
+        
+        if fmt != "text":
+            return render(records, fmt, fields, meta={"underlying_symbol": underlying_symbol, "underlying_price": spot})
+        
+        def num(value, spec):
+            return f"{value:{spec}}" if value is not None else "N/A"
+        
+        result = [f"Option Greeks for {underlying_symbol} (underlying: ${spot:.2f}):\n"]
+        result.append("----------------------------------------\n")
+        for record in records:
+            result.append(
+                f"{record['symbol']}  {record['type'].upper()}  Strike: ${record['strike_price']:.2f}  Exp: {record['expiration_date']}\n"
+                f"  Bid/Ask: {num(record['bid_price'], '.2f')}/{num(record['ask_price'], '.2f')}"
+                f"  IV: {num(record['implied_volatility'], '.2%')}"
+                f"  Theo: {num(record['theoretical_price'], '.4f')}\n"
+                f"  Delta: {num(record['delta'], '.4f')}  Gamma: {num(record['gamma'], '.4f')}"
+                f"  Theta: {num(record['theta'], '.4f')}  Vega: {num(record['vega'], '.4f')}  Rho: {num(record['rho'], '.4f')}\n"
+            )
+        return "".join(result)
+        
+    except Exception as e:
+        return f"Error computing option Greeks for {underlying_symbol}: {str(e)}"
+
 @mcp.tool()
 async def place_option_market_order(
     legs: List[Dict[str, Any]],
     order_class: Optional[Union[str, OrderClass]] = None,
     quantity: int = 1,
     time_in_force: TimeInForce = TimeInForce.DAY,
-    extended_hours: bool = False
+    extended_hours: bool = False,
+    format: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> str:
     """
     Places a market order for options (single or multi-leg) and returns the order details.
@@ -1288,6 +5292,8 @@ async def place_option_market_order(
         quantity (int): Base quantity for the order (default: 1)
         time_in_force (TimeInForce): Time in force for the order (default: DAY)
         extended_hours (bool): Whether to allow execution during extended hours (default: False)
+        format (Optional[str]): Output format: 'text', 'json', 'csv' or 'table' (default: OUTPUT_FORMAT setting)
+        fields (Optional[str]): Comma-separated fields to include in json, csv or table output
     
     Returns:
         str: Formatted string containing order details including:
@@ -1323,6 +5329,8 @@ async def place_option_market_order(
         If you receive a permission error, please check your account's option trading level.
     """
     try:
+        fmt = resolve_format(format)
+        
         # Validate legs
         if not legs:
             return "Error: No option legs provided"
@@ -1381,7 +5389,7 @@ async def place_option_market_order(
                 order_class=order_class,
                 time_in_force=time_in_force,
                 extended_hours=extended_hours,
-                client_order_id=f"mcp_opt_{int(time.time())}",
+                client_order_id=f"mcp_opt_{int(time.time())}_{uuid4().hex[:8]}",
                 type=OrderType.MARKET,
                 legs=order_legs  # Set legs directly in the constructor for multi-leg orders
             )
@@ -1394,12 +5402,14 @@ async def place_option_market_order(
                 order_class=order_class,
                 time_in_force=time_in_force,
                 extended_hours=extended_hours,
-                client_order_id=f"mcp_opt_{int(time.time())}",
+                client_order_id=f"mcp_opt_{int(time.time())}_{uuid4().hex[:8]}",
                 type=OrderType.MARKET
             )
         
         # Submit order
-        order = trade_client.submit_order(order_data)
+        order = await run_upstream("trading", "submit_order", order_data)
+        if fmt != "text":
+            return render([order], fmt, fields)
         
         # Format the response
         result = f"""
@@ -1591,20 +5601,439 @@ async def place_option_market_order(
 
 
 from starlette.routing import Mount
-# Run the server
-if __name__ == "__main__":
-    # Create a FastAPI app
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+import hmac
+import ipaddress
+
+def metrics_allowed(client) -> bool:
+    """Whether an HTTP client (host, port) may read /metrics: anyone with METRICS_PUBLIC, else only this machine."""
+    if METRICS_PUBLIC:
+        return True
+    try:
+        return client is not None and ipaddress.ip_address(client[0]).is_loopback
+    except ValueError:
+        return False
+
+class SSESessionCounter:
+    """ASGI middleware that tracks how many SSE sessions are open on the wrapped app."""
+
+    def __init__(self, app, sse_path: str):
+        self.app = app
+        self.sse_path = sse_path
+
+    async def __call__(self, scope, receive, send):
+        # Under a Mount, scope["path"] still holds the mount prefix
+        path = scope.get("path", "")[len(scope.get("root_path", "")):]
+        if scope["type"] != "http" or path.rstrip("/") != self.sse_path.rstrip("/"):
+            return await self.app(scope, receive, send)
+        metrics.inc("sse_sessions_total")
+        metrics.add("sse_sessions_active", 1)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            metrics.add("sse_sessions_active", -1)
+
+class TracingSettings(BaseModel):
+    enabled: bool
+    file: Optional[str] = None
+    sample_rate: Optional[float] = None
+
+class ProfileRequest(BaseModel):
+    tool: str
+    calls: int = 1
+    interval_ms: float = 5.0
+
+def create_admin_router():
+    """
+    Runtime switches for tracing and profiling, enabled by setting ADMIN_TOKEN.
+
+    FastAPI is imported here rather than at the top of the module, so stdio
+    launches do not load it.
+    """
+    from fastapi import APIRouter, Depends, Header, HTTPException
+
+    def require_admin(authorization: Optional[str] = Header(default=None)) -> None:
+        if not ADMIN_TOKEN:
+            raise HTTPException(status_code=404)
+        if not hmac.compare_digest(authorization or "", f"Bearer {ADMIN_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False)
+
+    @admin_router.get("/tracing")
+    async def get_tracing():
+        return {"enabled": tracer.enabled, "file": tracer.path or None, "sample_rate": tracer.sample_rate}
+
+    @admin_router.post("/tracing")
+    async def set_tracing(settings: TracingSettings):
+        path = (settings.file or tracer.path or os.path.join(CACHE_DIR, "traces.jsonl")) if settings.enabled else ""
+        await asyncio.to_thread(tracer.configure, path, settings.sample_rate)
+        return await get_tracing()
+
+    @admin_router.get("/profile")
+    async def get_profile():
+        return profiler.status()
+
+    @admin_router.post("/profile")
+    async def start_profile(request: ProfileRequest):
+        if request.tool not in {tool.name for tool in await mcp.list_tools()}:
+            raise HTTPException(status_code=404, detail=f"Unknown tool: {request.tool}")
+        if request.calls < 1 or request.interval_ms <= 0:
+            raise HTTPException(status_code=422, detail="calls and interval_ms must be positive")
+        try:
+            profiler.arm(request.tool, request.calls, request.interval_ms / 1000)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return profiler.status()
+
+    return admin_router
+
+# ============================================================================
+# Streamable HTTP
+# ============================================================================
+
+def read_only_server(server: AlpacaMCP, path: str) -> AlpacaMCP:
+    """
+    A stateless copy of server that offers only its read-only tools.
+
+    Stateless requests carry no session, so any process can answer any of
+    them and a load balancer can spread them freely. Responses are plain
+    JSON instead of an SSE stream.
+    """
+    # The registered tools are shared rather than added again, which would
+    # rebuild every argument model and slow down startup
+    tools = [tool for tool in server._tool_manager.list_tools() if tool.name in server.read_only_tools]
+    copy = AlpacaMCP(
+        f"{server.name}-read-only", tools=tools, streamable_http_path=path, stateless_http=True, json_response=True
+    )
+    copy.read_only_tools.update(tool.name for tool in tools)
+    return copy
+
+def session_manager_lifespan(servers: List[AlpacaMCP]):
+    """
+    App lifespan that runs the streamable HTTP session managers of servers.
+
+    The managers are normally started by the lifespan of the app FastMCP
+    builds, which does not run when its routes are added to another app.
+    """
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with contextlib.AsyncExitStack() as stack:
+            for server in servers:
+                await stack.enter_async_context(server.session_manager.run())
+            yield
+    return lifespan
+
+# ============================================================================
+# Multi-Process Mode
+# ============================================================================
+
+# Hop-by-hop headers, which apply to one connection and are not forwarded
+HOP_HEADERS = {b"connection", b"keep-alive", b"transfer-encoding", b"upgrade", b"te", b"trailer", b"host", b"content-length"}
+
+def merge_metrics(texts: List[str]) -> str:
+    """Merges the Prometheus text output of several workers, labelling every sample with its worker."""
+    families: Dict[str, List[str]] = {}
+    family = ""
+    for index, text in enumerate(texts):
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = line.split()[2]
+                lines = families.setdefault(family, [])
+                if index == 0 or line not in lines:
+                    lines.append(line)
+            elif line:
+                name, _, rest = line.partition(" ")
+                if "{" in name:
+                    name = name.replace("{", f'{{worker="{index}",', 1)
+                else:
+                    name += f'{{worker="{index}"}}'
+                families.setdefault(family, []).append(f"{name} {rest}")
+    return "".join(line + "\n" for lines in families.values() for line in lines)
+
+class WorkerProxy:
+    """
+    ASGI front end of the multi-process mode.
+
+    Each worker serves the MCP SSE app under /w<index>, so the message
+    endpoint it hands to a client carries that prefix. A new SSE connection
+    goes to the worker with the fewest open sessions, and every later request
+    is forwarded by its prefix, so a session stays on the worker that holds
+    it. Streamable HTTP sessions are pinned by their Mcp-Session-Id header
+    instead, and stateless read-only requests go to the least busy worker.
+    /metrics merges the workers' metrics, and /admin requests are sent to
+    every worker.
+    """
+
+    def __init__(self, ports: List[int], sse_path: str, streamable_http_path: str):
+        self.ports = ports
+        self.sse_path = sse_path.rstrip("/")
+        self.streamable_http_path = streamable_http_path.rstrip("/")
+        self.sessions = [0] * len(ports)
+        self.requests = [0] * len(ports)
+        self.session_workers: Dict[str, int] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(None), limits=httpx.Limits(max_connections=None, max_keepalive_connections=64)
+            )
+        return self._client
+
+    def _url(self, index: int, path: str, scope) -> str:
+        query = scope.get("query_string", b"").decode()
+        return f"http://127.0.0.1:{self.ports[index]}{path}" + (f"?{query}" if query else "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            if self._client is not None:
+                await self._client.aclose()
+            return await send({"type": "lifespan.shutdown.complete"})
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        if path == "/metrics":
+            if not metrics_allowed(scope.get("client")):
+                return await self._respond(send, 404, b"Not Found")
+            return await self._metrics(send)
+        if path.startswith("/admin/"):
+            return await self._broadcast(scope, receive, send)
+        if path.rstrip("/") == self.sse_path:
+            index = min(range(len(self.ports)), key=self.sessions.__getitem__)
+            self.sessions[index] += 1
+            try:
+                return await self._forward(index, f"/w{index}{path}", scope, receive, send)
+            finally:
+                self.sessions[index] -= 1
+        if path.rstrip("/") == READ_ONLY_HTTP_PATH:
+            index = min(range(len(self.ports)), key=self.requests.__getitem__)
+            self.requests[index] += 1
+            try:
+                return await self._forward(index, path, scope, receive, send)
+            finally:
+                self.requests[index] -= 1
+        if path.rstrip("/") == self.streamable_http_path:
+            return await self._forward_streamable(scope, receive, send)
+        match = re.match(r"/w(\d+)(/|$)", path)
+        if match is None or int(match.group(1)) >= len(self.ports):
+            return await self._respond(send, 404, b"Not Found")
+        await self._forward(int(match.group(1)), path, scope, receive, send)
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, content_type: bytes = b"text/plain; charset=utf-8") -> None:
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return body
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    async def _forward_streamable(self, scope, receive, send) -> None:
+        session_id = dict(scope["headers"]).get(b"mcp-session-id", b"").decode()
+        if session_id:
+            index = self.session_workers.get(session_id)
+            if index is None:
+                return await self._respond(send, 404, b"Session not found")
+        else:
+            index = min(range(len(self.ports)), key=self.sessions.__getitem__)
+        
+        def track(response: httpx.Response) -> None:
+            if not session_id and response.headers.get("mcp-session-id"):
+                self.session_workers[response.headers["mcp-session-id"]] = index
+                self.sessions[index] += 1
+            elif session_id and (scope["method"] == "DELETE" or response.status_code == 404):
+                # Closed by the client, or expired on the worker
+                if self.session_workers.pop(session_id, None) is not None:
+                    self.sessions[index] -= 1
+        
+        await self._forward(index, scope["path"], scope, receive, send, track)
+
+    async def _forward(self, index: int, path: str, scope, receive, send, on_response=None) -> None:
+        body = await self._read_body(receive)
+        headers = [(key, value) for key, value in scope["headers"] if key.lower() not in HOP_HEADERS]
+        request = self.client.build_request(scope["method"], self._url(index, path, scope), headers=headers, content=body)
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError:
+            return await self._respond(send, 502, b"Worker unavailable")
+        if on_response is not None:
+            on_response(response)
+        
+        async def relay():
+            headers = [(key, value) for key, value in response.headers.raw if key.lower() not in HOP_HEADERS - {b"content-length"}]
+            await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+        
+        # SSE responses last as long as the session, so stop relaying when the client goes away
+        tasks = [asyncio.ensure_future(relay()), asyncio.ensure_future(disconnected())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            await response.aclose()
+        if isinstance(outcomes[0], Exception):
+            logger.warning(f"Error relaying response from worker {index}: {outcomes[0]}")
+
+    async def _metrics(self, send) -> None:
+        responses = await asyncio.gather(
+            *(self.client.get(f"http://127.0.0.1:{port}/metrics") for port in self.ports), return_exceptions=True
+        )
+        texts = [r.text if isinstance(r, httpx.Response) else "" for r in responses]
+        await self._respond(send, 200, merge_metrics(texts).encode(), b"text/plain; version=0.0.4; charset=utf-8")
+
+    async def _broadcast(self, scope, receive, send) -> None:
+        body = await self._read_body(receive)
+        headers = [(key, value) for key, value in scope["headers"] if key.lower() not in HOP_HEADERS]
+        try:
+            responses = await asyncio.gather(*(
+                self.client.request(scope["method"], self._url(index, scope["path"], scope), headers=headers, content=body)
+                for index in range(len(self.ports))
+            ))
+        except httpx.HTTPError:
+            return await self._respond(send, 502, b"Worker unavailable")
+        failed = next((response for response in responses if response.status_code >= 400), None)
+        if failed is not None:
+            return await self._respond(send, failed.status_code, failed.content, b"application/json")
+        payload = {"workers": [response.json() for response in responses]}
+        await self._respond(send, 200, json.dumps(payload).encode(), b"application/json")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_workers(workers: int, port: int, transport: str) -> None:
+    """
+    Runs the server as a front end on port, with workers worker processes and a cache process.
+    
+    The upstream rate limit is split between the workers, and only the first
+    worker streams market data, since Alpaca allows one data stream per account.
+    It is also the only one holding a trade updates stream; the others answer
+    order and position lookups from REST.
+    """
+    authkey = secrets.token_bytes(16)
+    manager = SharedCacheManager(address=("127.0.0.1", 0), authkey=authkey)
+    manager.start()
+    burst = max(UPSTREAM_RATE_BURST // workers, 1)
+    ports = [free_port() for _ in range(workers)]
+    processes = []
+    for index, worker_port in enumerate(ports):
+        env = dict(
+            os.environ,
+            WORKER_INDEX=str(index),
+            PORT=str(worker_port),
+            SHARED_CACHE_ADDRESS=f"127.0.0.1:{manager.address[1]}",
+            SHARED_CACHE_AUTHKEY=authkey.hex(),
+            UPSTREAM_RATE_LIMIT=str(UPSTREAM_RATE_LIMIT / workers),
+            UPSTREAM_RATE_BURST=str(burst),
+            UPSTREAM_RATE_RESERVE=str(min(UPSTREAM_RATE_RESERVE, burst - 1)),
+        )
+        if index > 0:
+            env["STREAM_MARKET_DATA"] = "False"
+            env["TRADE_STREAM"] = "False"
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), "--transport", transport], env=env))
+    try:
+        for worker_port, process in zip(ports, processes):
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", worker_port), timeout=1).close()
+                    break
+                except OSError:
+                    if process.poll() is not None:
+                        raise RuntimeError(f"Worker on port {worker_port} exited with code {process.returncode}")
+                    time.sleep(0.1)
+        logger.info(f"starting on port {port} with {workers} workers")
+        # uvicorn re-raises the signal that stopped it once it has shut down;
+        # turn SIGTERM into SystemExit so the workers are stopped below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        import uvicorn
+        uvicorn.run(WorkerProxy(ports, mcp.settings.sse_path, mcp.settings.streamable_http_path), host="0.0.0.0", port=port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        manager.shutdown()
+
+def create_app(transport: str):
+    """
+    Builds the HTTP app for the sse, streamable-http or both transports.
+    
+    Streamable HTTP is served at /mcp (all tools) and READ_ONLY_HTTP_PATH
+    (stateless, read-only tools). SSE is mounted at the root path; workers
+    serve it under their own prefix, behind the front end process started
+    by run_workers.
+    """
+    from fastapi import FastAPI
+    streamable_http = transport in ("streamable-http", "both")
+    # Only built for streamable HTTP, so other transports do not pay for it at startup
+    read_only_mcp = read_only_server(mcp, READ_ONLY_HTTP_PATH) if streamable_http else None
     app = FastAPI(
         title="alpaca-trading MCP API Server",
         description="alpaca-trading",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=session_manager_lifespan([mcp, read_only_mcp]) if streamable_http else None
     )
-    # Mount the MCP SSE app to the root path
-    app.router.routes.append(Mount('/', app=mcp.sse_app()))
-    mcp.settings.host = "0.0.0.0"
-    mcp.settings.port = PORT
-    print('starting on port',PORT)
-    
-    # Run FastAPI app with uvicorn instead of the MCP app directly
-    uvicorn.run(app, host=mcp.settings.host, port=mcp.settings.port)
 
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics(request: Request):
+        if not metrics_allowed(request.client):
+            return PlainTextResponse("Not Found", status_code=404)
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    app.include_router(create_admin_router())
+
+    if streamable_http:
+        app.router.routes.extend(mcp.streamable_http_app().routes)
+        app.router.routes.extend(read_only_mcp.streamable_http_app().routes)
+    if transport in ("sse", "both"):
+        metrics.set("sse_sessions_active", 0)
+        mount_path = f"/w{WORKER_INDEX}" if WORKER_INDEX is not None else "/"
+        app.router.routes.append(Mount(mount_path, app=SSESessionCounter(mcp.sse_app(), mcp.settings.sse_path)))
+    return app
+
+# Run the server
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alpaca MCP server")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "sse", "streamable-http", "both"],
+        default=TRANSPORT or ("sse" if PORT else "stdio"),
+        help="MCP transport; 'both' serves SSE and streamable HTTP on the same port (default: sse if PORT is set, else stdio)",
+    )
+    args = parser.parse_args()
+    port = int(PORT or mcp.settings.port)
+
+    if args.transport == "stdio":
+        mcp.run("stdio")
+    elif WORKERS > 1 and WORKER_INDEX is None:
+        run_workers(WORKERS, port, args.transport)
+    else:
+        app = create_app(args.transport)
+        mcp.settings.host = "127.0.0.1" if WORKER_INDEX is not None else "0.0.0.0"
+        mcp.settings.port = port
+        logger.info(f"starting on port {port}")
+        
+        # Run FastAPI app with uvicorn instead of the MCP app directly
+        import uvicorn
+        uvicorn.run(app, host=mcp.settings.host, port=mcp.settings.port)
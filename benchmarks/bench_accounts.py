@@ -0,0 +1,97 @@
+"""
+Memory benchmark of serving many accounts from one process (ALPACA_ACCOUNTS).
+
+Starts one server for --accounts accounts against the local mock Alpaca API,
+and then --separate single-account servers, one per account, as when every
+account runs in its own container. Every account makes the same calls
+(account information, positions, orders, a stock quote and the market
+clock). Reports the RSS after the calls, per process and for all the
+accounts, plus the number of requests the mock served per account. The
+total for one process per account is extrapolated from the separate servers.
+
+Usage:
+    python benchmarks/bench_accounts.py [--accounts 24] [--separate 3]
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+from typing import List, Optional
+
+import httpx
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from mock_alpaca import add_arguments, mock_options, serve_in_process
+from bench_tools import RSSSampler, call, free_port, start_server
+
+MIX = [
+    ("get_account_info", {}),
+    ("get_positions", {}),
+    ("get_orders", {"status": "open"}),
+    ("get_stock_quote", {"symbol": "AAPL"}),
+    ("get_market_clock", {}),
+]
+
+
+async def drive(url: str, aliases: List[Optional[str]]) -> None:
+    async with sse_client(url) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            async def account_calls(alias: Optional[str]) -> None:
+                for tool, arguments in MIX:
+                    await call(session, tool, arguments if alias is None else dict(arguments, account=alias))
+
+            await asyncio.gather(*(account_calls(alias) for alias in aliases))
+
+
+def measure(mock_url: str, aliases: List[Optional[str]], **settings) -> dict:
+    """Runs the calls of aliases on a new server and returns its RSS and the requests the mock served."""
+    port = free_port()
+    served_before = sum(httpx.get(f"{mock_url}/_stats").json().values())
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_server(port, mock_url, cache_dir, STREAM_MARKET_DATA="False", **settings)
+        try:
+            asyncio.run(drive(f"http://127.0.0.1:{port}/sse", aliases))
+            rss = RSSSampler(server.pid).read()
+        finally:
+            server.terminate()
+            server.wait()
+    return {"rss_mb": rss / 2**20, "upstream": sum(httpx.get(f"{mock_url}/_stats").json().values()) - served_before}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=24, help="Accounts served by the pooled server")
+    parser.add_argument("--separate", type=int, default=3, help="Single-account servers started for comparison")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = serve_in_process(args.mock_port, **mock_options(args))
+    aliases = [f"account{index}" for index in range(1, args.accounts)]
+    credentials = {}
+    for alias in aliases:
+        credentials[f"ALPACA_API_KEY_{alias.upper()}"] = credentials[f"ALPACA_SECRET_KEY_{alias.upper()}"] = alias
+    try:
+        pooled = measure(mock_url, ["default"] + aliases, ALPACA_ACCOUNTS=",".join(aliases), **credentials)
+        separate = [measure(mock_url, [None]) for _ in range(args.separate)]
+    finally:
+        mock.terminate()
+    per_process = sum(result["rss_mb"] for result in separate) / len(separate)
+    upstream = sum(result["upstream"] for result in separate) / len(separate)
+    print(f"{args.accounts} accounts, {len(MIX)} calls each\n")
+    print(f"{'setup':<26} {'processes':>9} {'RSS MB each':>12} {'RSS MB total':>13} {'upstream/account':>17}")
+    print(f"{'one process':<26} {1:>9} {pooled['rss_mb']:>12.1f} {pooled['rss_mb']:>13.1f} "
+          f"{pooled['upstream'] / args.accounts:>17.1f}")
+    print(f"{'one process per account':<26} {args.accounts:>9} {per_process:>12.1f} "
+          f"{per_process * args.accounts:>13.1f} {upstream:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark of the async HTTP path against the executor-backed alpaca-py clients.
+
+Starts the local mock server, points the server's clients at it and issues
+the same mix of hot read calls (latest quotes, trades and bars, option
+snapshots, orders, positions) through run_upstream, once with the async
+backend disabled and once with it enabled, at several concurrency levels.
+
+Usage:
+    python benchmarks/bench_http.py [--requests 1000] [--concurrency 1,32,128] [--latency-ms 80]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+import numpy as np
+
+os.environ["ALPACA_API_KEY"] = os.environ["ALPACA_SECRET_KEY"] = "benchmark"
+os.environ["STREAM_MARKET_DATA"] = "False"
+os.environ["TRADE_STREAM"] = "False"
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+import alpaca_mcp_server as server
+from mock_alpaca import serve_in_process
+from alpaca.trading.client import TradingClient
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.historical.option import OptionHistoricalDataClient
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "SPY", "QQQ", "IWM"]
+OPTIONS = ["SPY261218C00600000", "SPY261218P00500000", "AAPL261218C00200000"]
+
+
+def point_clients_at(url: str) -> None:
+    account = server.accounts.get(server.DEFAULT_ACCOUNT)
+    account.clients.update(
+        trading=TradingClient("benchmark", "benchmark", url_override=url),
+        stock_data=StockHistoricalDataClient("benchmark", "benchmark", url_override=url),
+        option_data=OptionHistoricalDataClient("benchmark", "benchmark", url_override=url),
+    )
+    for client in account.clients.values():
+        client._retry = 0
+    # Measure transport only: no rate limiting
+    account.limiter = server.RateLimiter(0, 1, 0)
+
+
+def make_call():
+    kind = random.random()
+    symbol = random.choice(SYMBOLS)
+    if kind < 0.4:
+        return "stock_data", "get_stock_latest_quote", server.StockLatestQuoteRequest(symbol_or_symbols=symbol)
+    if kind < 0.6:
+        return "stock_data", "get_stock_latest_trade", server.StockLatestTradeRequest(symbol_or_symbols=symbol)
+    if kind < 0.7:
+        return "stock_data", "get_stock_latest_bar", server.StockLatestBarRequest(symbol_or_symbols=symbol)
+    if kind < 0.8:
+        return "option_data", "get_option_snapshot", server.OptionSnapshotRequest(symbol_or_symbols=OPTIONS)
+    if kind < 0.9:
+        return "trading", "get_orders", server.GetOrdersRequest(status=server.QueryOrderStatus.ALL, limit=5)
+    return "trading", "get_all_positions", None
+
+
+async def run(total: int, concurrency: int) -> dict:
+    latencies = []
+    rejected = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal rejected
+        client_type, method, request = make_call()
+        args = (request,) if request is not None else ()
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await server.run_upstream(client_type, method, *args)
+            except server.UpstreamBusyError:
+                # The executor queue is full; counted, not timed
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "p50": np.percentile(ms, 50), "p95": np.percentile(ms, 95), "p99": np.percentile(ms, 99),
+        "rps": len(latencies) / elapsed, "rejected": rejected,
+    }
+
+
+async def bench(total: int, levels: list) -> None:
+    print(f"{'path':<8} {'conc':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/s':>9} {'rejected':>9}")
+    for concurrency in levels:
+        for label, enabled in (("sync", False), ("async", True)):
+            server.async_http.enabled = enabled
+            await run(min(50, total), concurrency)  # warm up connections
+            result = await run(total, concurrency)
+            print(f"{label:<8} {concurrency:>5} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f} {result['rps']:>9.1f} {result['rejected']:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="Calls per run")
+    parser.add_argument("--concurrency", default="1,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Latency added by the mock server")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    mock = serve_in_process(args.port, args.latency_ms)
+    point_clients_at(f"http://127.0.0.1:{args.port}")
+    print(f"Mock latency {args.latency_ms:g} ms, {args.requests} calls per run, "
+          f"{server.UPSTREAM_WORKERS_STOCK_DATA} executor threads per client, HTTP pool {server.HTTP_POOL_SIZE}"
+          f"{' (HTTP/2)' if server.async_http.http2 else ''}\n")
+    try:
+        asyncio.run(bench(args.requests, [int(level) for level in args.concurrency.split(",")]))
+    finally:
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Cold start benchmark of the server launched over stdio.
+
+Launches the server the way an MCP host does, as a stdio subprocess, and
+times each launch from spawn to the end of the initialize handshake, to the
+tools/list response and to the response of a first tool call, answered by
+the local mock Alpaca API. Also times the interpreter alone and the import
+of the module alone in a fresh interpreter. One launch before the timed ones
+fills the server's disk cache, as earlier sessions would have.
+
+--importtime lists the top-level packages that take the most time to import,
+summed from python -X importtime.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--tool get_market_clock] [--importtime 15]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import Counter
+from typing import Dict, List
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from mock_alpaca import add_arguments, mock_options, serve_in_process
+from bench_tools import SERVER, call, server_env
+
+ROOT = os.path.dirname(os.path.abspath(SERVER))
+IMPORT_CODE = "import time; start = time.perf_counter(); import alpaca_mcp_server; print(time.perf_counter() - start)"
+
+
+def time_interpreter(env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def time_import(env: Dict[str, str]) -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_CODE], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.split()[-1])
+
+
+async def time_launch(env: Dict[str, str], tool: str, arguments: dict) -> Dict[str, float]:
+    params = StdioServerParameters(command=sys.executable, args=[SERVER, "--transport", "stdio"], env=env)
+    times = {}
+    with open(os.devnull, "w") as errlog:
+        start = time.perf_counter()
+        async with stdio_client(params, errlog=errlog) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                times["initialize"] = time.perf_counter() - start
+                await session.list_tools()
+                times["tools/list"] = time.perf_counter() - start
+                await call(session, tool, arguments)
+                times[f"first {tool}"] = time.perf_counter() - start
+    return times
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[tuple]:
+    """Self import time in ms summed by top-level package, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import alpaca_mcp_server"],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    totals: Counter = Counter()
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[0].split(":")[-1].strip().isdigit():
+            continue
+        totals[fields[2].strip().split(".")[0]] += int(fields[0].split(":")[-1]) / 1000
+    return totals.most_common(top)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Timed launches")
+    parser.add_argument("--tool", default="get_market_clock", help="Tool of the first call")
+    parser.add_argument("--arguments", default="{}", help="Tool arguments as JSON")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="List the N slowest packages to import")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    mock = serve_in_process(args.mock_port, **mock_options(args))
+    arguments = json.loads(args.arguments)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = server_env(f"http://127.0.0.1:{args.mock_port}", cache_dir)
+            asyncio.run(time_launch(env, args.tool, arguments))  # fills the disk cache
+            samples: Dict[str, List[float]] = {"interpreter": [], "import": []}
+            for _ in range(args.runs):
+                samples["interpreter"].append(time_interpreter(env))
+                samples["import"].append(time_import(env))
+                for phase, seconds in asyncio.run(time_launch(env, args.tool, arguments)).items():
+                    samples.setdefault(phase, []).append(seconds)
+            print(f"{args.runs} cold starts over stdio, ms from spawn\n")
+            print(f"{'phase':<28} {'median':>8} {'min':>8} {'max':>8}")
+            for phase, seconds in samples.items():
+                ms = [s * 1000 for s in seconds]
+                print(f"{phase:<28} {statistics.median(ms):>8.0f} {min(ms):>8.0f} {max(ms):>8.0f}")
+            if args.importtime:
+                print(f"\n{'package':<28} {'import ms':>9}")
+                for package, ms in slowest_imports(env, args.importtime):
+                    print(f"{package:<28} {ms:>9.0f}")
+    finally:
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
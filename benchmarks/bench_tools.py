@@ -0,0 +1,296 @@
+"""
+End-to-end benchmark of every tool against the local mock Alpaca API.
+
+Starts benchmarks/mock_alpaca.py, launches the server in a subprocess with its
+trading, market data and stream endpoints pointed at the mock, and calls each
+tool through a real MCP SSE client at increasing concurrency (one client
+session per concurrent caller). Reports p50/p95/p99 latency, calls/sec, error
+results and the server's peak RSS while the tool was running.
+
+Usage:
+    python benchmarks/bench_tools.py [--calls 100] [--concurrency 1,8,32] [--latency-ms 20] [--error-rate 0.01]
+    python benchmarks/bench_tools.py --tools get_stock_quote,get_option_chain_greeks --json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from contextlib import AsyncExitStack
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from mock_alpaca import add_arguments, mock_options, serve_in_process
+
+SERVER = os.path.join(BENCH_DIR, "..", "alpaca_mcp_server.py")
+TODAY = date.today()
+EXPIRY = TODAY + timedelta(days=(4 - TODAY.weekday()) % 7 + 14)
+OPTION = f"SPY{EXPIRY:%y%m%d}C{int(round(595 / 5) * 5 * 1000):08d}"
+
+
+async def call(session: ClientSession, tool: str, arguments: dict) -> str:
+    """Calls a tool and returns its text, raising if the result is an error."""
+    result = await session.call_tool(tool, arguments)
+    text = "".join(getattr(item, "text", "") for item in result.content)
+    if result.isError or text.startswith("Error"):
+        raise RuntimeError(text[:200])
+    return text
+
+
+def records(text: str) -> List[dict]:
+    """The records of a tool's json output, with or without metadata."""
+    payload = json.loads(text)
+    return payload["data"] if isinstance(payload, dict) else payload
+
+
+async def open_limit_order(session: ClientSession) -> dict:
+    text = await call(session, "place_stock_order", {
+        "symbol": "AAPL", "side": "buy", "quantity": 1, "order_type": "limit", "limit_price": 1, "format": "json",
+    })
+    return {"order_id": records(text)[0]["id"]}
+
+
+async def market_order(session: ClientSession) -> dict:
+    text = await call(session, "place_stock_order", {"symbol": "MSFT", "side": "buy", "quantity": 1, "format": "json"})
+    return {"order_id": records(text)[0]["id"], "timeout_seconds": 5}
+
+
+async def first_watchlist(session: ClientSession) -> dict:
+    text = await call(session, "get_watchlists", {"format": "json"})
+    return {"watchlist_id": records(text)[0]["id"], "symbols": ["AAPL", "MSFT", "QQQ"]}
+
+
+# Arguments of each tool, either fixed or produced by an untimed setup call.
+# close_all_positions runs last because it empties the account.
+TOOLS: Dict[str, object] = {
+    "get_account_info": {},
+    "get_positions": {},
+    "get_open_position": {"symbol": "AAPL"},
+    "get_portfolio_risk": {},
+    "get_stock_quote": {"symbol": "AAPL"},
+    "get_stock_quotes": {"symbols": ["AAPL", "MSFT", "NVDA", "AMZN", "TSLA"]},
+    "get_stock_bars": {"symbol": "AAPL", "days": 30},
+    "get_stock_trades": {"symbol": "AAPL", "days": 1, "limit": 5000},
+    "get_stock_latest_trade": {"symbol": "NVDA"},
+    "get_stock_latest_bar": {"symbol": "NVDA"},
+    "get_orders": {"status": "all", "limit": 20},
+    "place_stock_order": {"symbol": "AAPL", "side": "buy", "quantity": 1},
+    "place_stock_orders": {"orders": [
+        {"symbol": symbol, "side": "buy", "quantity": 1, "order_type": "limit", "limit_price": 1}
+        for symbol in ("AAPL", "MSFT", "NVDA", "AMZN", "META")
+    ]},
+    "wait_for_order_fill": market_order,
+    "cancel_order_by_id": open_limit_order,
+    "cancel_all_orders": {},
+    "close_position": {"symbol": "SPY", "qty": "0.01"},
+    "get_asset_info": {"symbol": "AAPL"},
+    "get_all_assets": {"status": "active", "fields": "symbol,name,exchange"},
+    "create_watchlist": {"name": "bench", "symbols": ["AAPL", "MSFT"]},
+    "get_watchlists": {},
+    "update_watchlist": first_watchlist,
+    "get_market_clock": {},
+    "get_market_calendar": {"start_date": TODAY.isoformat(), "end_date": (TODAY + timedelta(days=30)).isoformat()},
+    "get_corporate_announcements": {
+        "ca_types": ["dividend"], "since": TODAY.isoformat(), "until": (TODAY + timedelta(days=30)).isoformat(),
+    },
+    "get_option_contracts": {"underlying_symbol": "SPY", "expiration_date": EXPIRY.isoformat()},
+    "get_option_latest_quote": {"symbol": OPTION},
+    "get_option_snapshot": {"symbol_or_symbols": OPTION},
+    "get_option_chain_greeks": {"underlying_symbol": "SPY", "expiration_date": EXPIRY.isoformat()},
+    "place_option_market_order": {"legs": [{"symbol": OPTION, "side": "buy", "ratio_qty": 1}]},
+    "close_all_positions": {},
+}
+
+
+class RSSSampler:
+    """
+    Samples the resident set size of a process and its children (the
+    workers and cache process in multi-process mode) from /proc while a tool runs.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _pids(pid: int) -> List[int]:
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                children = [int(child) for child in f.read().split()]
+        except OSError:
+            children = []
+        return [pid] + [descendant for child in children for descendant in RSSSampler._pids(child)]
+
+    def read(self, field: str = "VmRSS") -> int:
+        """Sum of a /proc status field over the process tree, in bytes (0 where /proc is unavailable)."""
+        total = 0
+        for pid in self._pids(self.pid):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    total += next((int(line.split()[1]) * 1024 for line in f if line.startswith(field + ":")), 0)
+            except OSError:
+                pass
+        return total
+
+    def __enter__(self):
+        self.peak = self.read()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.read())
+
+
+async def run_tool(sessions: List[ClientSession], tool: str, calls: int, sampler: RSSSampler) -> dict:
+    spec = TOOLS[tool]
+    latencies: List[float] = []
+    errors: List[str] = []
+    remaining = calls
+
+    async def worker(session: ClientSession) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            try:
+                arguments = await spec(session) if callable(spec) else spec
+            except Exception as e:
+                errors.append(f"setup: {e}")
+                continue
+            start = time.perf_counter()
+            try:
+                await call(session, tool, arguments)
+            except Exception as e:
+                errors.append(str(e))
+            latencies.append(time.perf_counter() - start)
+
+    with sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for session in sessions))
+        elapsed = time.perf_counter() - start
+    ms = np.array(latencies or [float("nan")]) * 1000
+    return {
+        "tool": tool, "concurrency": len(sessions), "calls": len(latencies),
+        "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)), "p99": float(np.percentile(ms, 99)),
+        "calls_per_sec": len(latencies) / elapsed, "errors": len(errors), "peak_rss_mb": sampler.peak / 2**20,
+        "first_error": errors[0] if errors else None,
+    }
+
+
+async def bench(url: str, tools: List[str], calls: int, levels: List[int], pid: int, as_json: bool) -> None:
+    sampler = RSSSampler(pid)
+    results = []
+    if not as_json:
+        print(f"{'tool':<28} {'conc':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/s':>8} {'errors':>7} {'peak RSS MB':>12}")
+    for concurrency in levels:
+        async with AsyncExitStack() as stack:
+            sessions = []
+            for _ in range(concurrency):
+                read, write = await stack.enter_async_context(sse_client(url))
+                session = await stack.enter_async_context(ClientSession(read, write))
+                await session.initialize()
+                sessions.append(session)
+            for tool in tools:
+                result = await run_tool(sessions, tool, max(calls, concurrency), sampler)
+                results.append(result)
+                if not as_json:
+                    print(f"{tool:<28} {concurrency:>5} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f} "
+                          f"{result['calls_per_sec']:>8.1f} {result['errors']:>7} {result['peak_rss_mb']:>12.1f}")
+                    if result["first_error"]:
+                        print(f"    first error: {result['first_error']}")
+    if as_json:
+        print(json.dumps({"results": results, "server_peak_rss_mb": sampler.read("VmHWM") / 2**20}, indent=2))
+    else:
+        print(f"\nServer peak RSS over the whole run: {sampler.read('VmHWM') / 2**20:.1f} MB")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(mock_url: str, cache_dir: str, **settings) -> Dict[str, str]:
+    return dict(
+        os.environ,
+        ALPACA_API_KEY="benchmark",
+        ALPACA_SECRET_KEY="benchmark",
+        TRADE_API_URL=mock_url,
+        DATA_API_URL=mock_url,
+        TRDE_API_WSS=mock_url.replace("http", "ws") + "/stream",
+        STREAM_DATA_WSS=mock_url.replace("http", "ws") + "/v2/iex",
+        ALPACA_MCP_CACHE_DIR=cache_dir,
+        # Measure the server, not the client-side pacing meant for the real API
+        UPSTREAM_RATE_LIMIT="0",
+        **settings,
+    )
+
+
+def start_server(port: int, mock_url: str, cache_dir: str, *args: str, **settings) -> subprocess.Popen:
+    env = server_env(mock_url, cache_dir, PORT=str(port), **settings)
+    server = subprocess.Popen([sys.executable, SERVER, *args], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return server
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                server.kill()
+                raise RuntimeError("The server did not start")
+            time.sleep(0.1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100, help="Calls per tool and concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--tools", default="", help="Comma-separated tools to run (default: all)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    tools = [tool for tool in args.tools.split(",") if tool] or list(TOOLS)
+    unknown = set(tools) - set(TOOLS)
+    if unknown:
+        parser.error(f"unknown tools: {', '.join(sorted(unknown))}")
+
+    mock = serve_in_process(args.mock_port, **mock_options(args))
+    port = free_port()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_server(port, f"http://127.0.0.1:{args.mock_port}", cache_dir)
+        if not args.json:
+            print(f"Mock latency {args.latency_ms:g} ms, error rate {args.error_rate:g}, {args.assets} assets, "
+                  f"{args.trades} trades per symbol, {args.calls} calls per tool and level\n")
+        try:
+            asyncio.run(bench(f"http://127.0.0.1:{port}/sse", tools, args.calls,
+                              [int(level) for level in args.concurrency.split(",")], server.pid, args.json))
+        finally:
+            server.terminate()
+            server.wait()
+            mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
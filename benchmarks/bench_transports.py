@@ -0,0 +1,127 @@
+"""
+Benchmark of the MCP transports: SSE against streamable HTTP.
+
+Starts the server with --transport both against the local mock Alpaca API
+and measures two patterns for each endpoint:
+
+- invocation: a short-lived agent call that connects, initializes a session,
+  calls one tool and disconnects, as hosts that spawn a client per task do
+- session: calls made over one session that stays open
+
+Endpoints are /sse, /mcp (streamable HTTP with sessions) and /mcp/read-only
+(stateless streamable HTTP, read-only tools, plain JSON responses). The
+default tool is answered from the local market calendar, so the numbers are
+dominated by transport overhead.
+
+Usage:
+    python benchmarks/bench_transports.py [--calls 200] [--concurrency 1,16] [--tool get_market_clock]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import List
+
+import numpy as np
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from mock_alpaca import add_arguments, mock_options, serve_in_process
+from bench_tools import call, free_port, start_server
+
+ENDPOINTS = {"sse": "/sse", "streamable-http": "/mcp", "stateless read-only": "/mcp/read-only"}
+
+
+@asynccontextmanager
+async def open_session(url: str):
+    if url.endswith("/sse"):
+        async with sse_client(url) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield session
+    else:
+        async with streamablehttp_client(url) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield session
+
+
+async def timed_runs(calls: int, concurrency: int, run) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = calls
+
+    async def worker(index: int) -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                await run(index)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)), "p99": float(np.percentile(ms, 99)),
+        "per_sec": len(latencies) / elapsed, "errors": errors,
+    }
+
+
+async def bench(base_url: str, tool: str, arguments: dict, calls: int, levels: List[int]) -> None:
+    print(f"{'endpoint':<20} {'pattern':<11} {'conc':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'per sec':>8} {'errors':>7}")
+    for concurrency in levels:
+        for name, path in ENDPOINTS.items():
+            url = base_url + path
+
+            async def invocation(index: int) -> None:
+                async with open_session(url) as session:
+                    await call(session, tool, arguments)
+
+            results = {"invocation": await timed_runs(calls, concurrency, invocation)}
+            async with AsyncExitStack() as stack:
+                sessions = [await stack.enter_async_context(open_session(url)) for _ in range(concurrency)]
+                await timed_runs(concurrency, concurrency, lambda index: call(sessions[index], tool, arguments))  # warm up
+                results["session"] = await timed_runs(calls, concurrency, lambda index: call(sessions[index], tool, arguments))
+            for pattern, result in results.items():
+                print(f"{name:<20} {pattern:<11} {concurrency:>5} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+                      f"{result['p99']:>8.1f} {result['per_sec']:>8.1f} {result['errors']:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Invocations or calls per endpoint, pattern and level")
+    parser.add_argument("--concurrency", default="1,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--tool", default="get_market_clock", help="Read-only tool to call")
+    parser.add_argument("--arguments", default="{}", help="Tool arguments as JSON")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    mock = serve_in_process(args.mock_port, **mock_options(args))
+    port = free_port()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_server(port, f"http://127.0.0.1:{args.mock_port}", cache_dir, "--transport", "both")
+        print(f"{args.tool}, {args.calls} calls per endpoint, pattern and level\n")
+        try:
+            asyncio.run(bench(f"http://127.0.0.1:{port}", args.tool, json.loads(args.arguments), args.calls,
+                              [int(level) for level in args.concurrency.split(",")]))
+        finally:
+            server.terminate()
+            server.wait()
+            mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
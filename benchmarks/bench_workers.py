@@ -0,0 +1,113 @@
+"""
+Scaling benchmark of the multi-process mode (WORKERS).
+
+For each worker count, starts the server against the local mock Alpaca API
+and drives a mix of tools from --concurrency MCP SSE sessions: tools that
+spend most of their time in the server (rendering the asset catalog,
+pricing an option chain, paging trades) and reads served from the shared
+caches. Reports calls/sec, p50/p99 latency, the server's total RSS and the
+number of requests the mock served. Thanks to the shared cache, upstream
+requests should stay flat as workers are added. Throughput can only scale
+with the number of CPU cores available.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--calls 400] [--concurrency 32]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from contextlib import AsyncExitStack
+from typing import List
+
+import httpx
+import numpy as np
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from mock_alpaca import add_arguments, mock_options, serve_in_process
+from bench_tools import EXPIRY, RSSSampler, call, free_port, start_server
+
+MIX = [
+    ("get_all_assets", {"status": "active", "fields": "symbol,name,exchange"}),
+    ("get_option_chain_greeks", {"underlying_symbol": "SPY", "expiration_date": EXPIRY.isoformat()}),
+    ("get_stock_trades", {"symbol": "AAPL", "days": 1, "limit": 2000}),
+    ("get_option_contracts", {"underlying_symbol": "QQQ", "expiration_date": EXPIRY.isoformat()}),
+    ("get_asset_info", {"symbol": "MSFT"}),
+    ("get_stock_quote", {"symbol": "NVDA"}),
+    ("get_market_clock", {}),
+]
+
+
+async def drive(url: str, calls: int, concurrency: int, sampler: RSSSampler) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+
+    async def worker(session: ClientSession) -> None:
+        nonlocal errors, issued
+        while issued < calls:
+            tool, arguments = MIX[issued % len(MIX)]
+            issued += 1
+            start = time.perf_counter()
+            try:
+                await call(session, tool, arguments)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with AsyncExitStack() as stack:
+        sessions = []
+        for _ in range(concurrency):
+            read, write = await stack.enter_async_context(sse_client(url))
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            sessions.append(session)
+        with sampler:
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(session) for session in sessions))
+            elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "calls_per_sec": len(latencies) / elapsed, "p50": np.percentile(ms, 50), "p99": np.percentile(ms, 99),
+        "errors": errors, "peak_rss_mb": sampler.peak / 2**20,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--calls", type=int, default=400, help="Calls per worker count")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent client sessions")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = serve_in_process(args.mock_port, **mock_options(args))
+    print(f"{os.cpu_count()} CPUs, mock latency {args.latency_ms:g} ms, {args.calls} calls from {args.concurrency} sessions\n")
+    print(f"{'workers':>7} {'calls/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'RSS MB':>8} {'upstream':>9}")
+    try:
+        for workers in [int(n) for n in args.workers.split(",")]:
+            port = free_port()
+            served_before = sum(httpx.get(f"{mock_url}/_stats").json().values())
+            with tempfile.TemporaryDirectory() as cache_dir:
+                server = start_server(port, mock_url, cache_dir, WORKERS=str(workers))
+                try:
+                    result = asyncio.run(drive(f"http://127.0.0.1:{port}/sse", args.calls, args.concurrency, RSSSampler(server.pid)))
+                finally:
+                    server.terminate()
+                    server.wait()
+            upstream = sum(httpx.get(f"{mock_url}/_stats").json().values()) - served_before
+            print(f"{workers:>7} {result['calls_per_sec']:>8.1f} {result['p50']:>8.1f} {result['p99']:>8.1f} "
+                  f"{result['errors']:>7} {result['peak_rss_mb']:>8.1f} {upstream:>9}")
+    finally:
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
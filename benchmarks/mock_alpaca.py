@@ -0,0 +1,669 @@
+"""
+Local mock of the Alpaca trading, market data and streaming APIs used by the benchmarks.
+
+Serves the REST endpoints every tool calls, plus the market data and trade
+updates websockets, from synthetic in-memory state: a catalog of --assets
+stocks, option chains, a paper account whose orders fill and move positions,
+and as many historical trades per symbol as --trades asks for. Responses are
+delayed by --latency-ms (+/- --jitter-ms), and --error-rate of REST requests
+fail with one of --error-codes, so retries and circuit breakers get exercised.
+GET /_stats returns the number of REST requests served per path.
+
+Usage:
+    python benchmarks/mock_alpaca.py [--port 8765] [--latency-ms 20] [--error-rate 0.01]
+
+Point the server at it with:
+    TRADE_API_URL=http://127.0.0.1:8765  DATA_API_URL=http://127.0.0.1:8765
+    TRDE_API_WSS=ws://127.0.0.1:8765/stream  STREAM_DATA_WSS=ws://127.0.0.1:8765/v2/iex
+"""
+import json
+import math
+import time
+import random
+import socket
+import string
+import asyncio
+import argparse
+import multiprocessing
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from uuid import NAMESPACE_URL, uuid4, uuid5
+from zoneinfo import ZoneInfo
+
+import msgpack
+import uvicorn
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+MARKET_TZ = ZoneInfo("America/New_York")
+BASE_SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "SPY", "QQQ", "IWM"]
+
+
+def _ts(moment: Optional[datetime] = None) -> str:
+    return (moment or datetime.now(timezone.utc)).isoformat().replace("+00:00", "Z")
+
+
+def _price(symbol: str) -> float:
+    """Stable base price of a symbol, with a little noise on every call."""
+    return 20 + (sum(ord(c) * (i + 1) for i, c in enumerate(symbol)) % 480) + random.random()
+
+
+def _quote(price: float) -> dict:
+    return {"t": _ts(), "ax": "V", "ap": round(price + 0.01, 2), "as": 1, "bx": "V", "bp": round(price - 0.01, 2), "bs": 1, "c": ["R"], "z": "C"}
+
+
+def _trade(price: float, moment: Optional[datetime] = None, trade_id: Optional[int] = None) -> dict:
+    return {"t": _ts(moment), "x": "V", "p": round(price, 2), "s": 100, "c": ["@"], "i": trade_id or random.randint(1, 10**9), "z": "C"}
+
+
+def _bar(price: float, moment: Optional[datetime] = None) -> dict:
+    return {"t": _ts(moment), "o": price, "h": price + 0.5, "l": price - 0.5, "c": price, "v": 1000, "n": 10, "vw": price}
+
+
+def _parse_time(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    if len(value) == 10:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _error(status: int, message: str, code: int = 40010000) -> JSONResponse:
+    return JSONResponse({"code": code, "message": message}, status_code=status)
+
+
+class MockAccount:
+    """Synthetic account state: assets, orders, positions and watchlists."""
+
+    def __init__(self, assets: int, trades: int, fill_delay: float):
+        self.account_id = str(uuid4())
+        self.trades_per_symbol = trades
+        self.fill_delay = fill_delay
+        self.assets = self._assets(assets)
+        self.assets_by_symbol = {asset["symbol"]: asset for asset in self.assets}
+        self.orders: Dict[str, dict] = {}
+        self.positions: Dict[str, dict] = {}
+        self.watchlists: Dict[str, dict] = {}
+        self.trade_streams: List[WebSocket] = []
+        for symbol in ("AAPL", "MSFT", "SPY"):
+            self._move_position(symbol, 10, _price(symbol))
+        self.create_watchlist("Benchmark", ["AAPL", "NVDA", "TSLA"])
+
+    @staticmethod
+    def _assets(count: int) -> List[dict]:
+        symbols = list(BASE_SYMBOLS)
+        rng = random.Random(7)
+        seen = set(symbols)
+        while len(symbols) < count:
+            symbol = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 5)))
+            if symbol not in seen:
+                seen.add(symbol)
+                symbols.append(symbol)
+        return [{
+            "id": str(uuid5(NAMESPACE_URL, symbol)), "class": "us_equity", "exchange": "NASDAQ" if i % 2 else "NYSE",
+            "symbol": symbol, "name": f"{symbol} Holdings Inc. Common Stock", "status": "active", "tradable": True,
+            "marginable": True, "shortable": i % 3 != 0, "easy_to_borrow": i % 3 != 0, "fractionable": i % 4 != 0,
+            "maintenance_margin_requirement": 30, "attributes": ["has_options"] if i < 100 else [],
+        } for i, symbol in enumerate(symbols[:count])]
+
+    def account(self) -> dict:
+        long_value = sum(float(p["market_value"]) for p in self.positions.values())
+        cash = 100_000.0 - sum(float(p["cost_basis"]) for p in self.positions.values())
+        equity = cash + long_value
+        return {
+            "id": self.account_id, "account_number": "PA3BENCHMARK", "status": "ACTIVE", "crypto_status": "ACTIVE",
+            "currency": "USD", "buying_power": str(equity * 2), "regt_buying_power": str(equity * 2),
+            "daytrading_buying_power": str(equity * 4), "non_marginable_buying_power": str(cash), "cash": str(cash),
+            "accrued_fees": "0", "portfolio_value": str(equity), "pattern_day_trader": False, "trading_blocked": False,
+            "transfers_blocked": False, "account_blocked": False, "created_at": "2024-01-02T15:00:00Z",
+            "trade_suspended_by_user": False, "multiplier": "2", "shorting_enabled": True, "equity": str(equity),
+            "last_equity": str(equity), "long_market_value": str(long_value), "short_market_value": "0",
+            "initial_margin": str(long_value / 2), "maintenance_margin": str(long_value * 0.3),
+            "last_maintenance_margin": str(long_value * 0.3), "sma": str(equity), "daytrade_count": 0, "options_trading_level": 2,
+        }
+
+    def _move_position(self, symbol: str, qty: float, price: float) -> None:
+        position = self.positions.get(symbol)
+        held = float(position["qty"]) if position else 0.0
+        cost = float(position["cost_basis"]) if position else 0.0
+        held, cost = held + qty, cost + qty * price
+        if abs(held) < 1e-9:
+            self.positions.pop(symbol, None)
+            return
+        entry = cost / held
+        asset = self.assets_by_symbol.get(symbol, {"id": str(uuid5(NAMESPACE_URL, symbol)), "exchange": "NASDAQ"})
+        self.positions[symbol] = {
+            "asset_id": asset["id"], "symbol": symbol, "exchange": asset["exchange"], "asset_class": "us_equity",
+            "avg_entry_price": str(entry), "qty": str(held), "qty_available": str(held), "side": "long" if held > 0 else "short",
+            "market_value": str(held * price), "cost_basis": str(cost), "unrealized_pl": str(held * (price - entry)),
+            "unrealized_plpc": str((price - entry) / entry), "unrealized_intraday_pl": "0", "unrealized_intraday_plpc": "0",
+            "current_price": str(price), "lastday_price": str(price), "change_today": "0",
+        }
+
+    def position(self, symbol: str) -> Optional[dict]:
+        position = self.positions.get(symbol)
+        if position is not None:
+            price = _price(symbol)
+            qty = float(position["qty"])
+            position.update(current_price=str(price), market_value=str(qty * price),
+                            unrealized_pl=str(qty * price - float(position["cost_basis"])))
+        return position
+
+    def new_order(self, body: dict) -> dict:
+        now = _ts()
+        symbol = body["symbol"].upper()
+        order_type = body.get("type") or body.get("order_type") or "market"
+        return {
+            "id": str(uuid4()), "client_order_id": body.get("client_order_id") or uuid4().hex, "created_at": now,
+            "updated_at": now, "submitted_at": now, "filled_at": None, "expired_at": None, "canceled_at": None,
+            "failed_at": None, "replaced_at": None, "replaced_by": None, "replaces": None,
+            "asset_id": self.assets_by_symbol.get(symbol, {}).get("id", str(uuid5(NAMESPACE_URL, symbol))),
+            "symbol": symbol, "asset_class": "us_option" if len(symbol) > 15 else "us_equity",
+            "notional": body.get("notional"), "qty": str(body.get("qty")) if body.get("qty") is not None else None,
+            "filled_qty": "0", "filled_avg_price": None, "order_class": body.get("order_class") or "simple",
+            "order_type": order_type, "type": order_type, "side": body.get("side", "buy"),
+            "time_in_force": body.get("time_in_force", "day"), "limit_price": body.get("limit_price"),
+            "stop_price": body.get("stop_price"), "status": "new", "extended_hours": bool(body.get("extended_hours")),
+            "legs": None, "trail_percent": body.get("trail_percent"), "trail_price": body.get("trail_price"),
+            "hwm": None, "position_intent": body.get("position_intent"),
+        }
+
+    async def publish(self, event: str, order: dict, **fields) -> None:
+        message = json.dumps({"stream": "trade_updates", "data": {"event": event, "order": order, "timestamp": _ts(), **fields}})
+        for ws in list(self.trade_streams):
+            try:
+                await ws.send_text(message)
+            except Exception:
+                self.trade_streams.remove(ws)
+
+    async def fill_later(self, order: dict) -> None:
+        await asyncio.sleep(self.fill_delay)
+        if order["status"] not in ("new", "accepted"):
+            return
+        price = float(order["limit_price"]) if order.get("limit_price") else _price(order["symbol"])
+        qty = float(order["qty"] or 1)
+        order.update(status="filled", filled_qty=str(qty), filled_avg_price=str(price), filled_at=_ts(), updated_at=_ts())
+        self._move_position(order["symbol"], qty if order["side"] == "buy" else -qty, price)
+        position_qty = self.positions.get(order["symbol"], {}).get("qty", "0")
+        await self.publish("fill", order, price=str(price), qty=str(qty), position_qty=position_qty, execution_id=str(uuid4()))
+
+    def create_watchlist(self, name: str, symbols: List[str]) -> dict:
+        now = _ts()
+        watchlist = {
+            "id": str(uuid4()), "account_id": self.account_id, "name": name, "created_at": now, "updated_at": now,
+            "assets": [self.assets_by_symbol[s] for s in symbols if s in self.assets_by_symbol],
+        }
+        self.watchlists[watchlist["id"]] = watchlist
+        return watchlist
+
+
+def _option_chain(underlying: str, today: date) -> List[dict]:
+    spot = _price(underlying)
+    step = 1 if spot < 100 else 5
+    center = round(spot / step) * step
+    contracts = []
+    friday = today + timedelta(days=(4 - today.weekday()) % 7)
+    for week in range(12):
+        expiry = friday + timedelta(weeks=week)
+        for k in range(-25, 25):
+            strike = center + k * step
+            if strike <= 0:
+                continue
+            for kind in ("call", "put"):
+                symbol = f"{underlying}{expiry:%y%m%d}{kind[0].upper()}{int(strike * 1000):08d}"
+                contracts.append({
+                    "id": str(uuid5(NAMESPACE_URL, symbol)), "symbol": symbol, "name": f"{underlying} {expiry} {kind} {strike}",
+                    "status": "active", "tradable": True, "expiration_date": expiry.isoformat(), "root_symbol": underlying,
+                    "underlying_symbol": underlying, "underlying_asset_id": str(uuid5(NAMESPACE_URL, underlying)),
+                    "type": kind, "style": "american", "strike_price": str(strike), "size": "100",
+                    "open_interest": str(random.randint(0, 5000)), "open_interest_date": today.isoformat(),
+                    "close_price": None, "close_price_date": None,
+                })
+    return contracts
+
+
+def _option_snapshot(symbol: str) -> dict:
+    # Symbol layout: root, yymmdd, C/P, strike * 1000 (8 digits)
+    root, expiry, kind, strike = symbol[:-15], symbol[-15:-9], symbol[-9], int(symbol[-8:]) / 1000
+    spot = _price(root)
+    years = max((datetime.strptime(expiry, "%y%m%d").date() - date.today()).days, 1) / 365
+    intrinsic = max(spot - strike, 0) if kind == "C" else max(strike - spot, 0)
+    moneyness = (strike - spot) / (spot * 0.3 * math.sqrt(years))
+    mid = intrinsic + 0.4 * spot * 0.3 * math.sqrt(years) * math.exp(-0.5 * moneyness ** 2) + 0.05
+    delta = 0.5 * (1 + math.erf(-moneyness / math.sqrt(2)))
+    return {
+        "latestQuote": {**_quote(mid), "ap": round(mid + 0.05, 2), "bp": round(max(mid - 0.05, 0.01), 2)},
+        "latestTrade": _trade(mid), "impliedVolatility": 0.3,
+        "greeks": {"delta": delta if kind == "C" else delta - 1, "gamma": 0.02, "rho": 0.05, "theta": -0.03, "vega": 0.12},
+    }
+
+
+def _sessions(start: date, end: date) -> List[dict]:
+    sessions = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            sessions.append({"date": day.isoformat(), "open": "09:30", "close": "16:00",
+                             "session_open": "0400", "session_close": "2000", "settlement_date": (day + timedelta(days=1)).isoformat()})
+        day += timedelta(days=1)
+    return sessions
+
+
+def _clock() -> dict:
+    now = datetime.now(MARKET_TZ)
+    sessions = _sessions(now.date(), now.date() + timedelta(days=7))
+    for i, session in enumerate(sessions):
+        day = date.fromisoformat(session["date"])
+        opens = datetime.combine(day, datetime.strptime("09:30", "%H:%M").time(), MARKET_TZ)
+        closes = datetime.combine(day, datetime.strptime("16:00", "%H:%M").time(), MARKET_TZ)
+        if now < closes:
+            next_open = opens
+            if opens <= now:
+                next_open = datetime.combine(date.fromisoformat(sessions[i + 1]["date"]), opens.time(), MARKET_TZ)
+            return {"timestamp": now.isoformat(), "is_open": opens <= now, "next_open": next_open.isoformat(), "next_close": closes.isoformat()}
+    raise RuntimeError("no session within a week")
+
+
+def create_app(
+    latency_ms: float = 20.0,
+    jitter_ms: float = 5.0,
+    error_rate: float = 0.0,
+    error_codes=(500, 503, 429),
+    assets: int = 10_000,
+    trades: int = 100_000,
+    fill_delay_ms: float = 50.0,
+    tick_ms: float = 100.0,
+) -> FastAPI:
+    """
+    Builds the mock as a FastAPI app.
+
+    Args:
+        latency_ms: Mean delay added to every REST response
+        jitter_ms: Uniform jitter around the delay
+        error_rate: Fraction of REST requests that fail with one of error_codes
+        error_codes: HTTP statuses used for injected failures (429 carries Retry-After)
+        assets: Number of assets in the catalog
+        trades: Historical trades available per symbol, served in pages
+        fill_delay_ms: Delay before a market order fills
+        tick_ms: Interval between streamed quotes and trades per subscribed symbol
+    """
+    app = FastAPI()
+    state = MockAccount(assets, trades, fill_delay_ms / 1000)
+    chains: Dict[str, List[dict]] = {}
+    served = Counter()
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(served)
+
+    @app.middleware("http")
+    async def latency_and_errors(request: Request, call_next):
+        if request.url.path == "/_stats":
+            return await call_next(request)
+        served[request.url.path] += 1
+        await asyncio.sleep(max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0) / 1000)
+        if error_rate and random.random() < error_rate:
+            status = random.choice(error_codes)
+            headers = {"Retry-After": "0.1"} if status == 429 else {}
+            return JSONResponse({"code": status * 100000, "message": "injected failure"}, status_code=status, headers=headers)
+        return await call_next(request)
+
+    def symbols(request: Request) -> List[str]:
+        return [s for s in request.query_params.get("symbols", "").split(",") if s]
+
+    # ---- Market data -------------------------------------------------------
+
+    @app.get("/v2/stocks/quotes/latest")
+    async def latest_quotes(request: Request):
+        return {"quotes": {s: _quote(_price(s)) for s in symbols(request)}}
+
+    @app.get("/v2/stocks/trades/latest")
+    async def latest_trades(request: Request):
+        return {"trades": {s: _trade(_price(s)) for s in symbols(request)}}
+
+    @app.get("/v2/stocks/bars/latest")
+    async def latest_bars(request: Request):
+        return {"bars": {s: _bar(_price(s)) for s in symbols(request)}}
+
+    @app.get("/v2/stocks/bars")
+    async def bars(request: Request):
+        params = request.query_params
+        timeframe = params.get("timeframe", "1Day")
+        step = {"Min": timedelta(minutes=1), "Hour": timedelta(hours=1)}.get(timeframe.lstrip("0123456789"), timedelta(days=1))
+        end = _parse_time(params.get("end"), datetime.now(timezone.utc))
+        start = _parse_time(params.get("start"), end - 30 * step)
+        limit = int(params.get("limit", 10000))
+        cursor = _parse_time(params.get("page_token"), start)
+        result, next_token = {}, None
+        for symbol in symbols(request):
+            base, rows = _price(symbol), []
+            moment = cursor
+            while moment < end and len(rows) < limit:
+                if step < timedelta(days=1) or moment.weekday() < 5:
+                    rows.append(_bar(base + math.sin(moment.timestamp() / 86400) * 5, moment))
+                moment += step
+            result[symbol] = rows
+            if moment < end:
+                next_token = _ts(moment)
+        return {"bars": result, "next_page_token": next_token}
+
+    @app.get("/v2/stocks/trades")
+    async def trades_history(request: Request):
+        params = request.query_params
+        limit = min(int(params.get("limit", 1000)), 10000)
+        offset = int(params.get("page_token") or 0)
+        end = _parse_time(params.get("end"), datetime.now(timezone.utc))
+        start = _parse_time(params.get("start"), end - timedelta(days=1))
+        count = max(min(limit, state.trades_per_symbol - offset), 0)
+        spacing = (end - start) / max(state.trades_per_symbol, 1)
+        result = {}
+        for symbol in symbols(request):
+            base = _price(symbol)
+            result[symbol] = [
+                _trade(base + random.uniform(-0.5, 0.5), start + spacing * (offset + i), offset + i + 1) for i in range(count)
+            ]
+        next_offset = offset + count
+        return {"trades": result, "next_page_token": str(next_offset) if next_offset < state.trades_per_symbol else None}
+
+    @app.get("/v1beta1/options/quotes/latest")
+    async def option_quotes(request: Request):
+        return {"quotes": {s: _option_snapshot(s)["latestQuote"] for s in symbols(request)}}
+
+    @app.get("/v1beta1/options/snapshots")
+    async def option_snapshots(request: Request):
+        return {"snapshots": {s: _option_snapshot(s) for s in symbols(request)}, "next_page_token": None}
+
+    # ---- Trading -----------------------------------------------------------
+
+    @app.get("/v2/account")
+    async def account():
+        return state.account()
+
+    @app.get("/v2/clock")
+    async def clock():
+        return _clock()
+
+    @app.get("/v2/calendar")
+    async def calendar(start: Optional[str] = None, end: Optional[str] = None):
+        today = date.today()
+        return _sessions(date.fromisoformat(start[:10]) if start else today, date.fromisoformat(end[:10]) if end else today + timedelta(days=30))
+
+    @app.get("/v2/assets")
+    async def assets_list(request: Request):
+        status = request.query_params.get("status")
+        asset_class = request.query_params.get("asset_class")
+        return [a for a in state.assets if (not status or a["status"] == status) and (not asset_class or a["class"] == asset_class)]
+
+    @app.get("/v2/assets/{symbol}")
+    async def asset(symbol: str):
+        found = state.assets_by_symbol.get(symbol.upper())
+        return found if found else _error(404, "asset not found", 40410000)
+
+    @app.get("/v2/positions")
+    async def positions():
+        return [state.position(symbol) for symbol in list(state.positions)]
+
+    @app.get("/v2/positions/{symbol}")
+    async def position(symbol: str):
+        found = state.position(symbol.upper())
+        return found if found else _error(404, "position does not exist", 40410000)
+
+    async def liquidate(symbol: str, qty: Optional[float] = None) -> dict:
+        held = float(state.positions[symbol]["qty"])
+        qty = abs(held) if qty is None else qty
+        order = state.new_order({"symbol": symbol, "qty": qty, "side": "sell" if held > 0 else "buy", "type": "market"})
+        state.orders[order["id"]] = order
+        await state.publish("new", order)
+        asyncio.get_running_loop().create_task(state.fill_later(order))
+        return order
+
+    @app.delete("/v2/positions/{symbol}")
+    async def close_position(symbol: str, qty: Optional[float] = None, percentage: Optional[float] = None):
+        symbol = symbol.upper()
+        if symbol not in state.positions:
+            return _error(404, "position does not exist", 40410000)
+        if percentage is not None:
+            qty = abs(float(state.positions[symbol]["qty"])) * percentage / 100
+        return await liquidate(symbol, qty)
+
+    @app.delete("/v2/positions")
+    async def close_all_positions():
+        return [{"symbol": symbol, "status": 200, "body": await liquidate(symbol)} for symbol in list(state.positions)]
+
+    @app.get("/v2/orders")
+    async def orders(status: str = "open", limit: int = 50):
+        selected = [
+            o for o in state.orders.values()
+            if status == "all" or (o["status"] in ("new", "accepted", "partially_filled")) == (status == "open")
+        ]
+        selected.sort(key=lambda o: o["submitted_at"], reverse=True)
+        return selected[:limit]
+
+    @app.post("/v2/orders")
+    async def submit_order(request: Request):
+        body = await request.json()
+        if body.get("client_order_id") and any(o["client_order_id"] == body["client_order_id"] for o in state.orders.values()):
+            return _error(422, "client_order_id must be unique", 40010001)
+        order = state.new_order(body)
+        state.orders[order["id"]] = order
+        await state.publish("new", order)
+        if order["type"] == "market":
+            asyncio.get_running_loop().create_task(state.fill_later(order))
+        return order
+
+    @app.get("/v2/orders:by_client_order_id")
+    async def order_by_client_id(client_order_id: str):
+        found = next((o for o in state.orders.values() if o["client_order_id"] == client_order_id), None)
+        return found if found else _error(404, "order not found", 40410000)
+
+    @app.get("/v2/orders/{order_id}")
+    async def order(order_id: str):
+        found = state.orders.get(order_id)
+        return found if found else _error(404, "order not found", 40410000)
+
+    async def cancel(order: dict) -> None:
+        order.update(status="canceled", canceled_at=_ts(), updated_at=_ts())
+        await state.publish("canceled", order)
+
+    @app.delete("/v2/orders/{order_id}")
+    async def cancel_order(order_id: str):
+        found = state.orders.get(order_id)
+        if found is None:
+            return _error(404, "order not found", 40410000)
+        if found["status"] not in ("new", "accepted", "partially_filled"):
+            return _error(422, f"order is already in \"{found['status']}\" state", 42210000)
+        await cancel(found)
+        return Response(status_code=204)
+
+    @app.delete("/v2/orders")
+    async def cancel_orders():
+        open_orders = [o for o in state.orders.values() if o["status"] in ("new", "accepted", "partially_filled")]
+        for o in open_orders:
+            await cancel(o)
+        return [{"id": o["id"], "status": 200} for o in open_orders]
+
+    @app.get("/v2/watchlists")
+    async def watchlists():
+        return [{k: v for k, v in w.items() if k != "assets"} for w in state.watchlists.values()]
+
+    @app.post("/v2/watchlists")
+    async def create_watchlist(request: Request):
+        body = await request.json()
+        return state.create_watchlist(body["name"], body.get("symbols") or [])
+
+    @app.get("/v2/watchlists/{watchlist_id}")
+    async def watchlist(watchlist_id: str):
+        found = state.watchlists.get(watchlist_id)
+        return found if found else _error(404, "watchlist not found", 40410000)
+
+    @app.put("/v2/watchlists/{watchlist_id}")
+    async def update_watchlist(watchlist_id: str, request: Request):
+        found = state.watchlists.get(watchlist_id)
+        if found is None:
+            return _error(404, "watchlist not found", 40410000)
+        body = await request.json()
+        found.update(name=body.get("name") or found["name"], updated_at=_ts())
+        if body.get("symbols") is not None:
+            found["assets"] = [state.assets_by_symbol[s] for s in body["symbols"] if s in state.assets_by_symbol]
+        return found
+
+    @app.get("/v2/corporate_actions/announcements")
+    async def announcements(since: Optional[str] = None, symbol: Optional[str] = None):
+        base = date.fromisoformat(since) if since else date.today()
+        return [{
+            "id": str(uuid4()), "corporate_action_id": f"CA{i:06d}", "ca_type": "dividend", "ca_sub_type": "cash",
+            "initiating_symbol": symbol or BASE_SYMBOLS[i % len(BASE_SYMBOLS)], "initiating_original_cusip": f"{i:09d}",
+            "target_symbol": None, "target_original_cusip": None, "declaration_date": base.isoformat(),
+            "ex_date": (base + timedelta(days=7)).isoformat(), "record_date": (base + timedelta(days=8)).isoformat(),
+            "payable_date": (base + timedelta(days=21)).isoformat(), "cash": 0.25 + i / 100, "old_rate": 1, "new_rate": 1,
+        } for i in range(20)]
+
+    @app.get("/v2/options/contracts")
+    async def option_contracts(request: Request):
+        params = request.query_params
+        underlyings = [s for s in params.get("underlying_symbols", "").split(",") if s] or ["SPY"]
+        contracts = []
+        for underlying in underlyings:
+            if underlying not in chains:
+                chains[underlying] = _option_chain(underlying, date.today())
+            contracts.extend(chains[underlying])
+        if params.get("expiration_date"):
+            contracts = [c for c in contracts if c["expiration_date"] == params["expiration_date"]]
+        if params.get("expiration_date_gte"):
+            contracts = [c for c in contracts if c["expiration_date"] >= params["expiration_date_gte"]]
+        if params.get("expiration_date_lte"):
+            contracts = [c for c in contracts if c["expiration_date"] <= params["expiration_date_lte"]]
+        if params.get("strike_price_gte"):
+            contracts = [c for c in contracts if float(c["strike_price"]) >= float(params["strike_price_gte"])]
+        if params.get("strike_price_lte"):
+            contracts = [c for c in contracts if float(c["strike_price"]) <= float(params["strike_price_lte"])]
+        if params.get("type"):
+            contracts = [c for c in contracts if c["type"] == params["type"]]
+        offset = int(params.get("page_token") or 0)
+        limit = int(params.get("limit", 100))
+        page = contracts[offset:offset + limit]
+        return {"option_contracts": page, "next_page_token": str(offset + limit) if offset + limit < len(contracts) else None}
+
+    # ---- Websockets --------------------------------------------------------
+
+    @app.websocket("/stream")
+    async def trade_updates(ws: WebSocket):
+        await ws.accept()
+        try:
+            await ws.receive()  # authenticate
+            await ws.send_text(json.dumps({"stream": "authorization", "data": {"status": "authorized", "action": "authenticate"}}))
+            await ws.receive()  # listen
+            await ws.send_text(json.dumps({"stream": "listening", "data": {"streams": ["trade_updates"]}}))
+            state.trade_streams.append(ws)
+            while (await ws.receive())["type"] != "websocket.disconnect":
+                pass
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if ws in state.trade_streams:
+                state.trade_streams.remove(ws)
+
+    @app.websocket("/v2/{feed}")
+    async def market_data(ws: WebSocket, feed: str):
+        await ws.accept()
+        subscribed = {"trades": set(), "quotes": set(), "bars": set()}
+
+        async def send(messages: List[dict]) -> None:
+            await ws.send_bytes(msgpack.packb(messages, datetime=True))
+
+        async def receive_loop():
+            while True:
+                message = await ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                payload = msgpack.unpackb(message.get("bytes") or message.get("text", "").encode())
+                action = payload.get("action")
+                if action == "auth":
+                    await send([{"T": "success", "msg": "authenticated"}])
+                elif action in ("subscribe", "unsubscribe"):
+                    for channel, symbols_ in subscribed.items():
+                        for symbol in payload.get(channel, []):
+                            symbols_.add(symbol) if action == "subscribe" else symbols_.discard(symbol)
+                    await send([{"T": "subscription", **{channel: sorted(s) for channel, s in subscribed.items()}}])
+
+        async def publish_loop():
+            while True:
+                await asyncio.sleep(tick_ms / 1000)
+                now = datetime.now(timezone.utc)
+                messages = []
+                for symbol in subscribed["quotes"]:
+                    messages.append({**_quote(_price(symbol)), "T": "q", "S": symbol, "t": now})
+                for symbol in subscribed["trades"]:
+                    messages.append({**_trade(_price(symbol)), "T": "t", "S": symbol, "t": now})
+                if now.second == 0 and now.microsecond < tick_ms * 1000:
+                    for symbol in subscribed["bars"]:
+                        messages.append({**_bar(_price(symbol)), "T": "b", "S": symbol, "t": now.replace(microsecond=0)})
+                if messages:
+                    await send(messages)
+
+        try:
+            await send([{"T": "success", "msg": "connected"}])
+            tasks = [asyncio.ensure_future(receive_loop()), asyncio.ensure_future(publish_loop())]
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                task.cancel()
+        except WebSocketDisconnect:
+            pass
+
+    return app
+
+
+def _run(port: int, options: Dict[str, Any]) -> None:
+    uvicorn.run(create_app(**options), host="127.0.0.1", port=port, log_level="warning")
+
+
+def serve_in_process(port: int, latency_ms: float = 20.0, jitter_ms: float = 5.0, **options) -> multiprocessing.Process:
+    """
+    Starts the mock in a separate process, so it does not compete with the
+    benchmark for the GIL, and returns once it accepts connections.
+    """
+    options.update(latency_ms=latency_ms, jitter_ms=jitter_ms)
+    process = multiprocessing.Process(target=_run, args=(port, options), daemon=True)
+    process.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                raise RuntimeError(f"Mock Alpaca server did not start on port {port}")
+            time.sleep(0.05)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the mock's options to an argument parser."""
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean latency added to REST responses")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Uniform jitter around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of REST requests that fail")
+    parser.add_argument("--error-codes", default="500,503,429", help="HTTP statuses of injected failures")
+    parser.add_argument("--assets", type=int, default=10_000, help="Assets in the catalog")
+    parser.add_argument("--trades", type=int, default=100_000, help="Historical trades per symbol")
+
+
+def mock_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """The create_app keyword arguments selected by the options of add_arguments."""
+    return {
+        "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+        "error_codes": tuple(int(code) for code in args.error_codes.split(",")),
+        "assets": args.assets, "trades": args.trades,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    _run(args.port, mock_options(args))
+
+
+if __name__ == "__main__":
+    main()
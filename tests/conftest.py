@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Settings are read when the module is imported: no credentials, streams or client-side pacing
+os.environ.update(
+    ALPACA_API_KEY="test",
+    ALPACA_SECRET_KEY="test",
+    ALPACA_MCP_CACHE_DIR=tempfile.mkdtemp(prefix="alpaca-mcp-tests-"),
+    STREAM_MARKET_DATA="False",
+    TRADE_STREAM="False",
+    UPSTREAM_RATE_LIMIT="0",
+)
+
+import alpaca_mcp_server  # noqa: E402
+from alpaca.common.exceptions import APIError  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    return alpaca_mcp_server
+
+
+def api_error(status: int, message: str = "error") -> APIError:
+    """An APIError as alpaca-py raises it for an HTTP error response."""
+    http_error = SimpleNamespace(response=SimpleNamespace(status_code=status), request=None)
+    return APIError(json.dumps({"code": status * 100000, "message": message}), http_error)
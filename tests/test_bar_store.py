@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+
+def daily_bar(day: datetime, close: float = 100.0):
+    return SimpleNamespace(
+        timestamp=day, open=close, high=close, low=close, close=close, volume=1000.0, trade_count=10.0, vwap=close
+    )
+
+
+@pytest.fixture
+def upstream(server, monkeypatch):
+    """Answers bar requests with one bar per day at midnight UTC and records the requests."""
+    requests = []
+
+    async def run_upstream(client_type, method, request):
+        requests.append(request)
+        # The request model turns the range into naive UTC
+        start, end = (moment.replace(tzinfo=timezone.utc) for moment in (request.start, request.end))
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if day < start:
+            day += timedelta(days=1)
+        bars = []
+        while day < end:
+            bars.append(daily_bar(day))
+            day += timedelta(days=1)
+        return SimpleNamespace(data={request.symbol_or_symbols: bars})
+
+    monkeypatch.setattr(server, "run_upstream", run_upstream)
+    return requests
+
+
+@pytest.fixture
+def store(server, tmp_path):
+    return server.BarStore(str(tmp_path))
+
+
+def window(days: int):
+    end = datetime.now(timezone.utc) - timedelta(days=3)
+    return end - timedelta(days=days), end
+
+
+def test_second_call_is_answered_from_disk(store, upstream):
+    start, end = window(10)
+    first = asyncio.run(store.get_bars("AAPL", "1Day", start, end))
+    second = asyncio.run(store.get_bars("AAPL", "1Day", start, end))
+    assert len(upstream) == 1
+    assert len(first["timestamp"]) == 10
+    assert (first["timestamp"] == second["timestamp"]).all()
+
+
+def test_only_missing_range_is_fetched(store, upstream):
+    start, end = window(10)
+    asyncio.run(store.get_bars("AAPL", "1Day", start + timedelta(days=5), end))
+    bars = asyncio.run(store.get_bars("AAPL", "1Day", start, end))
+    assert len(upstream) == 2
+    assert [moment.replace(tzinfo=timezone.utc) for moment in (upstream[1].start, upstream[1].end)] == [
+        moment.replace(microsecond=0) for moment in (start, start + timedelta(days=5))
+    ]
+    assert len(bars["timestamp"]) == 10
+    assert (bars["timestamp"][1:] > bars["timestamp"][:-1]).all()
+
+
+def test_symbol_case_shares_one_series(store, upstream):
+    start, end = window(10)
+    lower = asyncio.run(store.get_bars("aapl", "1Day", start, end))
+    upper = asyncio.run(store.get_bars("AAPL", "1Day", start, end))
+    assert upstream[0].symbol_or_symbols == "AAPL"
+    assert len(upstream) == 1
+    assert len(lower["timestamp"]) == len(upper["timestamp"]) == 10
+
+
+def test_concurrent_calls_fetch_once_and_release_their_lock(store, upstream):
+    start, end = window(10)
+
+    async def main():
+        return await asyncio.gather(*(store.get_bars("AAPL", "1Day", start, end) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(upstream) == 1
+    assert all(len(bars["timestamp"]) == 10 for bars in results)
+    assert store._locks == {}
+
+
+def test_stored_bars_are_served_while_upstream_is_unavailable(server, store, upstream, monkeypatch):
+    start, end = window(10)
+    asyncio.run(store.get_bars("AAPL", "1Day", start + timedelta(days=5), end))
+
+    async def unavailable(client_type, method, request):
+        raise server.UpstreamUnavailableError("stock_data")
+
+    monkeypatch.setattr(server, "run_upstream", unavailable)
+    bars = asyncio.run(store.get_bars("AAPL", "1Day", start, end))
+    assert len(bars["timestamp"]) == 5
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from alpaca.data.requests import StockLatestQuoteRequest
+
+from conftest import api_error
+
+
+@pytest.fixture
+def batcher(server):
+    return server.LatestDataBatcher("stock_data", "get_stock_latest_quote", StockLatestQuoteRequest, 0.01, 200)
+
+
+@pytest.fixture
+def upstream(server, monkeypatch):
+    """Returns one entry per symbol; failure(symbols) may return an exception to raise instead."""
+    calls = []
+    failure = {}
+
+    async def run_upstream(client_type, method, request):
+        symbols = list(request.symbol_or_symbols)
+        calls.append({"symbols": symbols, "account": server.current_account.get(), "tool": server.current_tool.get()})
+        error = failure.get("for")(symbols) if "for" in failure else None
+        if error is not None:
+            raise error
+        return {symbol: f"quote {symbol}" for symbol in symbols}
+
+    monkeypatch.setattr(server, "run_upstream", run_upstream)
+    return calls, failure
+
+
+def lookups(server, batcher, *calls):
+    """Runs (account, symbol) lookups concurrently, each in the context of a tool call."""
+    async def lookup(account, symbol):
+        server.current_account.set(account)
+        server.current_tool.set("get_stock_quote")
+        return await batcher.get(symbol)
+
+    async def main():
+        return await asyncio.gather(*(lookup(account, symbol) for account, symbol in calls), return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_concurrent_lookups_share_one_request(server, batcher, upstream):
+    calls, _ = upstream
+    results = lookups(server, batcher, *[("default", symbol) for symbol in ("AAPL", "MSFT", "AAPL", "NVDA")])
+    assert results == ["quote AAPL", "quote MSFT", "quote AAPL", "quote NVDA"]
+    assert [call["symbols"] for call in calls] == [["AAPL", "MSFT", "NVDA"]]
+
+
+def test_bad_request_fails_only_the_offending_symbol(server, batcher, upstream):
+    calls, failure = upstream
+    failure["for"] = lambda symbols: api_error(400, "invalid symbol: BAD") if "BAD" in symbols else None
+    symbols = ["A", "B", "C", "BAD", "D", "E", "F"]
+    results = lookups(server, batcher, *[("default", symbol) for symbol in symbols])
+    for symbol, result in zip(symbols, results):
+        if symbol == "BAD":
+            assert isinstance(result, server.APIError) and result.status_code == 400
+        else:
+            assert result == f"quote {symbol}"
+    assert ["BAD"] in [call["symbols"] for call in calls]
+
+
+@pytest.mark.parametrize("status", [401, 403, 429])
+def test_account_wide_errors_fail_the_whole_batch_without_splitting(server, batcher, upstream, status):
+    calls, failure = upstream
+    failure["for"] = lambda symbols: api_error(status)
+    results = lookups(server, batcher, ("default", "AAPL"), ("default", "MSFT"))
+    assert all(isinstance(result, server.APIError) and result.status_code == status for result in results)
+    assert len(calls) == 1
+
+
+def test_accounts_never_share_a_batch(server, batcher, upstream):
+    calls, _ = upstream
+    results = lookups(server, batcher, ("default", "AAPL"), ("other", "MSFT"), ("default", "NVDA"))
+    assert results == ["quote AAPL", "quote MSFT", "quote NVDA"]
+    batches = sorted((call["account"], call["symbols"]) for call in calls)
+    assert batches == [("default", ["AAPL", "NVDA"]), ("other", ["MSFT"])]
+    # The batch runs outside the tool call that opened it, with the default timeout
+    assert all(call["tool"] is None for call in calls)
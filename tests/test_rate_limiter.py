@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+
+def test_burst_is_granted_at_once_and_then_paced(server):
+    limiter = server.RateLimiter(rate_per_minute=600, burst=5, reserve=0)
+
+    async def main():
+        started = time.monotonic()
+        for _ in range(5):
+            assert await limiter.acquire(0) == 0.0
+        await limiter.acquire(0)
+        return time.monotonic() - started
+
+    # 600 per minute refills one token every 0.1 s
+    assert 0.07 <= asyncio.run(main()) < 0.5
+
+
+def test_reserve_is_kept_for_order_entry(server):
+    limiter = server.RateLimiter(rate_per_minute=60, burst=3, reserve=2)
+
+    async def main():
+        assert await limiter.acquire(2) == 0.0
+        data = asyncio.ensure_future(limiter.acquire(2))
+        await asyncio.sleep(0.05)
+        assert not data.done()
+        # Order entry may use the reserved tokens
+        assert await limiter.acquire(0) == 0.0
+        assert await limiter.acquire(0) == 0.0
+        data.cancel()
+
+    asyncio.run(main())
+
+
+def test_queued_lanes_are_served_in_priority_order(server):
+    limiter = server.RateLimiter(rate_per_minute=1200, burst=1, reserve=0)
+    served = []
+
+    async def call(lane, name):
+        await limiter.acquire(lane)
+        served.append(name)
+
+    async def main():
+        await limiter.acquire(0)
+        # Queued while the bucket is empty, lowest lane first once tokens come back
+        await asyncio.gather(call(2, "data"), call(1, "trading"), call(0, "order"))
+
+    asyncio.run(main())
+    assert served == ["order", "trading", "data"]
+
+
+def test_penalty_empties_the_bucket(server):
+    limiter = server.RateLimiter(rate_per_minute=600, burst=10, reserve=0)
+
+    async def main():
+        limiter.penalize(0.2)
+        return await limiter.acquire(0)
+
+    # 0.2 s of debt plus 0.1 s for the token itself
+    assert asyncio.run(main()) >= 0.25
+
+
+def test_zero_rate_disables_limiting(server):
+    limiter = server.RateLimiter(rate_per_minute=0, burst=1, reserve=0)
+
+    async def main():
+        return [await limiter.acquire(2) for _ in range(100)]
+
+    assert asyncio.run(main()) == [0.0] * 100
+    assert limiter.waiting == [0, 0, 0]
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from alpaca.trading.enums import OrderStatus, QueryOrderStatus, TradeEvent
+
+
+def order(status=OrderStatus.NEW, symbol="AAPL"):
+    now = datetime.now(timezone.utc)
+    return SimpleNamespace(
+        id=uuid4(), symbol=symbol, status=status, submitted_at=now, created_at=now, updated_at=now
+    )
+
+
+def position(symbol, asset_id=None):
+    return SimpleNamespace(symbol=symbol, asset_id=asset_id or uuid4(), qty="10")
+
+
+@pytest.fixture
+def upstream(server, monkeypatch):
+    """Serves the REST state in upstream.orders / upstream.positions and records the calls."""
+    state = SimpleNamespace(orders=[], positions=[], calls=[], before_positions=None)
+
+    async def run_upstream(client_type, method, *args):
+        state.calls.append(method)
+        if method == "get_orders":
+            request = args[0]
+            if request.status == QueryOrderStatus.OPEN:
+                return [o for o in state.orders if o.status not in server.TradingMirror.TERMINAL_STATUSES]
+            return list(state.orders)
+        if method == "get_all_positions":
+            if state.before_positions is not None:
+                state.before_positions()
+            return list(state.positions)
+        if method == "get_open_position":
+            return SimpleNamespace(symbol=args[0], source="rest")
+        raise AssertionError(f"unexpected upstream call {method}")
+
+    monkeypatch.setattr(server, "run_upstream", run_upstream)
+    return state
+
+
+@pytest.fixture
+def mirror(server):
+    """A mirror whose stream thread is alive and whose websocket reports connected."""
+    stop = threading.Event()
+    mirror = server.TradingMirror(lambda: SimpleNamespace(connected=True), 500, 60, 3600)
+    mirror._stream_thread = threading.Thread(target=stop.wait, daemon=True)
+    mirror._stream_thread.start()
+    yield mirror
+    stop.set()
+
+
+def run(mirror, coroutine_function):
+    async def main():
+        mirror._loop = asyncio.get_running_loop()
+        return await coroutine_function()
+    return asyncio.run(main())
+
+
+def test_update_before_first_resync_does_not_make_the_mirror_live(mirror, upstream):
+    upstream.orders = [order(), order()]
+
+    async def scenario():
+        mirror._apply_update(SimpleNamespace(order=order(), event=TradeEvent.NEW, position_qty=None))
+        live_before = mirror.is_live
+        orders, _ = await mirror.get_orders(QueryOrderStatus.OPEN, 10)
+        return live_before, orders
+
+    live_before, orders = run(mirror, scenario)
+    assert not live_before
+    assert len(orders) == 2
+    assert upstream.calls == ["get_orders"]
+
+
+def test_resync_makes_the_mirror_live_until_disconnect(mirror, upstream):
+    upstream.orders = [order(), order(OrderStatus.FILLED)]
+
+    async def scenario():
+        await mirror._resync()
+        live = mirror.is_live
+        open_orders, _ = await mirror.get_orders(QueryOrderStatus.OPEN, 10)
+        mirror._on_disconnect()
+        return live, open_orders, mirror.is_live
+
+    live, open_orders, live_after_disconnect = run(mirror, scenario)
+    assert live
+    assert len(open_orders) == 1
+    assert not live_after_disconnect
+
+
+def test_resync_starts_over_when_the_stream_drops_meanwhile(mirror, upstream):
+    drops = []
+
+    def drop_once():
+        if not drops:
+            drops.append(True)
+            mirror._on_disconnect()
+
+    upstream.before_positions = drop_once
+    run(mirror, mirror._resync)
+    assert upstream.calls.count("get_all_positions") == 2
+    assert mirror.is_live
+
+
+def test_position_lookup_normalizes_the_symbol(mirror, upstream):
+    btc = position("BTCUSD")
+    upstream.positions = [position("AAPL"), btc]
+
+    async def scenario():
+        await mirror._resync()
+        return [
+            (await mirror.get_position(symbol))[0]
+            for symbol in ("aapl", "BTC/USD", str(btc.asset_id))
+        ]
+
+    aapl, by_pair, by_id = run(mirror, scenario)
+    assert aapl.symbol == "AAPL"
+    assert by_pair is btc and by_id is btc
+
+
+def test_position_lookup_falls_back_to_rest_when_not_mirrored(mirror, upstream):
+    async def scenario():
+        await mirror._resync()
+        return await mirror.get_position("MSFT")
+
+    found, _ = run(mirror, scenario)
+    assert found.source == "rest"
+    assert upstream.calls[-1] == "get_open_position"